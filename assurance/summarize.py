@@ -1,64 +1,94 @@
-import argparse, json
+import argparse, json, sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from statistics import mean
 
-ap = argparse.ArgumentParser()
-ap.add_argument("--val_log", required=True)
-ap.add_argument("--downlink_log", required=True)
-ap.add_argument("--val_dir", required=True)
-ap.add_argument("--calib", required=True)
-ap.add_argument("--out_dir", required=True)
-a = ap.parse_args()
+# report layout is shared with the single-pass run in the example package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "examples" / "phi2-eo-tile-filter"))
+from src.report import build_metrics, write_report
+from src.summary import RunSummary
+from src.telemetry import iter_columns, log_files
 
-out = Path(a.out_dir); out.mkdir(parents=True, exist_ok=True)
+# Streams every log batch by batch into a RunSummary, so memory stays flat
+# however long the logs are. Each file (rotated segment, node) is summarized
+# on its own, in parallel with --workers, and the partial summaries are
+# merged; --save/--merge carry partials between nodes.
 
-def read_jsonl(p):
-    with open(p) as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                yield json.loads(line)
+def summarize_file(path, window_s, threshold=None) -> dict:
+    s = RunSummary(window_s)
+    for header, cols in iter_columns([path]):
+        s.add(header, cols, threshold)
+    return s.to_dict()
 
-def is_kept(rec, thr=None):
-    if "kept" in rec:
-        return bool(rec["kept"])
-    if "decision" in rec:
-        return str(rec["decision"]).lower() in ("keep", "kept", "true", "1")
-    if "prob" in rec:
-        t = rec.get("threshold", thr)
-        return (t is not None) and float(rec["prob"]) >= float(t)
-    # default to NOT kept if no signal is present
-    return False
+def summarize(paths, window_s, threshold=None, workers=0) -> RunSummary:
+    files = [f for p in paths for f in log_files(p)]
+    if workers > 0 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(summarize_file, files, [window_s] * len(files), [threshold] * len(files)))
+    else:
+        parts = [summarize_file(f, window_s, threshold) for f in files]
+    total = RunSummary(window_s)
+    for d in parts:
+        total.merge(RunSummary.from_dict(d))
+    return total
 
-val  = list(read_jsonl(a.val_log))
-down = list(read_jsonl(a.downlink_log))
-cal  = json.load(open(a.calib))
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--val_log", nargs="*", default=[], help="telemetry logs with true_class (any format; segments are found)")
+    ap.add_argument("--downlink_log", nargs="*", default=[], help="bandwidth_filter decision logs")
+    ap.add_argument("--val_dir", default=None, help="unused; kept for older command lines")
+    ap.add_argument("--calib", default=None, help="calibration.json: target recall, and threshold for logs without one")
+    ap.add_argument("--threshold", type=float, default=None, help="score the run at this threshold instead of the logged one")
+    ap.add_argument("--window_s", type=float, default=60.0, help="throughput window")
+    ap.add_argument("--workers", type=int, default=0, help="processes summarizing files in parallel")
+    ap.add_argument("--save", default=None, help="write the partial summary JSON (for merging across nodes)")
+    ap.add_argument("--merge", nargs="*", default=[], help="partial summaries from --save to fold in")
+    ap.add_argument("--out_dir", default=None)
+    a = ap.parse_args()
+    if not (a.val_log or a.downlink_log or a.merge):
+        ap.error("give --val_log, --downlink_log or --merge")
 
-tiles_total = len(val)
-tiles_kept  = sum(1 for r in down if is_kept(r, cal.get("threshold")))
-saved_pct   = 100.0 * (1.0 - tiles_kept / max(1, tiles_total))
-avg_latency_ms = mean([r.get("latency_ms", 0.0) for r in val]) if val else 0.0
+    cal = json.load(open(a.calib)) if a.calib else {}
+    thr = a.threshold
+    val = summarize(a.val_log, a.window_s, thr, a.workers)
+    down = summarize(a.downlink_log, a.window_s, thr, a.workers)
+    for p in a.merge:
+        part = json.load(open(p))
+        val.merge(RunSummary.from_dict(part["val"])); down.merge(RunSummary.from_dict(part["downlink"]))
+    if a.save:
+        with open(a.save, "w") as f:
+            json.dump({"val": val.to_dict(), "downlink": down.to_dict()}, f)
+        print("saved", a.save)
+    if not a.out_dir:
+        return
 
-precision = cal.get("precision_at_threshold")
-recall    = cal.get("achieved_recall")
-f1 = (2*precision*recall/(precision+recall)) if precision and recall and (precision+recall)>0 else 0.0
+    # latency, tiles and throughput come from the decision log when there is no validation log
+    run = val.metrics() if val.tiles else down.metrics()
+    # without a decision log, the run's own threshold decides what is kept
+    kept = down.kept if down.tiles else run["confusion"]["tp"] + run["confusion"]["fp"]
+    logged = run["thresholds"] if len(run["thresholds"]) == 1 else [cal.get("threshold")]
+    metrics = build_metrics(cal, [], run["tiles"], kept)
+    metrics.update({
+        "threshold": thr if thr is not None else logged[0],
+        "achieved_recall": run["recall"],
+        "precision": run["precision"],
+        "f1": run["f1"],
+        "auc_roc": run["auc_roc"],
+        "auc_roc_exact": run["auc_roc_exact"],
+        **{k: run[k] for k in ("confusion", "avg_latency_ms", "p50_latency_ms", "p90_latency_ms", "p99_latency_ms",
+                               "max_latency_ms", "tiles_per_s_mean", "tiles_per_s_min", "window_s", "throughput")},
+    })
+    exits = down.exits if down.tiles else val.exits
+    if exits:
+        metrics["exit_stages"] = dict(exits)
+        metrics["skipped_inference_pct"] = round(100.0 * (1 - exits["model"] / sum(exits.values())), 1)
+    if down.bytes_total:
+        metrics["bytes_saved_pct"] = round(100.0 * (1 - down.bytes_kept / down.bytes_total), 1)
+        if down.bytes_deduped:
+            metrics["dedup_saved_pct"] = round(100.0 * down.bytes_deduped / down.bytes_total, 1)  # part of bytes_saved_pct
+    if len(val.models | down.models) > 1:
+        metrics["models"] = sorted(val.models | down.models)  # logs from more than one model were merged
+    out = write_report(metrics, a.out_dir)
+    print(f"wrote {out/'metrics.json'} and {out/'summary.md'}")
 
-metrics = {
-    "threshold": cal.get("threshold"),
-    "target_recall": cal.get("target_recall"),
-    "achieved_recall": recall,
-    "precision": precision,
-    "f1": f1,
-    "auc_roc": cal.get("auc_roc"),
-    "avg_latency_ms": avg_latency_ms,
-    "tiles_total": tiles_total,
-    "tiles_kept": tiles_kept,
-    "bandwidth_saved_pct": round(saved_pct, 1),
-}
-
-json.dump(metrics, open(out/"metrics.json", "w"), indent=2)
-with open(out/"summary.md", "w") as f:
-    f.write("# Run summary\n\n")
-    for k, v in metrics.items():
-        f.write(f"- **{k}**: {v}\n")
-print(f"wrote {out/'metrics.json'} and {out/'summary.md'}")
+if __name__ == "__main__":
+    main()
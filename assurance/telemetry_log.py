@@ -1,66 +1,36 @@
-import argparse, json, time, hashlib
+import argparse, sys
 from pathlib import Path
-import numpy as np
-from PIL import Image
-import onnxruntime as ort
 
-def softmax(z):
-    z = z - np.max(z, axis=1, keepdims=True)
-    e = np.exp(z)
-    return e / np.sum(e, axis=1, keepdims=True)
-
-def sha256(p: Path) -> str:
-    h = hashlib.sha256()
-    with open(p, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+# shared tile engine lives in the example package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "examples" / "phi2-eo-tile-filter"))
+from src.engine import TileClassifier, add_engine_args
+from src.records import telemetry_columns, telemetry_header
+from src.telemetry import add_telemetry_args, open_log
+from src.tiles import TileSet
+from src import trace
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--onnx", required=True)
     ap.add_argument("--data", required=True)
     ap.add_argument("--size", type=int, default=64)
-    ap.add_argument("--out", type=str, default="logs/val.jsonl")
+    ap.add_argument("--out", type=str, default="logs/val.jsonl", help=".jsonl, or .tlog for the columnar format")
     ap.add_argument("--threshold", type=float, default=0.6)
     ap.add_argument("--temperature", type=float, default=1.0)
+    add_telemetry_args(ap)
+    add_engine_args(ap)
     a = ap.parse_args()
 
-    root = Path(a.data)
-    files = []
-    for cls, name in enumerate(["background", "event"]):
-        files += [(f, cls) for f in sorted((root / name).glob("*.png"))]
-
-    out = Path(a.out); out.parent.mkdir(parents=True, exist_ok=True)
-    f = open(out, "w")
-
-    sess = ort.InferenceSession(a.onnx, providers=["CPUExecutionProvider"])
-    model_sha = sha256(Path(a.onnx))
+    tiles = TileSet.open(a.data)
+    clf = TileClassifier.from_args(a)
 
-    for pth, cls in files:
-        img = Image.open(pth).convert("RGB").resize((a.size, a.size))
-        x = np.transpose(np.asarray(img, dtype=np.float32) / 255.0, (2, 0, 1))[None, ...]
-        t0 = time.time()
-        logits = sess.run(None, {"input": x})[0]
-        if a.temperature != 1.0:
-            logits = logits / a.temperature
-        prob = softmax(logits)[0]
-        latency_ms = (time.time() - t0) * 1000
-        rec = {
-            "timestamp": time.time(),
-            "file": str(pth),
-            "true_class": int(cls),
-            "pred_class": int(prob.argmax()),
-            "max_prob": float(prob.max()),
-            "prob_event": float(prob[1]),
-            "threshold": float(a.threshold),
-            "ok_flag": bool(prob.max() >= a.threshold),
-            "latency_ms": float(latency_ms),
-            "model_sha256": model_sha,
-        }
-        f.write(json.dumps(rec) + "\n")
-    f.close()
-    print("wrote", str(out))
+    i = 0
+    with open_log(a.out, telemetry_header(clf.model_sha256, a.threshold), a) as log:
+        for chunk, res in clf.iter_batches(tiles):
+            log.write(telemetry_columns(chunk, tiles.labels[i:i + len(chunk)], res, a.threshold))
+            i += len(chunk)
+        trace.finish(a, clf.sess, log)
+    print("wrote", a.out, "rows", log.rows, "segments deleted", log.deleted)
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,130 @@
-import time, subprocess, sys, os
+import time, shlex, signal, subprocess, sys, os
+from pathlib import Path
 
-CMD = os.environ.get("INFER_CMD", "python -m src.infer_onnx --onnx models/tinycnn_int8.onnx --data ./tiles/val")
+CMD = os.environ.get("INFER_CMD", "python -m src.infer_onnx --onnx models/tinycnn_int8.onnx --data ./tiles/val --fast_start")
 RESTARTS = 3
 SLEEP = 2
 
-for i in range(RESTARTS):
-    print(f"watchdog start {i+1}")
-    rc = subprocess.call(CMD, shell=True)
-    if rc == 0:
-        sys.exit(0)
-    time.sleep(SLEEP)
-print("watchdog: max restarts reached")
-sys.exit(1)
+# Resident mode: with WORKER_CMD set (a `python -m src.worker ...` command)
+# the watchdog keeps one worker serving WORKER_SOCK and a warm standby that
+# has already loaded the model. A worker that exits, stops answering pings
+# or sits in one batch for STALL_S is killed and the standby takes the
+# socket; clients (WorkerClient) resend their pending batch once it is up.
+WORKER_CMD = os.environ.get("WORKER_CMD")
+WORKER_SOCK = os.environ.get("WORKER_SOCK", "/tmp/eo-filter.sock")
+HEARTBEAT_S = float(os.environ.get("HEARTBEAT_S", "0.5"))
+MISSES = int(os.environ.get("MISSES", "3"))  # consecutive failed pings before a restart
+STALL_S = float(os.environ.get("STALL_S", "10"))
+BACKOFF_S, BACKOFF_MAX_S = 0.1, 30.0  # doubles per restart inside STABLE_S
+STABLE_S = 60.0
+MAX_RESTARTS = int(os.environ.get("MAX_RESTARTS", "20"))  # per STABLE_S window
+
+def spawn(cmd):
+    # the child reports startup_ms against this spawn time
+    env = dict(os.environ, FILTER_SPAWN_T=repr(time.time()))
+    if any(c in cmd for c in "|&;<>$`*"):
+        return subprocess.call(cmd, shell=True, env=env)
+    return subprocess.call(shlex.split(cmd), env=env)  # no intermediate shell per restart
+
+def rerun():
+    for i in range(RESTARTS):
+        print(f"watchdog start {i+1}")
+        rc = spawn(CMD)
+        if rc == 0:
+            sys.exit(0)
+        time.sleep(SLEEP)
+    print("watchdog: max restarts reached")
+    sys.exit(1)
+
+def standby():
+    argv = shlex.split(WORKER_CMD) + ["--socket", WORKER_SOCK, "--standby"]
+    return subprocess.Popen(argv, stdin=subprocess.PIPE, env=dict(os.environ, FILTER_SPAWN_T=repr(time.time())))
+
+def health(client):
+    try:
+        h = client.ping()
+    except (OSError, RuntimeError) as e:
+        return None, f"ping failed: {e}"
+    if h["busy_s"] > STALL_S:
+        return None, f"stuck in one batch for {h['busy_s']:.1f}s"
+    return h, None
+
+def promote(proc, client, timeout=30.0):
+    """Tell a standby to take the socket; returns ms until it answers a ping, or None."""
+    t0 = time.perf_counter()
+    try:
+        proc.stdin.write(b"go\n"); proc.stdin.flush()
+    except OSError:
+        return None
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            return None
+        h, _ = health(client)
+        if h is not None and h["pid"] == proc.pid:
+            return (time.perf_counter() - t0) * 1000
+        time.sleep(0.005)
+    return None
+
+def kill(proc):
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+
+def supervise():
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "examples" / "phi2-eo-tile-filter"))
+    from src.worker import WorkerClient
+    client = WorkerClient(WORKER_SOCK, timeout=HEARTBEAT_S, retry_s=0)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # run the cleanup below
+    active, spare = standby(), standby()
+    if promote(active, client) is None:
+        print("watchdog: worker failed to start")
+        kill(active); kill(spare)
+        sys.exit(1)
+    print(f"watchdog: worker {active.pid} serving {WORKER_SOCK}, standby {spare.pid}")
+    restarts, misses, window = 0, 0, time.time()
+    try:
+        while True:
+            try:
+                active.wait(timeout=HEARTBEAT_S)  # returns as soon as the worker dies
+            except subprocess.TimeoutExpired:
+                pass
+            if active.poll() == 0:
+                print("watchdog: worker exited cleanly")
+                return 0
+            reason = f"exited rc {active.returncode}" if active.poll() is not None else None
+            if reason is None:
+                h, reason = health(client)
+                if h is not None:
+                    misses = 0
+                    if time.time() - window > STABLE_S:
+                        restarts, window = 0, time.time()
+                    continue
+                misses += 1
+                if misses < MISSES and "stuck" not in reason:
+                    continue
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                print(f"watchdog: {restarts - 1} restarts within {STABLE_S:.0f}s, giving up")
+                return 1
+            kill(active)
+            client.close()
+            delay = 0.0 if restarts == 1 else min(BACKOFF_MAX_S, BACKOFF_S * 2 ** (restarts - 2))
+            time.sleep(delay)
+            if spare.poll() is not None:
+                spare = standby()
+            ms = promote(spare, client)
+            old, active, spare, misses = active.pid, spare, standby(), 0
+            if ms is None:
+                print(f"watchdog: worker {old} {reason}; standby {active.pid} failed to take over")
+                continue  # next heartbeat sees it dead and backs off further
+            print(f"watchdog: worker {old} {reason}; standby {active.pid} took over in {ms:.0f} ms "
+                  f"(restart {restarts}, backoff {delay:.2f}s)")
+    finally:
+        client.close()
+        for p in (active, spare):
+            kill(p)
+
+if __name__ == "__main__":
+    if WORKER_CMD:
+        sys.exit(supervise())
+    rerun()
@@ -1,26 +1,100 @@
-import argparse
+import argparse, time, zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np
-from PIL import Image
-
-rng = np.random.default_rng(0)
-
-def make_tile(size: int, bands: int, cls: int) -> np.ndarray:
-    img = rng.integers(0, 255, size=(size, size, bands), dtype=np.uint8)
-    if cls == 1:
-        s = size // 3
-        x0 = rng.integers(0, size - s)
-        y0 = rng.integers(0, size - s)
-        img[y0:y0+s, x0:x0+s, :] = 255
-    return img
-
-def write_split(root: Path, split: str, n: int, bands: int, size: int):
-    for i in range(n):
-        cls = int(i % 2 == 0)     # 50/50 background/event
-        arr = make_tile(size, bands, cls)
-        d = root / split / ("event" if cls else "background")
-        d.mkdir(parents=True, exist_ok=True)
-        Image.fromarray(arr[:, :, :3]).save(d / f"{i:05d}.png")
+
+# Tiles are generated in blocks of BLOCK. Each block draws from its own
+# stream, seeded from (seed, split, block), so the output is identical for
+# any --workers and blocks can be written by separate processes.
+BLOCK = 1024
+CLASSES = ["background", "event"]
+
+def block_rng(seed: int, split: str, block: int) -> np.random.Generator:
+    return np.random.default_rng([seed, zlib.crc32(split.encode()), block])
+
+def class_labels(n: int, event_frac: float = 0.5) -> np.ndarray:
+    """Event where ceil((i+1)*f) steps up: ceil(n*f) events spread evenly; 0.5 gives 1,0,1,0,..."""
+    i = np.arange(n + 1)
+    return np.diff(np.ceil(i * event_frac - 1e-9)).astype(np.int8)
+
+def make_block(rng: np.random.Generator, labels: np.ndarray, size: int, bands: int) -> np.ndarray:
+    """[N, C, H, W] uint8 noise tiles; events get one saturated size//3 square."""
+    tiles = rng.integers(0, 255, size=(len(labels), bands, size, size), dtype=np.uint8)
+    ev = np.flatnonzero(labels)
+    s = size // 3
+    y0, x0 = rng.integers(0, size - s, size=(2, len(ev)))
+    r = np.arange(size)
+    rows = (r >= y0[:, None]) & (r < y0[:, None] + s)
+    cols = (r >= x0[:, None]) & (r < x0[:, None] + s)
+    square = rows[:, None, :, None] & cols[:, None, None, :]  # [E, 1, H, W]
+    tiles[ev] = np.where(square, np.uint8(255), tiles[ev])
+    return tiles
+
+def make_scene(side: int, bands: int, size: int, events: int, seed: int = 0) -> np.ndarray:
+    """[C, side, side] strip with `events` saturated squares, like make_block's."""
+    rng = np.random.default_rng(seed)
+    scene = rng.integers(0, 255, size=(bands, side, side), dtype=np.uint8)
+    s = size // 3
+    for _ in range(events):
+        y0, x0 = rng.integers(0, side - s, size=2)
+        scene[:, y0:y0+s, x0:x0+s] = 255
+    return scene
+
+def save_tile(arr: np.ndarray, path: Path, fmt: str):
+    from PIL import Image
+    if fmt == "png":
+        Image.fromarray(arr if arr.shape[2] == 3 else arr[:, :, 0]).save(path.with_suffix(".png"))
+    elif fmt == "npy":
+        np.save(path.with_suffix(".npy"), np.ascontiguousarray(np.transpose(arr, (2, 0, 1))))  # [C, H, W]
+    else:
+        pages = [Image.fromarray(arr[:, :, b]) for b in range(arr.shape[2])]
+        pages[0].save(path.with_suffix(".tif"), save_all=True, append_images=pages[1:])
+
+def tile_names(split: str, labels: np.ndarray, fmt: str) -> list:
+    width = max(5, len(str(len(labels))))
+    return [f"{split}/{CLASSES[c]}/{i:0{width}d}.{fmt}" for i, c in enumerate(labels)]
+
+def write_block(root, split, block, labels, names, size, bands, fmt, seed):
+    """Generate block `block` (its slice of labels/names) as tile files, or into root/split/tiles.npy for "pack"."""
+    tiles = make_block(block_rng(seed, split, block), labels, size, bands)
+    root = Path(root)
+    if fmt == "pack":
+        lo = block * BLOCK
+        out = np.load(root / split / "tiles.npy", mmap_mode="r+")
+        out[lo:lo + len(tiles)] = tiles
+        out.flush()
+    else:
+        for name, t in zip(names, tiles):
+            save_tile(np.transpose(t, (1, 2, 0)), root / name, fmt)
+    return len(tiles)
+
+def write_split(root: Path, split: str, n: int, bands: int, size: int, fmt: str = "png",
+                event_frac: float = 0.5, seed: int = 0, workers: int = 0) -> int:
+    labels = class_labels(n, event_frac)
+    if fmt == "pack":
+        from src.archive import ArchiveWriter
+        w = ArchiveWriter(root / split, n, bands, size)
+        w.labels[:] = labels
+        w.files = tile_names(split, labels, "npy")  # names the tiles would have as files; no file exists
+        w.sizes = [bands * size * size] * n
+        w.virtual = True
+        w.tiles.flush()  # blocks write through their own mappings of tiles.npy
+        names = [None] * n
+    else:
+        for c in CLASSES:
+            (root / split / c).mkdir(parents=True, exist_ok=True)
+        names = tile_names(split, labels, fmt)
+    jobs = [(root, split, b, labels[lo:lo + BLOCK], names[lo:lo + BLOCK], size, bands, fmt, seed)
+            for b, lo in enumerate(range(0, n, BLOCK))]
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(write_block, *zip(*jobs)))
+    else:
+        for job in jobs:
+            write_block(*job)
+    if fmt == "pack":
+        w.close()
+    return n
 
 def main():
     p = argparse.ArgumentParser()
@@ -28,11 +102,29 @@ def main():
     p.add_argument("--n", type=int, default=2000)
     p.add_argument("--bands", type=int, default=3)
     p.add_argument("--size", type=int, default=64)
+    p.add_argument("--format", choices=["png", "npy", "tif", "pack"], default=None,
+                   help="tile container, or pack for a packed archive per split; default png for 1 or 3 bands, npy otherwise")
+    p.add_argument("--event_frac", type=float, default=0.5, help="share of event tiles (e.g. 0.01 for rare events)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", type=int, default=0, help="processes writing blocks in parallel (output does not depend on it)")
+    p.add_argument("--scene", type=int, default=None, help="write one [C, S, S] .npy scene to --out instead of tile folders")
+    p.add_argument("--events", type=int, default=20, help="event squares planted in --scene")
     a = p.parse_args()
+    if a.scene:
+        np.save(a.out, make_scene(a.scene, a.bands, a.size, a.events, a.seed))
+        print("Wrote", a.out)
+        return
+    if not 0 <= a.event_frac <= 1:
+        p.error("--event_frac must be in [0, 1]")
+    fmt = a.format or ("png" if a.bands in (1, 3) else "npy")
+    if fmt == "png" and a.bands not in (1, 3):
+        p.error("png holds 1 or 3 bands; use --format npy, tif or pack")
     out = Path(a.out)
-    write_split(out, "train", int(a.n * 0.8), a.bands, a.size)
-    write_split(out, "val", a.n - int(a.n * 0.8), a.bands, a.size)
-    print("Wrote", out)
+    t0 = time.perf_counter()
+    n = write_split(out, "train", int(a.n * 0.8), a.bands, a.size, fmt, a.event_frac, a.seed, a.workers)
+    n += write_split(out, "val", a.n - int(a.n * 0.8), a.bands, a.size, fmt, a.event_frac, a.seed, a.workers)
+    dt = time.perf_counter() - t0
+    print(f"Wrote {out} tiles {n} in {dt:.1f}s ({n / max(dt, 1e-9):.0f} tiles/s)")
 
 if __name__ == "__main__":
     main()
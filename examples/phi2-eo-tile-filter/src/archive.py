@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+import numpy as np
+
+# Packed split layout:
+#   tiles.npy   uint8/uint16/float32 [N, C, H, W] in the tiles' stored dtype, opened with mmap_mode="r"
+#   labels.npy  int8 [N] (-1 when unlabelled)
+#   index.json  {"size", "bands", "files": [...], "sizes": [...], "virtual"}
+#               with the source PNG paths and byte sizes in row order;
+#               "virtual" archives (data.synth --format pack) were never
+#               files, so their names are labels only and nothing stats them
+
+def is_archive(path) -> bool:
+    return (Path(path) / "tiles.npy").exists()
+
+class TileArchive:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.tiles = np.load(self.root / "tiles.npy", mmap_mode="r")
+        self.labels = np.load(self.root / "labels.npy")
+        meta = json.loads((self.root / "index.json").read_text())
+        self.size, self.bands = int(meta["size"]), int(meta["bands"])
+        self.paths = [Path(f) for f in meta["files"]]
+        self.sizes = meta.get("sizes")
+        self.virtual = bool(meta.get("virtual", False))
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def rows(self, rows) -> np.ndarray:
+        """Stored-dtype tiles for `rows`; a view into the mapping when rows are contiguous."""
+        rows = np.asarray(rows)
+        if len(rows) and np.all(np.diff(rows) == 1):
+            return self.tiles[rows[0]:rows[-1] + 1]
+        return self.tiles[rows]
+
+    def batch(self, rows) -> np.ndarray:
+        from .tiles import normalize  # tiles imports this module
+        return normalize(self.rows(rows))  # same per-dtype scaling as tile files: integer max, floats as stored
+
+class ArchiveWriter:
+    def __init__(self, root, n: int, bands: int, size: int, dtype=np.uint8):
+        self.root = Path(root); self.root.mkdir(parents=True, exist_ok=True)
+        self.size, self.bands = size, bands
+        self.tiles = np.lib.format.open_memmap(self.root / "tiles.npy", mode="w+", dtype=dtype, shape=(n, bands, size, size))
+        self.labels = np.full(n, -1, dtype=np.int8)
+        self.files, self.sizes = [""] * n, [0] * n
+        self.virtual = False
+
+    def put(self, i: int, tile: np.ndarray, label: int = -1, file="", nbytes: int = 0):
+        self.tiles[i] = tile
+        self.labels[i] = label
+        self.files[i], self.sizes[i] = str(file), int(nbytes)
+
+    def close(self):
+        self.tiles.flush()
+        np.save(self.root / "labels.npy", self.labels)
+        meta = {"size": self.size, "bands": self.bands, "files": self.files, "sizes": self.sizes, "virtual": self.virtual}
+        (self.root / "index.json").write_text(json.dumps(meta))
@@ -1,33 +1,56 @@
-import argparse, shutil, json, time, hashlib
+import argparse, json, time
 from pathlib import Path
 import numpy as np
-from PIL import Image
-import onnxruntime as ort
+from .downlink import MODES, DownlinkWriter, size_stat
+from .engine import EXIT_DEDUP, TileClassifier, add_engine_args
+from .records import downlink_columns, downlink_header
+from .session import startup_ms
+from .shm_ring import TileRing
+from .telemetry import add_telemetry_args, open_log
+from .trace import span, tracer
+from . import trace
+from .tiles import TileSet, band_max
 
-def softmax(z):
-    z = z - np.max(z, axis=1, keepdims=True)
-    e = np.exp(z)
-    return e / np.sum(e, axis=1, keepdims=True)
+def gate(batches, threshold, writer: DownlinkWriter, log=None, drop_dups=False):
+    """Send tiles with prob_event >= threshold through `writer`; returns (kept, sent_bytes, total_bytes).
 
-def file_sha256(p: Path) -> str:
-    h = hashlib.sha256()
-    with open(p, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    `batches` yields (paths, results, os.stat_result per tile), so a tile
+    seen twice counts twice; `log` is a TelemetryWriter opened with
+    downlink_header(). With
+    `drop_dups`, near-duplicates of earlier tiles (exit_stage EXIT_DEDUP)
+    are not sent again; their "ok" is False in the log.
+    """
+    sent = kept = total = 0
+    for chunk, res, sts in batches:
+        keep = res["prob_event"] >= threshold
+        if drop_dups:
+            keep &= res["exit_stage"] != EXIT_DEDUP
+        with span("downlink"):
+            for pth, st, ok in zip(chunk, sts, keep):
+                if ok:
+                    kept += 1
+                    sent += writer.send(pth, st)
+        sizes = [st.st_size for st in sts]
+        total += sum(sizes)
+        if log:
+            with span("log"):
+                log.write(downlink_columns(chunk, res, keep, sizes))
+        tracer.count("kept", int(keep.sum()))
+    return kept, sent, total
 
-def main():
-    p = argparse.ArgumentParser()
-    p.add_argument("--onnx", required=True)
-    p.add_argument("--data", required=True)
-    p.add_argument("--threshold", type=float, default=0.9)
-    p.add_argument("--calibration", type=str, default=None, help="JSON from calibrate_threshold.py")
-    p.add_argument("--temperature", type=float, default=1.0)
-    p.add_argument("--size", type=int, default=64)
-    p.add_argument("--downlink_out", type=str, default="downlink")
-    p.add_argument("--log", type=str, default=None, help="optional JSONL log path")
-    a = p.parse_args()
+def ring_batches(ring: TileRing, clf, batch, max_wait_s=0.005, stall_s=None):
+    """Score tiles straight out of a shared-memory ring; byte sizes come from the producer's META, not from stat()."""
+    scale = band_max(ring.dtype, ring.bands)
+    while (got := ring.peek(batch, max_wait_s, stall_s)) is not None:
+        x, meta = got
+        chunk = [Path(m.decode()) for m in meta["path"]]
+        sts = [size_stat(n) for n in meta["nbytes"].tolist()]
+        # float32 slots go to sess.run as they are; integer slots are scaled into one new batch
+        res = clf.predict(x if x.dtype == np.float32 else x / scale)
+        ring.release(len(chunk))
+        yield chunk, res, sts
 
+def load_calibration(a):
     # load calibration if provided
     if a.calibration:
         with open(a.calibration) as f:
@@ -35,68 +58,74 @@ def main():
         a.threshold = float(cfg.get("threshold", a.threshold))
         if "temperature" in cfg:
             a.temperature = float(cfg["temperature"])
+        a.cascade_cfg = cfg.get("cascade")
 
-    sess = ort.InferenceSession(a.onnx, providers=["CPUExecutionProvider"])
-    files = list(Path(a.data).glob("**/*.png"))
-    total = sum(p.stat().st_size for p in files)
-    model_hash = file_sha256(Path(a.onnx))
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", required=True)
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--data", type=str, help="tiles directory or packed archive")
+    src.add_argument("--ring", type=str, help="shared-memory tile ring written by src.shm_ring (or another producer)")
+    p.add_argument("--ring_timeout", type=float, default=0.0,
+                   help="with --ring, give up after this many seconds without a tile (0: while the producer lives)")
+    p.add_argument("--threshold", type=float, default=0.9)
+    p.add_argument("--calibration", type=str, default=None, help="JSON from calibrate_threshold.py")
+    p.add_argument("--temperature", type=float, default=1.0)
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--downlink_out", type=str, default="downlink")
+    p.add_argument("--downlink_mode", choices=MODES, default="copy", help="how kept tiles reach --downlink_out")
+    p.add_argument("--log", type=str, default=None, help="optional log path (.jsonl, or .tlog for the columnar format)")
+    p.add_argument("--dedup_downlink", action="store_true", help="with --dedup, do not downlink near-duplicates again")
+    add_telemetry_args(p)
+    add_engine_args(p)
+    a = p.parse_args()
 
-    # ensure downlink folder
-    out = Path(a.downlink_out)
-    if out.exists():
-        shutil.rmtree(out)
-    out.mkdir(parents=True, exist_ok=True)
+    load_calibration(a)
 
-    sent = 0
-    kept = 0
+    if a.ring:
+        ring = TileRing.attach(a.ring)
+        if (ring.size, ring.bands) != (a.size, a.bands):
+            msg = f"ring {a.ring} holds {ring.bands}x{ring.size}x{ring.size} tiles, not --bands {a.bands} --size {a.size}"
+            ring.close()
+            p.error(msg)
+    clf = TileClassifier.from_args(a)
+    if a.ring:
+        batches = ring_batches(ring, clf, a.batch_size, stall_s=a.ring_timeout or None)
+    else:
+        tiles = TileSet.open(a.data, labeled=False)
+        if tiles.archive is not None and tiles.archive.virtual and a.downlink_mode != "manifest":
+            p.error(f"{a.data} is packed without source files; use --downlink_mode manifest")
+        stats = tiles.stats()
+        batches = ((chunk, res, [stats[c] for c in chunk]) for chunk, res in clf.iter_batches(tiles))
 
-    # >>> changed block: auto-create log folder
-    log_f = None
-    if a.log:
-        log_path = Path(a.log)
-        log_path.parent.mkdir(parents=True, exist_ok=True)
-        log_f = log_path.open("w")
-    # <<<
+    log = open_log(a.log, downlink_header(clf.model_sha256, a.threshold, a.temperature), a) if a.log else None
 
     t_start = time.time()
+    # a ring delivers an open-ended tile set: never prune
+    with DownlinkWriter(a.downlink_out, a.downlink_mode, prune=not a.ring) as writer:
+        kept, sent, total = gate(batches, a.threshold, writer, log, a.dedup_downlink)
+    n = len(tiles) if not a.ring else int(ring.header["tail"])
+    if a.ring:
+        ring.close()
 
-    for pth in files:
-        img = Image.open(pth).convert("RGB").resize((a.size, a.size))
-        x = np.transpose(np.asarray(img, dtype=np.float32) / 255.0, (2, 0, 1))[None, ...]
-        t1 = time.time()
-        logits = sess.run(None, {"input": x})[0]
-        if a.temperature != 1.0:
-            logits = logits / a.temperature
-        prob = softmax(logits)[0]
-        elapsed_ms = (time.time() - t1) * 1000
-
-        if prob[1] >= a.threshold:
-            kept += 1
-            dest = out / pth.name
-            dest.write_bytes(pth.read_bytes())
-            sent += pth.stat().st_size
-            ok = True
-        else:
-            ok = False
-
-        if log_f:
-            rec = {
-                "file": str(pth),
-                "model_sha256": model_hash,
-                "size": pth.stat().st_size,
-                "prob_event": float(prob[1]),
-                "pred_class": int(prob.argmax()),
-                "ok": bool(ok),
-                "latency_ms": float(elapsed_ms),
-                "threshold": float(a.threshold),
-                "temperature": float(a.temperature)
-            }
-            log_f.write(json.dumps(rec) + "\n")
-
-    if log_f:
-        log_f.close()
+    trace.finish(a, clf.sess, log)
+    if log:
+        log.close()
     saved = 1 - sent / total if total > 0 else 0
-    print(f"tiles {len(files)} kept {kept} saved_bandwidth {saved*100:.1f}% elapsed_s {time.time()-t_start:.2f}")
+    elapsed = time.time() - t_start
+    tps = n / elapsed if elapsed > 0 else 0.0
+    msg = f"tiles {n} kept {kept} saved_bandwidth {saved*100:.1f}% elapsed_s {elapsed:.2f} tiles_per_s {tps:.1f} batch {a.batch_size}"
+    msg += f" written {writer.written} unchanged {writer.skipped}"
+    if clf.cascade is not None:
+        c = clf.cascade.report()
+        msg += f" cascade_skipped {c['skipped']} ({c['skip_rate']*100:.1f}%) infer_speedup {c.get('infer_speedup', 0):.2f}x"
+    if clf.dedup is not None:
+        msg += f" dedup_hits {clf.dedup.hits}/{clf.dedup.lookups}"
+    if clf.cache is not None:
+        msg += f" cache_hits {clf.cache.hits}/{clf.cache.hits + clf.cache.misses}"
+    if clf.t_first is not None:
+        msg += f" startup_ms {startup_ms(clf.t_first):.0f}"
+    print(msg)
 
 if __name__ == "__main__":
     main()
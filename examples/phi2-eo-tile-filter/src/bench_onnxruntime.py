@@ -1,4 +1,12 @@
-import argparse, time, psutil, numpy as np, onnxruntime as ort
+import argparse, time, psutil, numpy as np
+from . import session
+from .tiles import find_tiles, load_tile
+
+def tiles_per_s(sess, x, iters):
+    t0 = time.time()
+    for _ in range(iters):
+        sess.run(None, {"input": x})
+    return iters * x.shape[0] / (time.time() - t0)
 
 def main():
     p = argparse.ArgumentParser()
@@ -6,10 +14,25 @@ def main():
     p.add_argument("--bands", type=int, default=3)
     p.add_argument("--size", type=int, default=64)
     p.add_argument("--iters", type=int, default=200)
+    p.add_argument("--batch_size", "--batch-size", type=int, default=1, help="compare tiles/s against batch 1")
+    p.add_argument("--data", type=str, default=None, help="real tiles (png/npy/tif) to time decode and feed the model")
+    session.add_session_args(p)
     a = p.parse_args()
+    files = sorted(find_tiles(a.data))[:a.iters] if a.data else []
+    if a.data and not files:
+        p.error(f"no png/npy/tif tiles under --data {a.data}")
 
-    sess = ort.InferenceSession(a.onnx, providers=["CPUExecutionProvider"])
+    t0 = time.perf_counter()
+    sess = session.from_args(a)
+    print(f"profile {a.session_profile} session_ms {(time.perf_counter()-t0)*1000:.1f}")
     x = np.random.rand(1, a.bands, a.size, a.size).astype(np.float32)
+    if files:
+        t0 = time.perf_counter()
+        xs = [load_tile(f, a.size, a.bands) for f in files]
+        decode_ms = (time.perf_counter() - t0) * 1000 / len(files)
+        x = xs[0][None]
+        print(f"bands {a.bands} tiles {len(files)} decode_ms {decode_ms:.3f} input_kb_per_tile {x.nbytes/1024:.1f} "
+              f"rss_mb {psutil.Process().memory_info().rss/1e6:.1f}")
 
     for _ in range(10): sess.run(None, {"input": x})
     lat = []; mem0 = psutil.Process().memory_info().rss; t0 = time.time()
@@ -22,5 +45,13 @@ def main():
     print(f"avg_ms {np.mean(lat):.3f} p50 {np.percentile(lat,50):.3f} p90 {np.percentile(lat,90):.3f} p99 {np.percentile(lat,99):.3f}")
     print(f"throughput_fps {a.iters/t:.1f} mem_delta_mb {(mem1-mem0)/1e6:.2f}")
 
+    if a.batch_size > 1:
+        xb = np.random.rand(a.batch_size, a.bands, a.size, a.size).astype(np.float32)
+        for _ in range(10): sess.run(None, {"input": xb})
+        # same number of tiles through both paths
+        tps1 = tiles_per_s(sess, x, a.iters)
+        tpsn = tiles_per_s(sess, xb, max(1, a.iters // a.batch_size))
+        print(f"tiles_per_s batch1 {tps1:.1f} batch{a.batch_size} {tpsn:.1f} speedup {tpsn/tps1:.2f}x")
+
 if __name__ == "__main__":
     main()
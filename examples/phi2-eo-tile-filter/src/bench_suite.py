@@ -0,0 +1,201 @@
+import argparse, itertools, json, os, platform, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+import numpy as np
+
+# Sweeps model x session profile x batch x threads x graph optimization x
+# input size x bands.
+# Every configuration runs in a freshly spawned process so cold start
+# (import + session + first run) and peak RSS belong to that configuration
+# alone. onnxruntime is only imported inside the worker for that reason.
+
+OPT_LEVELS = ("disable", "basic", "extended", "all")
+METRICS_LOWER = ("p50_ms", "p90_ms", "p99_ms", "cold_start_ms", "peak_rss_mb")  # higher is a regression
+METRICS_HIGHER = ("tiles_per_s",)  # lower is a regression
+
+def _ms(ns):
+    return ns / 1e6
+
+def stage_times(files, size, bands, sess, batch, threshold=0.5):
+    """Per-tile ms spent in decode, preprocess, infer, postprocess and copy over real tiles.
+
+    Only tiles scoring at or above `threshold` are copied, as in the filter;
+    copy_ms is still per input tile, so it is the downlink cost at that threshold.
+    """
+    import tempfile
+    from PIL import Image
+    from .downlink import DownlinkWriter
+    from .engine import softmax
+    from .tiles import _resize_bands, normalize, read_bands
+
+    st = {k: 0 for k in ("decode", "preprocess", "infer", "postprocess", "copy")}
+    kept = 0
+    xs = []
+    for f in files:
+        t0 = time.perf_counter_ns()
+        if f.suffix.lower() == ".png":
+            img = Image.open(f); img.load()
+            t1 = time.perf_counter_ns()
+            arr = np.asarray(img.convert("RGB" if bands == 3 else "L").resize((size, size)))
+            raw = arr[None] if arr.ndim == 2 else np.transpose(arr, (2, 0, 1))
+        else:
+            raw = read_bands(f)
+            t1 = time.perf_counter_ns()
+            raw = _resize_bands(raw, size)
+        xs.append(normalize(raw))
+        t2 = time.perf_counter_ns()
+        st["decode"] += t1 - t0; st["preprocess"] += t2 - t1
+    with tempfile.TemporaryDirectory() as tmp, DownlinkWriter(tmp) as w:
+        for i in range(0, len(xs), batch):
+            x = np.stack(xs[i:i + batch])
+            t0 = time.perf_counter_ns()
+            z = sess.run(None, {"input": x})[0]
+            t1 = time.perf_counter_ns()
+            keep = softmax(z)[:, 1] >= threshold
+            t2 = time.perf_counter_ns()
+            st["infer"] += t1 - t0; st["postprocess"] += t2 - t1
+            for f, k in zip(files[i:i + batch], keep):
+                if k:
+                    t3 = time.perf_counter_ns()
+                    w.send(f, f.stat())
+                    st["copy"] += time.perf_counter_ns() - t3
+            kept += int(keep.sum())
+    n = max(1, len(files))
+    return {**{f"{k}_ms": _ms(v) / n for k, v in st.items()}, "kept_pct": 100.0 * kept / n}
+
+def run_config(cfg: dict, iters: int, warmup: int, data_files, threshold: float = 0.5) -> dict:
+    t_start = time.perf_counter_ns()
+    import resource
+    from .session import make_session
+    overrides = {k: cfg[k] for k in ("intra", "inter", "opt") if cfg[k] is not None}
+    sess = make_session(cfg["onnx"], cfg["profile"], overrides)
+    shape = sess.get_inputs()[0].shape
+    for dim, want in ((shape[1], cfg["bands"]), (shape[2], cfg["size"])):
+        if isinstance(dim, int) and dim != want:
+            return {**cfg, "skipped": f"model input is {shape}"}
+    x = np.random.default_rng(0).random((cfg["batch"], cfg["bands"], cfg["size"], cfg["size"]), dtype=np.float32)
+    sess.run(None, {"input": x})
+    cold_ns = time.perf_counter_ns() - t_start
+    for _ in range(warmup):
+        sess.run(None, {"input": x})
+    lat = np.empty(iters, dtype=np.int64)
+    t0 = time.perf_counter_ns()
+    for k in range(iters):
+        t1 = time.perf_counter_ns()
+        sess.run(None, {"input": x})
+        lat[k] = time.perf_counter_ns() - t1
+    wall = time.perf_counter_ns() - t0
+    out = {
+        **cfg,
+        "mean_ms": _ms(lat.mean()),
+        "p50_ms": _ms(np.percentile(lat, 50)),
+        "p90_ms": _ms(np.percentile(lat, 90)),
+        "p99_ms": _ms(np.percentile(lat, 99)),
+        "tiles_per_s": iters * cfg["batch"] / (wall / 1e9),
+        "cold_start_ms": _ms(cold_ns),
+    }
+    if data_files:
+        out["stages"] = stage_times([Path(f) for f in data_files], cfg["size"], cfg["bands"], sess, cfg["batch"],
+                                    threshold)
+    # ru_maxrss is KiB on Linux
+    out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return out
+
+def model_dims(path):
+    import onnx
+    dims = onnx.load(path, load_external_data=False).graph.input[0].type.tensor_type.shape.dim
+    return [d.dim_value or None for d in dims]
+
+def label(r: dict) -> str:
+    s = f"{Path(r['onnx']).name} {r.get('profile', 'default')} b{r['batch']} {r['bands']}x{r['size']}"
+    return s + "".join(f" {k} {r[k]}" for k in ("intra", "inter", "opt") if r.get(k) is not None)
+
+def config_key(r: dict) -> tuple:
+    return tuple(r.get(k) for k in ("onnx", "profile", "batch", "intra", "inter", "opt", "size", "bands"))
+
+def compare(results, baseline, tol: float):
+    base = {config_key(r): r for r in baseline["results"] if "skipped" not in r}
+    flags = []
+    for r in results:
+        b = base.get(config_key(r))
+        if b is None or "skipped" in r:
+            continue
+        for m in METRICS_LOWER:
+            if m in b and b[m] > 0 and r[m] > b[m] * (1 + tol):
+                flags.append((r, m, b[m], r[m]))
+        for m in METRICS_HIGHER:
+            if m in b and r[m] < b[m] * (1 - tol):
+                flags.append((r, m, b[m], r[m]))
+    return flags
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", nargs="+", required=True, help="models to compare, e.g. FP32 and INT8")
+    p.add_argument("--batch", nargs="+", type=int, default=[1, 8, 32])
+    p.add_argument("--profile", nargs="+", default=["default"], help="session profiles (src/session.py)")
+    p.add_argument("--intra", nargs="+", type=int, default=[None], help="intra_op_num_threads (default: profile's)")
+    p.add_argument("--inter", nargs="+", type=int, default=[None], help="inter_op_num_threads (default: profile's)")
+    p.add_argument("--opt", nargs="+", choices=OPT_LEVELS, default=[None], help="graph optimization (default: profile's)")
+    p.add_argument("--size", nargs="+", type=int, default=None, help="default: the model's own input size")
+    p.add_argument("--bands", nargs="+", type=int, default=None, help="default: the model's own band count")
+    p.add_argument("--iters", type=int, default=200)
+    p.add_argument("--warmup", type=int, default=10)
+    p.add_argument("--data", type=str, default=None, help="real tiles for the decode/preprocess/infer/postprocess/copy breakdown")
+    p.add_argument("--stage_tiles", type=int, default=64)
+    p.add_argument("--threshold", type=float, default=0.5, help="event probability at which the breakdown copies a tile")
+    p.add_argument("--out", type=str, default="bench.json")
+    p.add_argument("--compare", type=str, default=None, help="baseline JSON from an earlier run")
+    p.add_argument("--tolerance", type=float, default=0.10, help="relative change that counts as a regression")
+    a = p.parse_args()
+
+    files = None
+    if a.data:
+        from .tiles import find_tiles
+        files = [str(f) for f in sorted(find_tiles(a.data))[:a.stage_tiles]]
+    configs = []
+    for model in a.onnx:
+        dims = model_dims(model)
+        sizes = a.size or [dims[2] or 64]
+        bands = a.bands or [dims[1] or 3]
+        for prof, b, intra, inter, opt, s, c in itertools.product(a.profile, a.batch, a.intra, a.inter, a.opt, sizes, bands):
+            configs.append({"onnx": model, "profile": prof, "batch": b, "intra": intra, "inter": inter, "opt": opt,
+                            "size": s, "bands": c})
+
+    results = []
+    ctx = get_context("spawn")
+    for cfg in configs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            r = pool.submit(run_config, cfg, a.iters, a.warmup, files, a.threshold).result()
+        results.append(r)
+        if "skipped" in r:
+            print(f"skip {label(cfg)}: {r['skipped']}")
+        else:
+            print(f"{label(r)} p50_ms {r['p50_ms']:.3f} p99_ms {r['p99_ms']:.3f} "
+                  f"tiles_per_s {r['tiles_per_s']:.0f} cold_ms {r['cold_start_ms']:.0f} rss_mb {r['peak_rss_mb']:.0f}")
+
+    import onnxruntime as ort
+    report = {
+        "meta": {
+            "timestamp": time.time(), "host": platform.node(), "machine": platform.machine(),
+            "cpu_count": os.cpu_count(), "python": platform.python_version(), "onnxruntime": ort.__version__,
+            "iters": a.iters,
+        },
+        "results": results,
+    }
+    Path(a.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(a.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("wrote", a.out)
+
+    if a.compare:
+        with open(a.compare) as f:
+            flags = compare(results, json.load(f), a.tolerance)
+        for r, m, old, new in flags:
+            print(f"REGRESSION {label(r)} {m} {old:.3f} -> {new:.3f}")
+        if flags:
+            sys.exit(1)
+        print("no regressions vs", a.compare)
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,95 @@
 import argparse, json, time
-from pathlib import Path
 import numpy as np
-from PIL import Image
-import onnxruntime as ort
-from sklearn.metrics import precision_recall_curve, roc_auc_score
+from .cascade import add_cascade_args, calibrate_cascade, make_stage
+from .calibration import T_MIN, ScoreHistogram, auc_roc
+from .engine import TileClassifier, add_engine_args
+from .tiles import TileSet
 
-def softmax(z):
-    z = z - np.max(z, axis=1, keepdims=True)
-    e = np.exp(z)
-    return e / np.sum(e, axis=1, keepdims=True)
-
-def load_set(root: Path):
-    files = []
-    for cls, name in enumerate(["background", "event"]):
-        for f in sorted((root / name).glob("*.png")):
-            files.append((f, cls))
-    return files
+def calibrate(ys, xs, target_recall: float) -> dict:
+    """Exact threshold from in-memory scores (sklearn precision_recall_curve semantics)."""
+    ys = np.asarray(ys) > 0
+    xs = np.asarray(xs, dtype=np.float64)
+    order = np.argsort(-xs, kind="mergesort")
+    xs_s, ys_s = xs[order], ys[order]
+    # last position of each distinct score, highest score first
+    last = np.r_[np.flatnonzero(np.diff(xs_s)), len(xs_s) - 1]
+    tp = np.cumsum(ys_s)[last]
+    recall = tp / tp[-1]
+    precision = tp / (last + 1)
+    # pick the highest threshold that achieves target recall
+    meet = np.flatnonzero(recall >= target_recall)
+    idx = meet[0] if len(meet) else int(np.argmax(recall))  # fall back to best possible recall
+    return {
+        "threshold": float(xs_s[last[idx]]),
+        "target_recall": target_recall,
+        "achieved_recall": float(recall[idx]),
+        "precision_at_threshold": float(precision[idx]),
+        "auc_roc": auc_roc(ys, xs),
+    }
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--onnx", required=True)
-    ap.add_argument("--data", required=True, help="path to val split (…/tiles/val)")
+    ap.add_argument("--onnx", default=None)
+    ap.add_argument("--data", default=None, help="path to val split (…/tiles/val) or a packed archive")
     ap.add_argument("--size", type=int, default=64)
     ap.add_argument("--target_recall", type=float, default=0.95)
     ap.add_argument("--temperature", type=float, default=1.0)
+    ap.add_argument("--fit_temperature", action="store_true", help="fit temperature by NLL instead of using --temperature")
+    ap.add_argument("--bins", type=int, default=4000, help="logit-margin histogram bins over [-20, 20]")
+    ap.add_argument("--hist_in", nargs="*", default=[], help="saved histograms (.npz) to merge: other shards or earlier runs")
+    ap.add_argument("--hist_out", type=str, default=None, help="save the merged histogram (.npz) for later merges")
     ap.add_argument("--out", type=str, default="calibration.json")
+    add_cascade_args(ap)
+    add_engine_args(ap)
     a = ap.parse_args()
+    if not (a.data or a.hist_in):
+        ap.error("need --data and/or --hist_in")
+    if a.data and not a.onnx:
+        ap.error("--data needs --onnx")
+    if a.cascade and (a.hist_in or not a.data):
+        ap.error("--cascade needs --data and no --hist_in: the stage is fitted on per-tile scores")
+    if a.cascade and a.cascade_loss >= 1 - a.target_recall:
+        ap.error("--cascade_loss must be below 1 - --target_recall")
 
-    sess = ort.InferenceSession(a.onnx, providers=["CPUExecutionProvider"])
-    xs, ys = [], []
+    hist = ScoreHistogram.load(a.hist_in[0]) if a.hist_in else ScoreHistogram(a.bins)
+    for h in a.hist_in[1:]:
+        hist.merge(ScoreHistogram.load(h))
     t0 = time.time()
-    for f, cls in load_set(Path(a.data)):
-        img = Image.open(f).convert("RGB").resize((a.size, a.size))
-        x = np.transpose(np.asarray(img, dtype=np.float32) / 255.0, (2, 0, 1))[None, ...]
-        logits = sess.run(None, {"input": x})[0]
-        if a.temperature != 1.0:
-            logits = logits / a.temperature
-        prob = softmax(logits)[0]
-        xs.append(prob[1]); ys.append(cls)
+    cascade, target, full = None, a.target_recall, hist
+    if a.cascade:
+        # the stage keeps 1 - cascade_loss of the events; the main model covers the rest of the target
+        clf = TileClassifier.from_args(a)
+        tiles = TileSet.open(a.data)
+        cascade, target, full = calibrate_cascade(make_stage(a.cascade, a.session_profile), clf, tiles,
+                                            a.target_recall, a.cascade_loss, hist)
+    elif a.data:
+        # raw logits stream into the histogram batch by batch: memory does not grow with the split
+        clf = TileClassifier.from_args(a)
+        tiles = TileSet.open(a.data)
+        i = 0
+        for chunk, z in clf.iter_logits(tiles):
+            hist.add_logits(z, tiles.labels[i:i + len(chunk)])
+            i += len(chunk)
     dur = time.time() - t0
-    xs = np.array(xs); ys = np.array(ys)
+    if a.hist_out:
+        hist.save(a.hist_out)
 
-    precision, recall, thresholds = precision_recall_curve(ys, xs)
-    # pick the smallest threshold that achieves target recall
-    meet = np.where(recall[:-1] >= a.target_recall)[0]
-    if len(meet) == 0:
-        idx = np.argmax(recall[:-1])  # fall back to best possible recall
-    else:
-        idx = meet[-1]
-    thr = float(thresholds[idx])
-    auc = float(roc_auc_score(ys, xs))
-    out = {
-        "threshold": thr,
-        "target_recall": a.target_recall,
-        "achieved_recall": float(recall[idx]),
-        "precision_at_threshold": float(precision[idx]),
-        "auc_roc": auc,
-        "temperature": a.temperature,
-        "val_samples": int(len(ys)),
+    temperature = hist.fit_temperature() if a.fit_temperature else a.temperature
+    if a.fit_temperature and temperature <= T_MIN * 1.001:
+        print(f"warning: classes are separable here, fitted temperature sits at its floor {T_MIN}")
+    out = hist.calibrate(target, temperature)
+    if cascade:
+        # end to end over every tile: early rejects are never kept, so they only add missed events and true
+        # negatives; precision among kept tiles is the main model's. Temperature and NLL stay model-only.
+        events = full.counts[1].sum()
+        out.update({"target_recall": a.target_recall, "auc_roc": full.auc(), "cascade": cascade,
+                    "achieved_recall": float(out["achieved_recall"] * hist.counts[1].sum() / max(1, events))})
+    out.update({
+        "temperature": temperature,
+        "nll": hist.nll(temperature),
+        "val_samples": len(full),
         "duration_s": float(dur)
-    }
+    })
     with open(a.out, "w") as f:
         json.dump(out, f, indent=2)
     print("saved", a.out, out)
@@ -0,0 +1,141 @@
+import numpy as np
+
+# Calibration state for the 2-class filter without keeping per-tile scores.
+# Everything is expressed in the logit margin d = z_event - z_background:
+# prob_event = sigmoid(d / T), so temperature never changes the ranking and
+# one margin histogram per class gives PR/ROC curves, AUC and the NLL for
+# any temperature. Histograms have fixed bins, so shards computed anywhere
+# merge by adding counts.
+
+T_MIN, T_MAX = 0.05, 20.0
+
+def sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+def margins(logits: np.ndarray) -> np.ndarray:
+    return logits[:, 1].astype(np.float64) - logits[:, 0]
+
+def auc_roc(ys, xs) -> float:
+    """ROC AUC as the Mann-Whitney statistic; tied scores share their average rank."""
+    ys = np.asarray(ys) > 0
+    _, inv, counts = np.unique(xs, return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(counts) - (counts - 1) / 2.0)[inv]
+    pos = int(ys.sum()); neg = len(ys) - pos
+    return float((ranks[ys].sum() - pos * (pos + 1) / 2) / (pos * neg))
+
+def nll(d, y, temperature=1.0, w=None) -> float:
+    s = np.where(np.asarray(y) > 0, 1.0, -1.0)
+    return float(np.average(np.logaddexp(0.0, -s * d / temperature), weights=w))
+
+def fit_temperature(d, y, w=None, iters: int = 50) -> float:
+    """Temperature minimising the mean NLL of sigmoid(d / T) against labels y.
+
+    Newton steps on beta = 1/T, where the NLL is convex; w weights each
+    margin (histogram counts). Separable data has no finite optimum and ends
+    at T_MIN.
+    """
+    d = np.asarray(d, dtype=np.float64)
+    s = np.where(np.asarray(y) > 0, 1.0, -1.0)
+    w = np.ones_like(d) if w is None else np.asarray(w, dtype=np.float64)
+    if w.sum() == 0:
+        return 1.0
+    w = w / w.sum()
+    sd = s * d
+    beta = 1.0
+    for _ in range(iters):
+        p = sigmoid(-sd * beta)  # probability on the wrong class
+        g = -np.sum(w * sd * p)
+        h = np.sum(w * d * d * p * (1 - p))
+        if h <= 1e-12:
+            break
+        step = g / h
+        beta = float(np.clip(beta - step, 1 / T_MAX, 1 / T_MIN))
+        if abs(step) < 1e-9 * beta:
+            break
+    return 1.0 / beta
+
+class ScoreHistogram:
+    """Per-class counts of logit margins over `bins` fixed bins on [lo, hi]; outliers land in the end bins."""
+
+    def __init__(self, bins: int = 4000, lo: float = -20.0, hi: float = 20.0):
+        self.bins, self.lo, self.hi = int(bins), float(lo), float(hi)
+        self.counts = np.zeros((2, self.bins), dtype=np.int64)  # [background, event]
+
+    @property
+    def edges(self):
+        return np.linspace(self.lo, self.hi, self.bins + 1)
+
+    @property
+    def centers(self):
+        e = self.edges
+        return (e[:-1] + e[1:]) / 2
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def add(self, d: np.ndarray, y: np.ndarray):
+        k = ((np.asarray(d, dtype=np.float64) - self.lo) * (self.bins / (self.hi - self.lo))).astype(np.int64)
+        k = np.clip(k, 0, self.bins - 1) + (np.asarray(y) > 0) * self.bins
+        self.counts += np.bincount(k, minlength=2 * self.bins).reshape(2, self.bins)
+        return self
+
+    def add_logits(self, logits: np.ndarray, y: np.ndarray):
+        return self.add(margins(logits), y)
+
+    def merge(self, other: "ScoreHistogram"):
+        if (other.bins, other.lo, other.hi) != (self.bins, self.lo, self.hi):
+            raise ValueError("histograms with different bins cannot be merged")
+        self.counts += other.counts
+        return self
+
+    def save(self, path):
+        np.savez(path, counts=self.counts, range=np.array([self.lo, self.hi]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            h = cls(f["counts"].shape[1], *f["range"])
+            h.counts += f["counts"]
+        return h
+
+    def curves(self):
+        """(lower bin edge, tp, fp) for "keep every bin from k upwards", k descending from the top bin."""
+        tp = np.cumsum(self.counts[1, ::-1])
+        fp = np.cumsum(self.counts[0, ::-1])
+        return self.edges[:-1][::-1], tp, fp
+
+    def auc(self) -> float:
+        # trapezoids over the binned ROC; tiles sharing a bin count as ties
+        _, tp, fp = self.curves()
+        pos, neg = tp[-1], fp[-1]
+        if pos == 0 or neg == 0:
+            return float("nan")
+        tpr = np.concatenate([[0.0], tp / pos])
+        fpr = np.concatenate([[0.0], fp / neg])
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def fit_temperature(self) -> float:
+        c = self.centers
+        return fit_temperature(np.concatenate([c, c]), np.repeat([0, 1], self.bins), self.counts.ravel())
+
+    def nll(self, temperature=1.0) -> float:
+        c = self.centers
+        return nll(np.concatenate([c, c]), np.repeat([0, 1], self.bins), temperature, self.counts.ravel())
+
+    def calibrate(self, target_recall: float, temperature: float = 1.0) -> dict:
+        """Highest threshold whose recall meets the target; same keys as calibrate_threshold.calibrate."""
+        edge, tp, fp = self.curves()
+        pos = tp[-1]
+        recall = tp / max(1, pos)
+        ok = np.flatnonzero(recall >= target_recall)
+        # walking down from the top bin, recall only grows; take the first bin that meets it
+        k = ok[0] if len(ok) else int(np.argmax(recall))
+        # the lower edge keeps every tile in the bin; the bottom bin also holds clipped outliers
+        thr = 0.0 if k == self.bins - 1 else float(sigmoid(edge[k] / temperature))
+        return {
+            "threshold": thr,
+            "target_recall": target_recall,
+            "achieved_recall": float(recall[k]),
+            "precision_at_threshold": float(tp[k] / max(1, tp[k] + fp[k])),
+            "auc_roc": self.auc(),
+        }
@@ -0,0 +1,160 @@
+import math, time
+import numpy as np
+from .calibration import ScoreHistogram, margins
+from .session import make_session
+
+# Early-exit stage in front of the main model. A stage maps a normalized
+# batch to per-tile features, and the features to a score where higher
+# means "maybe an event". Tiles scoring below the cascade threshold are
+# reported as background without running the main model. Stage and
+# threshold are fitted by calibrate_threshold.py --cascade together with
+# the main threshold and stored under "cascade" in calibration.json.
+#   stats  per-band mean, variance and saturated fraction, combined by a
+#          logistic model fitted on the calibration split
+#   onnx   logit margin of a smaller model (e.g. train.py --base 4)
+
+def fit_logistic(f, y, l2: float = 1e-2, iters: int = 25):
+    """Ridge logistic regression by Newton steps; returns (w, b) on standardized `f`."""
+    X = np.c_[f, np.ones(len(f))]
+    y = np.asarray(y, dtype=np.float64)
+    beta = np.zeros(X.shape[1])
+    reg = np.full(X.shape[1], l2 * len(X)); reg[-1] = 0.0
+    for _ in range(iters):
+        p = 1.0 / (1.0 + np.exp(-np.clip(X @ beta, -30, 30)))
+        g = X.T @ (p - y) + reg * beta
+        h = (X * (p * (1 - p))[:, None]).T @ X + np.diag(reg) + 1e-9 * np.eye(len(beta))
+        step = np.linalg.solve(h, g)
+        beta -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return beta[:-1], float(beta[-1])
+
+class StatsStage:
+    kind = "stats"
+
+    def __init__(self, sat=0.999, mu=None, sd=None, w=None, b=0.0):
+        self.sat, self.b = float(sat), float(b)
+        self.mu, self.sd, self.w = (None if v is None else np.asarray(v, dtype=np.float32) for v in (mu, sd, w))
+
+    def features(self, x: np.ndarray) -> np.ndarray:
+        """[N, 3C]: per-band mean, variance and fraction of pixels at or above `sat`."""
+        v = x.reshape(len(x), x.shape[1], -1)
+        mean = v.mean(axis=2)
+        var = np.square(v).mean(axis=2) - np.square(mean)
+        return np.concatenate([mean, var, (v >= self.sat).mean(axis=2, dtype=np.float32)], axis=1)
+
+    def fit(self, f, y):
+        self.mu, self.sd = f.mean(axis=0), f.std(axis=0) + 1e-6
+        w, self.b = fit_logistic((f - self.mu) / self.sd, np.asarray(y) > 0)
+        self.w = w.astype(np.float32)
+
+    def score(self, f) -> np.ndarray:
+        return ((f - self.mu) / self.sd) @ self.w + self.b
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "sat": self.sat, "mu": self.mu.tolist(), "sd": self.sd.tolist(),
+                "w": self.w.tolist(), "b": self.b}
+
+class ModelStage:
+    kind = "onnx"
+
+    def __init__(self, onnx, profile="default"):
+        self.onnx = str(onnx)
+        self.sess = make_session(onnx, profile)
+
+    def features(self, x: np.ndarray) -> np.ndarray:
+        return margins(self.sess.run(None, {"input": x})[0])[:, None]
+
+    def fit(self, f, y):
+        pass
+
+    def score(self, f) -> np.ndarray:
+        return f[:, 0]
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "onnx": self.onnx}
+
+def make_stage(spec, profile="default"):
+    """"stats" or the path of a smaller ONNX model with the main model's input."""
+    return StatsStage() if spec == "stats" else ModelStage(spec, profile)
+
+def stage_threshold(s, y, max_loss: float):
+    """Threshold passing all but `max_loss` of the events; returns (threshold, stage recall).
+
+    The highest such threshold is lowered to just above the background it
+    rejects anyway, so events between the two are not lost for nothing.
+    """
+    s, y = np.asarray(s), np.asarray(y) > 0
+    ev = np.sort(s[y])[::-1]
+    if not len(ev):
+        return -math.inf, 1.0
+    k = max(1, math.ceil((1.0 - max_loss) * len(ev) - 1e-9))
+    thr = ev[k - 1]
+    bg = s[~y & (s < thr)]
+    thr = float(np.nextafter(bg.max(), np.inf)) if len(bg) else float(ev[-1])
+    return thr, float((ev >= thr).mean())
+
+class Cascade:
+    """Splits a batch into tiles rejected by the stage and tiles passed on to the main model.
+
+    Counts tiles, rejections and the time spent in the stage and in the
+    main model, for the skip rate and the estimated inference speedup.
+    """
+
+    def __init__(self, stage, threshold: float):
+        self.stage, self.threshold = stage, float(threshold)
+        self.tiles = self.skipped = self.stage_ns = self.model_ns = self.model_tiles = 0
+
+    @classmethod
+    def from_dict(cls, d, profile="default"):
+        if d["kind"] == "stats":
+            stage = StatsStage(d["sat"], d["mu"], d["sd"], d["w"], d["b"])
+        else:
+            stage = ModelStage(d["onnx"], profile)
+        return cls(stage, d["threshold"])
+
+    def passes(self, x: np.ndarray) -> np.ndarray:
+        t0 = time.perf_counter_ns()
+        go = self.stage.score(self.stage.features(x)) >= self.threshold
+        self.stage_ns += time.perf_counter_ns() - t0
+        self.tiles += len(go); self.skipped += len(go) - int(go.sum())
+        return go
+
+    def model_time(self, n: int, ns: int):
+        self.model_tiles += n; self.model_ns += ns
+
+    def report(self) -> dict:
+        out = {"tiles": self.tiles, "skipped": self.skipped,
+               "skip_rate": self.skipped / self.tiles if self.tiles else 0.0}
+        if self.model_tiles:
+            # the main model's per-tile cost over every tile, against stage + model on the rest
+            full = self.model_ns / self.model_tiles * self.tiles
+            out["infer_speedup"] = full / (self.stage_ns + self.model_ns)
+        return out
+
+def calibrate_cascade(stage, clf, tiles, target_recall: float, max_loss: float, hist):
+    """Fit `stage` and its threshold on `tiles`, jointly with the main model's histogram.
+
+    The stage keeps at least 1 - `max_loss` of the events; `hist` gets the
+    main model's margins of the tiles it passes, and the recall target for
+    the main model is raised so the product of both recalls meets
+    `target_recall`. Returns (cascade config, main-model recall target,
+    histogram of every tile with early rejects in the bottom bin).
+    """
+    feats, d = [], []
+    for _, x in clf.iter_inputs(tiles):
+        feats.append(stage.features(x))
+        d.append(margins(clf.raw_logits(x)))
+    f, d, y = np.concatenate(feats), np.concatenate(d), tiles.labels > 0
+    stage.fit(f, y)
+    s = stage.score(f)
+    thr, stage_recall = stage_threshold(s, y, max_loss)
+    go = s >= thr
+    hist.add(d[go], y[go])
+    full = ScoreHistogram(hist.bins, hist.lo, hist.hi).add(np.where(go, d, hist.lo), y)
+    cfg = {**stage.to_dict(), "threshold": thr, "stage_recall": stage_recall, "skip_rate": float(1 - go.mean())}
+    return cfg, min(1.0, target_recall / stage_recall), full
+
+def add_cascade_args(p):
+    p.add_argument("--cascade", type=str, default=None, help='fit an early-exit stage: "stats" or a smaller .onnx model')
+    p.add_argument("--cascade_loss", type=float, default=0.01, help="fraction of events the stage may reject")
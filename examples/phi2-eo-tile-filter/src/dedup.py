@@ -0,0 +1,105 @@
+from functools import lru_cache
+import numpy as np
+
+# Near-duplicate tiles (open ocean, cloud banks, overlapping passes) reuse
+# the decision of an earlier tile instead of running the model. Tiles are
+# keyed by a 64-bit DCT perceptual hash computed from the decoded batch; the
+# hashes and results of scored tiles sit in a fixed-capacity table with
+# least-recently-used eviction (stamp clock as in src.score_cache), searched
+# by Hamming distance in one vectorized pass per batch; duplicates within a
+# batch follow its first such tile. Only tiles the model (or cascade)
+# scored are entered, so every hit points at a tile that went through the
+# normal path.
+
+if hasattr(np, "bitwise_count"):
+    def popcount(v):
+        return np.bitwise_count(v)
+else:  # numpy < 2.0
+    _BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+    def popcount(v):
+        b = np.ascontiguousarray(v).view(np.uint8).reshape(*v.shape, 8)
+        return _BITS[b].sum(axis=-1, dtype=np.uint8)
+
+def dct_matrix(n: int) -> np.ndarray:
+    k, i = np.arange(n)[:, None], np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+@lru_cache(maxsize=8)
+def hash_basis(size: int, n: int = 32) -> np.ndarray:
+    """[8, size]: shrink `size` samples to n (block sums, or nearest when n does not divide size), then the 8 lowest DCT rows."""
+    n = min(n, size)
+    s = np.zeros((n, size))
+    if size % n == 0:
+        s[np.arange(size) // (size // n), np.arange(size)] = 1.0
+    else:
+        s[np.arange(n), (np.arange(n) * size) // n] = 1.0
+    return (dct_matrix(n)[:8] @ s).astype(np.float32)
+
+def phash(x: np.ndarray) -> np.ndarray:
+    """[N] uint64: signs of the 8x8 lowest DCT frequencies (DC excluded) of each band-summed tile against their median.
+
+    Shrinking to 32x32 is folded into the basis, so the hash is two small
+    matrix products per batch.
+    """
+    c = hash_basis(x.shape[-2]) @ x.sum(axis=1) @ hash_basis(x.shape[-1]).T
+    c = c.reshape(len(x), 64)[:, 1:]
+    bits = np.concatenate([c > np.median(c, axis=1, keepdims=True), np.zeros((len(x), 1), bool)], axis=1)
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+class DedupIndex:
+    """Up to `capacity` (hash, result row) pairs; lookup() matches within `max_dist` differing bits."""
+
+    def __init__(self, dtype, capacity: int = 4096, max_dist: int = 2):
+        self.max_dist = int(max_dist)
+        self.hashes = np.zeros(int(capacity), dtype=np.uint64)
+        self.stamp = np.zeros(int(capacity), dtype=np.uint64)  # 0 = free slot
+        self.rows = np.zeros(int(capacity), dtype=dtype)
+        self.clock = 0
+        self.lookups = self.hits = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.stamp))
+
+    def lookup(self, h: np.ndarray):
+        """(slot, lead) per tile of a batch.
+
+        slot is the nearest stored hash within max_dist, or -1. For tiles
+        without one, lead is the first tile of the batch they duplicate
+        (followed to a tile that duplicates none), else the tile itself.
+        """
+        slot = np.full(len(h), -1, dtype=np.int64)
+        used = np.flatnonzero(self.stamp)
+        if len(used) and len(h):
+            dist = popcount(h[:, None] ^ self.hashes[used][None, :])
+            best = dist.argmin(axis=1)
+            ok = dist[np.arange(len(h)), best] <= self.max_dist
+            slot[ok] = used[best[ok]]
+            if ok.any():
+                self.clock += 1
+                self.stamp[slot[ok]] = self.clock
+        lead = (popcount(h[:, None] ^ h[None, :]) <= self.max_dist).argmax(axis=1)  # first match, at most the tile itself
+        while (lead[lead] != lead).any():
+            lead = lead[lead]
+        idx = np.arange(len(h))
+        lead = np.where(slot >= 0, idx, lead)
+        self.lookups += len(h)
+        self.hits += int(np.count_nonzero((slot >= 0) | (lead != idx)))
+        return slot, lead
+
+    def put(self, h: np.ndarray, rows: np.ndarray):
+        h, rows = h[-len(self.stamp):], rows[-len(self.stamp):]
+        free = np.flatnonzero(self.stamp == 0)[:len(h)]
+        short = len(h) - len(free)
+        if short > 0:
+            used = np.flatnonzero(self.stamp)
+            free = np.concatenate([free, used[np.argpartition(self.stamp[used], short - 1)[:short]]])
+        self.clock += 1
+        self.hashes[free], self.rows[free], self.stamp[free] = h, rows, self.clock
+
+def add_dedup_args(p):
+    p.add_argument("--dedup", action="store_true", help="reuse the decision of a near-duplicate earlier tile")
+    p.add_argument("--dedup_entries", type=int, default=4096, help="tiles kept in the dedup index (LRU)")
+    p.add_argument("--dedup_dist", type=int, default=2, help="max differing hash bits (of 63) for a duplicate")
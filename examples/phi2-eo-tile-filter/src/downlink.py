@@ -0,0 +1,115 @@
+import errno, fcntl, json, os, shutil
+from pathlib import Path
+
+MODES = ("copy", "hardlink", "reflink", "manifest")
+FICLONE = 0x40049409  # linux/fs.h
+
+def size_stat(nbytes: int) -> os.stat_result:
+    """stat_result carrying only st_size, for tiles whose source file is not on this node."""
+    return os.stat_result((0,) * 6 + (int(nbytes), 0, 0, 0))
+
+def _kernel_copy(src: Path, dest: Path, size: int):
+    # copy_file_range stays in the kernel (and reflinks on btrfs/xfs); sendfile is the older fallback
+    with open(src, "rb") as fi, open(dest, "wb") as fo:
+        left = size
+        try:
+            while left > 0:
+                n = os.copy_file_range(fi.fileno(), fo.fileno(), left)
+                if n == 0:
+                    break
+                left -= n
+            return
+        except (AttributeError, OSError):
+            fo.seek(0); fo.truncate(); fi.seek(0)
+        try:
+            off = 0
+            while off < size:
+                n = os.sendfile(fo.fileno(), fi.fileno(), off, size - off)
+                if n == 0:
+                    break
+                off += n
+        except (AttributeError, OSError):
+            fo.seek(0); fo.truncate(); fi.seek(0)
+            shutil.copyfileobj(fi, fo)
+
+def _reflink(src: Path, dest: Path, size: int):
+    with open(src, "rb") as fi, open(dest, "wb") as fo:
+        try:
+            fcntl.ioctl(fo.fileno(), FICLONE, fi.fileno())
+            return
+        except OSError:
+            pass
+    _kernel_copy(src, dest, size)
+
+class DownlinkWriter:
+    """Keeps `out` in sync with the set of kept tiles without wiping it.
+
+    Files already present and up to date (same inode for hardlinks, same size
+    and not older than the source otherwise) are left alone; files no longer
+    selected are removed on close() (unless prune=False, for open-ended
+    inputs such as a stream or ring). In manifest mode no tile bytes are
+    written, only manifest.jsonl with source path and size.
+    """
+
+    def __init__(self, out, mode: str = "copy", prune: bool = True):
+        if mode not in MODES:
+            raise ValueError(f"unknown downlink mode {mode!r}, expected one of {MODES}")
+        self.out, self.mode, self.prune = Path(out), mode, prune
+        self.out.mkdir(parents=True, exist_ok=True)
+        self.existing = {p.name: p.stat() for p in self.out.iterdir() if p.is_file() and p.name != "manifest.jsonl"}
+        self.wanted = set()
+        self.manifest = open(self.out / "manifest.jsonl", "w") if mode == "manifest" else None
+        if self.manifest is None:
+            (self.out / "manifest.jsonl").unlink(missing_ok=True)
+        self.written = self.skipped = 0
+
+    def _fresh(self, name, st):
+        old = self.existing.get(name)
+        if old is None:
+            return False
+        if self.mode == "hardlink":
+            return (old.st_ino, old.st_dev) == (st.st_ino, st.st_dev)
+        # a leftover hardlink is not an independent copy
+        same_inode = (old.st_ino, old.st_dev) == (st.st_ino, st.st_dev)
+        return not same_inode and old.st_size == st.st_size and old.st_mtime >= st.st_mtime
+
+    def send(self, src: Path, st: os.stat_result) -> int:
+        if self.manifest:
+            self.manifest.write(json.dumps({"file": str(src), "size": st.st_size}) + "\n")
+            return st.st_size
+        self.wanted.add(src.name)
+        if self._fresh(src.name, st):
+            self.skipped += 1
+            return st.st_size
+        dest = self.out / src.name
+        if src.name in self.existing:
+            dest.unlink(missing_ok=True)
+        if self.mode == "hardlink":
+            try:
+                os.link(src, dest)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                _kernel_copy(src, dest, st.st_size)  # other filesystem: fall back to a copy
+        elif self.mode == "reflink":
+            _reflink(src, dest, st.st_size)
+        else:
+            _kernel_copy(src, dest, st.st_size)
+        # later tiles with this name this run (same basename, a re-delivered tile) see what is there now
+        self.existing[src.name] = dest.stat()
+        self.written += 1
+        return st.st_size
+
+    def close(self, prune: bool = True):
+        if prune:
+            for name in set(self.existing) - self.wanted:
+                (self.out / name).unlink(missing_ok=True)
+        if self.manifest:
+            self.manifest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # keep stale files if the run died part way; the next run prunes them
+        self.close(prune=self.prune and exc_type is None)
@@ -0,0 +1,216 @@
+import time
+from pathlib import Path
+import numpy as np
+from .cascade import Cascade
+from .dedup import DedupIndex, add_dedup_args, phash
+from .records import EXIT_STAGES
+from .score_cache import ScoreCache
+from .session import add_session_args, file_sha256, make_session, resolve_optimized_dir, verify_model
+from .tiles import TileLoader, TileSet, add_loader_args
+from .trace import add_trace_args, span, tracer
+from . import trace
+
+# one row per tile, in input order
+RESULT_DTYPE = np.dtype([
+    ("prob_event", np.float32),
+    ("max_prob", np.float32),
+    ("pred_class", np.int8),
+    ("latency_ms", np.float32),
+    ("exit_stage", np.int8),  # index into records.EXIT_STAGES
+])
+EXIT_CASCADE, EXIT_DEDUP = EXIT_STAGES.index("cascade"), EXIT_STAGES.index("dedup")
+
+def softmax(z):
+    z = z - np.max(z, axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / np.sum(e, axis=1, keepdims=True)
+
+def add_engine_args(p):
+    p.add_argument("--batch_size", "--batch-size", type=int, default=1, help="tiles per sess.run call")
+    p.add_argument("--bands", type=int, default=3, help="input channels; >3 needs .npy/.tif tiles")
+    add_loader_args(p)
+    add_session_args(p)
+    add_trace_args(p)
+    add_dedup_args(p)
+    p.add_argument("--score_cache", type=str, default=None, help="directory of cached logits; reruns skip decode and inference")
+    p.add_argument("--cache_entries", type=int, default=100_000, help="max tiles kept in --score_cache (LRU)")
+    p.add_argument("--no_cascade", action="store_true", help="ignore the early-exit stage in --calibration")
+
+class TileClassifier:
+    """ONNX tile scorer shared by the filter, calibration, eval and telemetry CLIs.
+
+    Owns the session, preprocessing (via TileLoader), batching and temperature
+    scaling. latency_ms covers sess.run + softmax, amortized over the batch.
+    With a ScoreCache, tiles whose raw logits are cached skip decode and
+    sess.run entirely; temperature is applied after the lookup.
+    With a Cascade, predict() runs the main model only on the tiles the
+    cascade stage passes; the rest come back as background with
+    exit_stage EXIT_CASCADE. With a DedupIndex, tiles whose perceptual hash
+    matches an earlier scored tile get its result back with exit_stage
+    EXIT_DEDUP and are not scored. The score cache path uses neither.
+    `t_first` is the wall-clock time the first results were produced.
+    """
+
+    def __init__(self, onnx, size=64, temperature=1.0, batch=1, workers=0, prefetch=4, processes=False,
+                 bands=3, cache_dir=None, cache_entries=100_000, profile="default", session_config=None,
+                 optimized_dir=None, model_digest=None, ort_profile=None, cascade=None, dedup=None):
+        self.onnx = Path(onnx)
+        self.size, self.bands, self.temperature, self.batch = size, bands, float(temperature), max(1, batch)
+        self.workers, self.prefetch, self.processes = workers, prefetch, processes
+        self._sha = verify_model(self.onnx, model_digest) if model_digest else None
+        self.t_first = None
+        self.sess = make_session(self.onnx, profile, session_config, optimized_dir,
+                                 self.model_sha256 if optimized_dir else None, ort_profile)
+        self.cascade, self.dedup = cascade, dedup
+        self.cache = None
+        if cache_dir:
+            self.cache = ScoreCache(cache_dir, self.model_sha256, size, bands, cache_entries)
+
+    @classmethod
+    def from_args(cls, a, **kw):
+        trace.start(a)
+        cfg = getattr(a, "cascade_cfg", None)
+        if cfg and not a.no_cascade:
+            kw.setdefault("cascade", Cascade.from_dict(cfg, a.session_profile))
+        if a.dedup:
+            kw.setdefault("dedup", DedupIndex(RESULT_DTYPE, a.dedup_entries, a.dedup_dist))
+        return cls(a.onnx, size=a.size, temperature=getattr(a, "temperature", 1.0), batch=a.batch_size,
+                   workers=a.workers, prefetch=a.prefetch, processes=a.decode_procs,
+                   bands=a.bands, cache_dir=a.score_cache, cache_entries=a.cache_entries,
+                   profile=a.session_profile, session_config=a.session_config, optimized_dir=resolve_optimized_dir(a),
+                   model_digest=a.model_digest, ort_profile=a.ort_profile, **kw)
+
+    @property
+    def model_sha256(self) -> str:
+        if self._sha is None:
+            self._sha = file_sha256(self.onnx)
+        return self._sha
+
+    def raw_logits(self, x: np.ndarray) -> np.ndarray:
+        with span("infer"):
+            return self.sess.run(None, {"input": x})[0]
+
+    def logits(self, x: np.ndarray) -> np.ndarray:
+        return self._scale(self.raw_logits(x))
+
+    def _scale(self, z):
+        if self.temperature != 1.0:
+            z = z / self.temperature
+        return z
+
+    def _results(self, z, latency_ms) -> np.ndarray:
+        with span("postprocess"):
+            prob = softmax(self._scale(z))
+            res = np.empty(len(z), dtype=RESULT_DTYPE)
+            res["latency_ms"] = latency_ms
+            res["prob_event"] = prob[:, 1]
+            res["max_prob"] = prob.max(axis=1)
+            res["pred_class"] = prob.argmax(axis=1)
+            res["exit_stage"] = 0
+        tracer.count("tiles", len(z))
+        if self.t_first is None:
+            self.t_first = time.time()
+        return res
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        tracer.tick()
+        t0 = time.perf_counter()
+        res = self._score(x) if self.dedup is None else self._predict_dedup(x)
+        res["latency_ms"] = (time.perf_counter() - t0) * 1000 / max(1, len(x))
+        return res
+
+    def _score(self, x):
+        return self._results(self.raw_logits(x), 0.0) if self.cascade is None else self._predict_cascade(x)
+
+    def _predict_dedup(self, x):
+        with span("dedup"):
+            h = phash(x)
+            slot, lead = self.dedup.lookup(h)
+        hit = slot >= 0
+        dup = hit | (lead != np.arange(len(x)))
+        res = np.empty(len(x), dtype=RESULT_DTYPE)
+        res[hit] = self.dedup.rows[slot[hit]]
+        if not dup.all():
+            run = ~dup
+            r = self._score(x if not dup.any() else x[run])
+            res[run] = r
+            self.dedup.put(h[run], r)
+        elif self.t_first is None:
+            self.t_first = time.time()
+        res[dup & ~hit] = res[lead[dup & ~hit]]
+        res["exit_stage"][dup] = EXIT_DEDUP
+        tracer.count("dedup_hits", int(dup.sum()))
+        return res
+
+    def _predict_cascade(self, x):
+        go = self.cascade.passes(x)
+        res = np.zeros(len(x), dtype=RESULT_DTYPE)
+        res["max_prob"], res["exit_stage"] = 1.0, EXIT_CASCADE
+        tracer.count("cascade_skipped", len(x) - int(go.sum()))
+        if go.any():
+            t0 = time.perf_counter_ns()
+            res[go] = self._results(self.raw_logits(x if go.all() else x[go]), 0.0)
+            self.cascade.model_time(int(go.sum()), time.perf_counter_ns() - t0)
+        elif self.t_first is None:
+            self.t_first = time.time()
+        return res
+
+    def iter_batches(self, tiles):
+        """Yield (paths, results) per batch; `tiles` is a TileSet or an iterable of PNG paths."""
+        tiles = tiles if isinstance(tiles, TileSet) else TileSet(tiles)
+        if self.cache is not None:
+            yield from self._iter_cached(tiles)
+            return
+        for chunk, x in self._loader(tiles):
+            yield chunk, self.predict(x)
+
+    def iter_inputs(self, tiles):
+        """Yield (paths, preprocessed batch) per batch, without scoring."""
+        tiles = tiles if isinstance(tiles, TileSet) else TileSet(tiles)
+        return iter(self._loader(tiles))
+
+    def iter_logits(self, tiles):
+        """Yield (paths, raw pre-temperature logits) per batch, through the score cache when set."""
+        tiles = tiles if isinstance(tiles, TileSet) else TileSet(tiles)
+        if self.cache is not None:
+            z, _ = self._cached_logits(tiles)
+            for i in range(0, len(tiles), self.batch):
+                yield tiles.paths[i:i + self.batch], z[i:i + self.batch]
+            return
+        for chunk, x in self._loader(tiles):
+            yield chunk, self.raw_logits(x)
+
+    def _loader(self, tiles):
+        return TileLoader(tiles, self.size, self.batch, self.workers, self.prefetch, self.processes, self.bands)
+
+    def _cached_logits(self, tiles):
+        keys = [self.cache.key(tiles.content(i)) for i in range(len(tiles))]
+        z, hit = self.cache.get_many(keys)
+        lat = np.zeros(len(tiles), dtype=np.float32)
+        miss = np.flatnonzero(~hit)
+        done = 0
+        tracer.count("cache_hits", int(hit.sum()))
+        for chunk, x in self._loader(tiles.subset(miss)):
+            tracer.tick()
+            t0 = time.perf_counter()
+            zb = self.raw_logits(x)
+            idx = miss[done:done + len(chunk)]
+            z[idx] = zb
+            lat[idx] = (time.perf_counter() - t0) * 1000 / len(chunk)
+            self.cache.put_many([keys[i] for i in idx], zb)
+            done += len(chunk)
+        self.cache.flush()
+        return z, lat
+
+    def _iter_cached(self, tiles):
+        paths = tiles.paths
+        z, lat = self._cached_logits(tiles)
+        for i in range(0, len(paths), self.batch):
+            t0 = time.perf_counter()
+            res = self._results(z[i:i + self.batch], 0.0)
+            res["latency_ms"] = lat[i:i + self.batch] + (time.perf_counter() - t0) * 1000 / len(res)
+            yield paths[i:i + self.batch], res
+
+    def score(self, tiles) -> np.ndarray:
+        parts = [res for _, res in self.iter_batches(tiles)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RESULT_DTYPE)
@@ -1,37 +1,31 @@
 import argparse
-from pathlib import Path
 import numpy as np
-from PIL import Image
-import onnxruntime as ort
-from sklearn.metrics import accuracy_score, confusion_matrix
-
-def softmax(z):
-    z = z - np.max(z, axis=1, keepdims=True)
-    e = np.exp(z)
-    return e / np.sum(e, axis=1, keepdims=True)
+from .engine import TileClassifier, add_engine_args
+from .session import startup_ms
+from .tiles import CLASSES, TileSet
+from . import trace
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--onnx", required=True)
     p.add_argument("--data", required=True)
-    p.add_argument("--bands", type=int, default=3)
     p.add_argument("--size", type=int, default=64)
+    add_engine_args(p)
     a = p.parse_args()
 
-    sess = ort.InferenceSession(a.onnx, providers=["CPUExecutionProvider"])
-    ys, xs = [], []
-    files = []
-    for cls, name in enumerate(["background", "event"]):
-        files += [(f, cls) for f in sorted((Path(a.data) / name).glob("*.png"))]
-    for f, cls in files:
-        img = Image.open(f).convert("RGB").resize((a.size, a.size))
-        x = np.transpose(np.asarray(img, dtype=np.float32) / 255.0, (2, 0, 1))[None, ...]
-        prob = softmax(sess.run(None, {"input": x})[0])
-        xs.append(prob.argmax(1)[0]); ys.append(cls)
-    acc = accuracy_score(ys, xs)
-    cm = confusion_matrix(ys, xs)
-    print("accuracy", float(acc))
+    clf = TileClassifier.from_args(a)
+    tiles = TileSet.open(a.data)
+    res = clf.score(tiles)
+    ys = tiles.labels; xs = res["pred_class"]
+    # rows true class, columns predicted (sklearn's confusion_matrix layout)
+    n = len(CLASSES)
+    cm = np.bincount(ys.astype(np.int64) * n + xs, minlength=n * n).reshape(n, n)
+    acc = float(np.mean(ys == xs)) if len(ys) else 0.0
+    print("accuracy", acc)
     print("confusion\n", cm)
+    if clf.t_first is not None:
+        print(f"startup_ms {startup_ms(clf.t_first):.0f}")
+    trace.finish(a, clf.sess)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .archive import ArchiveWriter
+from .tiles import CLASSES, labeled_files, load_tile_raw
+
+def splits(root: Path):
+    if any((root / c).is_dir() for c in CLASSES):
+        return [(root, None)]
+    return [(d, d.name) for d in sorted(root.iterdir()) if any((d / c).is_dir() for c in CLASSES)]
+
+def pack_split(src: Path, out: Path, size: int, workers: int = 0, bands: int = 3) -> int:
+    files = labeled_files(src)
+    decode = lambda f: load_tile_raw(f, size, bands)
+    dtype = decode(files[0][0]).dtype if files else "uint8"
+    w = ArchiveWriter(out, len(files), bands, size, dtype)
+    if workers > 0:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            tiles = pool.map(decode, [f for f, _ in files])
+            for i, ((f, cls), t) in enumerate(zip(files, tiles)):
+                w.put(i, t, cls, f, f.stat().st_size)
+    else:
+        for i, (f, cls) in enumerate(files):
+            w.put(i, decode(f), cls, f, f.stat().st_size)
+    w.close()
+    return len(files)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--data", required=True, help="tiles root (with train/ val/) or a single split")
+    p.add_argument("--out", required=True)
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--bands", type=int, default=3)
+    p.add_argument("--workers", type=int, default=0)
+    a = p.parse_args()
+
+    for src, name in splits(Path(a.data)):
+        dest = Path(a.out) / name if name else Path(a.out)
+        n = pack_split(src, dest, a.size, a.workers, a.bands)
+        print("packed", n, "tiles", src, "->", dest)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse, itertools, json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+import numpy as np
+from .bench_suite import run_config
+from .calibrate_threshold import calibrate
+from .engine import TileClassifier
+from .quantize_ptq import ACTIVATIONS, FORMATS, METHODS, TileReader, quantize
+from .tiles import TileSet
+
+# Quantize the FP32 model once per (method, per-channel, activation type,
+# format), then score every variant on a labelled split and time it with the
+# bench_suite harness. Recall is measured at the deployed threshold (from
+# --calibration, else calibrated on the FP32 model), so "meets" means the
+# variant can replace FP32 without recalibrating.
+
+def pareto(rows, speed="p50_ms", quality="recall_at_threshold"):
+    """Flag rows no other row beats on both latency (lower) and quality (higher)."""
+    for r in rows:
+        r["pareto"] = "error" not in r and not any(
+            "error" not in o and o is not r and o[speed] <= r[speed] and o[quality] >= r[quality]
+            and (o[speed] < r[speed] or o[quality] > r[quality]) for o in rows)
+    return rows
+
+def evaluate(onnx, tiles, a, threshold, temperature=1.0):
+    # same temperature and session as the deployed filter, so the threshold means the same
+    clf = TileClassifier(onnx, size=a.size, temperature=temperature, batch=a.batch_size, bands=a.bands,
+                         workers=a.workers, profile=a.session_profile)
+    xs = clf.score(tiles)["prob_event"].astype(np.float64)
+    ys = tiles.labels > 0
+    kept = xs >= threshold
+    own = calibrate(tiles.labels, xs, a.target_recall)
+    return {
+        "recall_at_threshold": float(kept[ys].mean()) if ys.any() else 0.0,
+        "precision_at_threshold": float(ys[kept].mean()) if kept.any() else 0.0,
+        "kept_pct": float(100 * kept.mean()),
+        "own_threshold": own["threshold"],
+        "precision_at_target": own["precision_at_threshold"],
+        "auc_roc": own["auc_roc"],
+    }
+
+def bench(onnx, a):
+    cfg = {"onnx": str(onnx), "profile": a.session_profile, "batch": a.batch_size, "intra": None, "inter": None,
+           "opt": None, "size": a.size, "bands": a.bands}
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        r = pool.submit(run_config, cfg, a.iters, 10, None).result()
+    return {k: r[k] for k in ("p50_ms", "p99_ms", "tiles_per_s", "cold_start_ms", "peak_rss_mb")}
+
+def table(rows, target) -> str:
+    cols = ["name", "p50_ms", "tiles_per_s", "size_kb", "recall_at_threshold", "precision_at_threshold",
+            "kept_pct", "auc_roc", "meets", "pareto"]
+    out = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    for r in rows:
+        if "error" in r:
+            out.append(f"| {r['name']} | error: {r['error']} |")
+            continue
+        cells = [f"{r[c]:.3f}" if isinstance(r[c], float) else str(r[c]) for c in cols]
+        out.append("| " + " | ".join(cells) + " |")
+    out.append(f"\nmeets: recall at the deployed threshold >= {target}")
+    return "\n".join(out)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", required=True, help="FP32 model")
+    p.add_argument("--calib", required=True, help="calibration tiles or archive")
+    p.add_argument("--data", required=True, help="labelled split to score variants on")
+    p.add_argument("--out_dir", type=str, default="models/sweep")
+    p.add_argument("--methods", nargs="+", choices=list(METHODS), default=list(METHODS))
+    p.add_argument("--per_channel", nargs="+", choices=["on", "off"], default=["on", "off"])
+    p.add_argument("--activations", nargs="+", choices=list(ACTIVATIONS), default=list(ACTIVATIONS))
+    p.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    p.add_argument("--target_recall", type=float, default=0.95)
+    p.add_argument("--calibration", type=str, default=None, help="deployed calibration JSON (threshold to hold recall at)")
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--bands", type=int, default=3)
+    p.add_argument("--batch_size", "--batch-size", type=int, default=1, help="batch used for timing and scoring")
+    p.add_argument("--iters", type=int, default=200)
+    p.add_argument("--workers", type=int, default=0)
+    p.add_argument("--session_profile", type=str, default="default")
+    p.add_argument("--calib_budget", type=int, default=0)
+    p.add_argument("--calib_cache", type=str, default=None)
+    a = p.parse_args()
+
+    out = Path(a.out_dir); out.mkdir(parents=True, exist_ok=True)
+    tiles = TileSet.open(a.data)
+    cal = {}
+    if a.calibration:
+        with open(a.calibration) as f:
+            cal = json.load(f)
+        threshold = float(cal["threshold"])
+    else:
+        fp = TileClassifier(a.onnx, size=a.size, batch=a.batch_size, bands=a.bands,
+                            profile=a.session_profile).score(tiles)
+        threshold = calibrate(tiles.labels, fp["prob_event"].astype(np.float64), a.target_recall)["threshold"]
+    temperature = float(cal.get("temperature", 1.0))
+    print(f"threshold {threshold:.4f} temperature {temperature:g} target_recall {a.target_recall}")
+
+    # one decode of the calibration set for every variant
+    reader = TileReader(a.calib, a.size, a.bands, budget=a.calib_budget, workers=a.workers,
+                        cache_dir=a.calib_cache or out / ".calib")
+    variants = [("fp32", Path(a.onnx), {})]
+    for m, pc, act, fmt in itertools.product(a.methods, a.per_channel, a.activations, a.formats):
+        name = f"{m}-{'pc' if pc == 'on' else 'pt'}-{act}-{fmt}"
+        variants.append((name, out / f"{name}.onnx", dict(method=m, per_channel=pc == "on", activation=act, fmt=fmt)))
+
+    rows = []
+    for name, path, cfg in variants:
+        row = {"name": name, **cfg}
+        try:
+            if cfg:
+                quantize(a.onnx, path, reader, **cfg)
+            row.update(size_kb=path.stat().st_size / 1024, **evaluate(path, tiles, a, threshold, temperature), **bench(path, a))
+            row["meets"] = row["recall_at_threshold"] >= a.target_recall
+        except Exception as e:  # e.g. an operator without a kernel for this format/type pair
+            row["error"] = f"{type(e).__name__}: {str(e).splitlines()[0][:120]}"
+        rows.append(row)
+        print(name, {k: row[k] for k in ("p50_ms", "recall_at_threshold") if k in row} or row.get("error"))
+
+    rows = pareto(sorted(rows, key=lambda r: r.get("p50_ms", float("inf"))))
+    best = next((r for r in rows if r.get("meets")), None)
+    with open(out / "sweep.json", "w") as f:
+        json.dump({"threshold": threshold, "target_recall": a.target_recall, "pick": best and best["name"], "variants": rows},
+                  f, indent=2, default=str)
+    md = table(rows, a.target_recall)
+    (out / "sweep.md").write_text(md + "\n")
+    print(md)
+    print("pick", best["name"] if best else "none meets target_recall", "->", out / "sweep.json")
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,112 @@
-import argparse
+import argparse, hashlib, json, os
 from pathlib import Path
 import numpy as np
-from PIL import Image
-from onnxruntime.quantization import CalibrationDataReader, quantize_static, QuantType, QuantFormat
+from onnxruntime.quantization import CalibrationDataReader, CalibrationMethod, quantize_static, QuantType, QuantFormat
+from .archive import is_archive
+from .tiles import CLASSES, TileLoader, TileSet, find_tiles, labeled_files
+
+def calib_tiles(folder) -> TileSet:
+    """Archive, class folders (listed per class, no recursive walk) or any tile tree; labels where known."""
+    if is_archive(folder):
+        return TileSet.open(folder)
+    if any((Path(folder) / c).is_dir() for c in CLASSES):
+        files = labeled_files(folder)
+        return TileSet([f for f, _ in files], np.array([c for _, c in files], dtype=np.int8))
+    return TileSet(sorted(find_tiles(folder)))
+
+def stratified(labels, budget: int, seed: int = 0) -> np.ndarray:
+    """Sorted indices of about `budget` tiles, each class in proportion to its share (at least one each)."""
+    labels = np.asarray(labels)
+    if budget <= 0 or budget >= len(labels):
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    picked = []
+    for c in np.unique(labels):
+        idx = np.flatnonzero(labels == c)
+        k = min(len(idx), max(1, round(budget * len(idx) / len(labels))))
+        picked.append(rng.choice(idx, k, replace=False))
+    return np.sort(np.concatenate(picked))
 
 class TileReader(CalibrationDataReader):
-    def __init__(self, folder, size=64, bands=3, batch=8):
-        self.files = sorted(list(Path(folder).glob("**/*.png")))
+    """Calibration batches for quantize_static.
+
+    `budget` keeps a class-stratified sample instead of every tile. With
+    `cache_dir` the preprocessed float32 tensor is written once to
+    calib-<key>.npy (key: selected files with size/mtime, size, bands) and
+    later readers, e.g. the next quantization experiment, memory-map it
+    instead of decoding. rewind() replays the same batches for another
+    quantize_static call in the same process.
+    """
+
+    def __init__(self, folder, size=64, bands=3, batch=8, budget=0, seed=0, workers=0, cache_dir=None):
+        tiles = calib_tiles(folder)
+        labels = tiles.labels if tiles.labels is not None else np.zeros(len(tiles), dtype=np.int8)
+        tiles = tiles.subset(stratified(labels, budget, seed))
+        self.files = tiles.paths
+        self.loader = TileLoader(tiles, size, batch, workers, bands=bands)
         self.size, self.bands, self.batch = size, bands, batch
+        self.data = self._cached(tiles, Path(cache_dir)) if cache_dir else None
         self._it = None
 
+    def _key(self, tiles) -> str:
+        h = hashlib.sha256(json.dumps([self.size, self.bands]).encode())
+        if tiles.archive is not None:
+            st = (tiles.archive.root / "tiles.npy").stat()
+            h.update(f"{tiles.archive.root.resolve()}|{st.st_size}|{st.st_mtime_ns}".encode())
+            h.update(np.asarray(tiles.rows).tobytes())
+        else:
+            for p in tiles.paths:
+                st = p.stat()
+                h.update(f"{p.resolve()}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+        return h.hexdigest()[:16]
+
+    def _cached(self, tiles, cache_dir: Path) -> np.ndarray:
+        path = cache_dir / f"calib-{self._key(tiles)}.npy"
+        if not path.exists():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32,
+                                            shape=(len(tiles), self.bands, self.size, self.size))
+            i = 0
+            for _, x in self.loader:
+                out[i:i + len(x)] = x
+                i += len(x)
+            out.flush(); del out
+            os.replace(tmp, path)
+        return np.load(path, mmap_mode="r")
+
     def get_next(self):
         if self._it is None:
-            def gen():
-                for i in range(0, len(self.files), self.batch):
-                    xs = []
-                    for p in self.files[i:i+self.batch]:
-                        img = Image.open(p).convert("RGB").resize((self.size, self.size))
-                        x = np.asarray(img, dtype=np.float32) / 255.0
-                        xs.append(np.transpose(x, (2, 0, 1))[None, ...])
-                    yield {"input": np.concatenate(xs, axis=0)}
-            self._it = gen()
+            if self.data is not None:
+                self._it = ({"input": np.ascontiguousarray(self.data[i:i + self.batch])}
+                            for i in range(0, len(self.data), self.batch))
+            else:
+                self._it = ({"input": x} for _, x in self.loader)
         return next(self._it, None)
 
+    def rewind(self):
+        self._it = None
+
+METHODS = {"minmax": CalibrationMethod.MinMax, "entropy": CalibrationMethod.Entropy, "percentile": CalibrationMethod.Percentile}
+ACTIVATIONS = {"qint8": QuantType.QInt8, "quint8": QuantType.QUInt8}
+FORMATS = {"qdq": QuantFormat.QDQ, "qoperator": QuantFormat.QOperator}
+
+def quantize(onnx, out, reader: TileReader, method="minmax", per_channel=True, activation="qint8", fmt="qdq"):
+    Path(Path(out).parent).mkdir(parents=True, exist_ok=True)
+    reader.rewind()
+    quantize_static(
+        model_input=onnx,
+        model_output=out,
+        calibration_data_reader=reader,
+        quant_format=FORMATS[fmt],
+        activation_type=ACTIVATIONS[activation],
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        reduce_range=False,
+        calibrate_method=METHODS[method],
+        extra_options={"ActivationSymmetric": False},
+    )
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--onnx", required=True)
@@ -30,20 +114,19 @@ def main():
     ap.add_argument("--out", required=True)
     ap.add_argument("--size", type=int, default=64)
     ap.add_argument("--bands", type=int, default=3)
+    ap.add_argument("--calib_batch", type=int, default=8, help="tiles per calibration batch")
+    ap.add_argument("--calib_budget", type=int, default=0, help="calibrate on this many tiles, stratified by class (0 = all)")
+    ap.add_argument("--seed", type=int, default=0, help="subsampling seed")
+    ap.add_argument("--workers", type=int, default=0, help="decode threads")
+    ap.add_argument("--calib_cache", type=str, default=None, help="keep preprocessed calibration tensors here for later runs")
+    ap.add_argument("--method", choices=list(METHODS), default="minmax", help="activation range calibration")
+    ap.add_argument("--per_tensor", action="store_true", help="one weight scale per tensor instead of per channel")
+    ap.add_argument("--activation", choices=list(ACTIVATIONS), default="qint8")
+    ap.add_argument("--format", choices=list(FORMATS), default="qdq")
     a = ap.parse_args()
 
-    Path(Path(a.out).parent).mkdir(parents=True, exist_ok=True)
-    quantize_static(
-        model_input=a.onnx,
-        model_output=a.out,
-        calibration_data_reader=TileReader(a.calib, a.size, a.bands),
-        quant_format=QuantFormat.QDQ,
-        activation_type=QuantType.QInt8,
-        weight_type=QuantType.QInt8,
-        per_channel=True,
-        reduce_range=False,
-        extra_options={"ActivationSymmetric": False},
-    )
+    reader = TileReader(a.calib, a.size, a.bands, a.calib_batch, a.calib_budget, a.seed, a.workers, a.calib_cache)
+    quantize(a.onnx, a.out, reader, a.method, not a.per_tensor, a.activation, a.format)
     print("Wrote", a.out)
 
 if __name__ == "__main__":
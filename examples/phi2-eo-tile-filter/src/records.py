@@ -0,0 +1,41 @@
+import time
+import numpy as np
+
+# Log layouts shared by the filter, telemetry and single-pass run. Values
+# fixed for a run go into the header; rows are logged per batch as columns
+# (src.telemetry). iter_records() merges the two back into the per-tile
+# dicts these logs always had.
+
+# values of the exit_stage column: what decided a tile (src.engine RESULT_DTYPE)
+EXIT_STAGES = ("model", "cascade", "dedup")
+
+def downlink_header(model_sha, threshold, temperature):
+    return {"kind": "downlink", "model_sha256": model_sha, "threshold": float(threshold), "temperature": float(temperature)}
+
+def downlink_columns(chunk, res, keep, sizes):
+    return {
+        "timestamp": np.full(len(chunk), time.time()),
+        "file": [str(p) for p in chunk],
+        "size": np.asarray(sizes, dtype=np.int64),
+        "prob_event": res["prob_event"],
+        "pred_class": res["pred_class"],
+        "ok": np.asarray(keep, dtype=bool),
+        "latency_ms": res["latency_ms"],
+        "exit_stage": res["exit_stage"],
+    }
+
+def telemetry_header(model_sha, threshold):
+    return {"kind": "telemetry", "model_sha256": model_sha, "threshold": float(threshold)}
+
+def telemetry_columns(chunk, labels, res, threshold):
+    # tiles of a batch finish together; one timestamp per batch
+    return {
+        "timestamp": np.full(len(chunk), time.time()),
+        "file": [str(p) for p in chunk],
+        "true_class": np.asarray(labels, dtype=np.int8),
+        "pred_class": res["pred_class"],
+        "max_prob": res["max_prob"],
+        "prob_event": res["prob_event"],
+        "ok_flag": res["max_prob"] >= threshold,
+        "latency_ms": res["latency_ms"],
+    }
@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+def build_metrics(cal: dict, latencies_ms, tiles_total: int, tiles_kept: int) -> dict:
+    lat = list(latencies_ms)
+    saved_pct = 100.0 * (1.0 - tiles_kept / max(1, tiles_total))
+    precision = cal.get("precision_at_threshold")
+    recall = cal.get("achieved_recall")
+    f1 = (2*precision*recall/(precision+recall)) if precision and recall and (precision+recall)>0 else 0.0
+    return {
+        "threshold": cal.get("threshold"),
+        "target_recall": cal.get("target_recall"),
+        "achieved_recall": recall,
+        "precision": precision,
+        "f1": f1,
+        "auc_roc": cal.get("auc_roc"),
+        "avg_latency_ms": sum(lat) / len(lat) if lat else 0.0,
+        "tiles_total": tiles_total,
+        "tiles_kept": tiles_kept,
+        "bandwidth_saved_pct": round(saved_pct, 1),
+    }
+
+def write_report(metrics: dict, out_dir) -> Path:
+    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
+    with open(out/"metrics.json", "w") as f:
+        json.dump(metrics, f, indent=2)
+    with open(out/"summary.md", "w") as f:
+        f.write("# Run summary\n\n")
+        for k, v in metrics.items():
+            if not isinstance(v, list):
+                f.write(f"- **{k}**: {v}\n")
+        if metrics.get("throughput"):
+            f.write(f"\n## Throughput per {metrics['window_s']:g} s window\n\n| start | tiles | tiles/s |\n|---|---|---|\n")
+            for t, n, *r in metrics["throughput"]:
+                r = r[0] if r else n / metrics["window_s"]
+                f.write(f"| {t:.0f} | {n} | {'-' if r is None else f'{r:.1f}'} |\n")
+    return out
@@ -0,0 +1,63 @@
+import argparse, json, time
+from pathlib import Path
+import numpy as np
+from .bandwidth_filter import gate
+from .calibrate_threshold import calibrate
+from .downlink import MODES, DownlinkWriter
+from .engine import TileClassifier, add_engine_args
+from .records import downlink_header, telemetry_columns, telemetry_header
+from .report import build_metrics, write_report
+from .telemetry import TelemetryWriter
+from .tiles import TileSet
+from . import trace
+
+# Single pass over a labelled split: every tile is decoded and scored once,
+# then calibration, downlink decisions, telemetry and the report are all
+# derived from the same score array.
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", required=True)
+    p.add_argument("--data", required=True, help="labelled split (…/tiles/val) or a packed archive")
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--temperature", type=float, default=1.0)
+    p.add_argument("--target_recall", type=float, default=0.95)
+    p.add_argument("--calibration", type=str, default="calibration.json", help="where to write the calibration JSON")
+    p.add_argument("--downlink_out", type=str, default="downlink")
+    p.add_argument("--downlink_mode", choices=MODES, default="copy")
+    p.add_argument("--log_dir", type=str, default="logs")
+    p.add_argument("--out_dir", type=str, default="reports")
+    add_engine_args(p)
+    a = p.parse_args()
+
+    clf = TileClassifier.from_args(a)
+    tiles = TileSet.open(a.data)
+    paths, ys = tiles.paths, tiles.labels
+
+    t0 = time.time()
+    res = clf.score(tiles)
+    t_score = time.time() - t0
+
+    cal = calibrate(ys, res["prob_event"].astype(np.float64), a.target_recall)
+    cal.update({"temperature": a.temperature, "val_samples": int(len(ys)), "duration_s": float(t_score)})
+    with open(a.calibration, "w") as f:
+        json.dump(cal, f, indent=2)
+    thr = cal["threshold"]
+
+    logs = Path(a.log_dir); logs.mkdir(parents=True, exist_ok=True)
+    stats = tiles.stats()
+    header = downlink_header(clf.model_sha256, thr, a.temperature)
+    with TelemetryWriter(logs / "downlink.jsonl", header) as log, DownlinkWriter(a.downlink_out, a.downlink_mode) as writer:
+        kept, sent, total = gate([(paths, res, [stats[p] for p in paths])], thr, writer, log)
+    with TelemetryWriter(logs / "val.jsonl", telemetry_header(clf.model_sha256, thr)) as log:
+        log.write(telemetry_columns(paths, ys, res, thr))
+        trace.finish(a, clf.sess, log)
+
+    metrics = build_metrics(cal, res["latency_ms"].tolist(), len(paths), kept)
+    write_report(metrics, a.out_dir)
+    saved = 1 - sent / total if total > 0 else 0
+    print(f"tiles {len(paths)} kept {kept} threshold {thr:.3f} saved_bandwidth {saved*100:.1f}% "
+          f"score_s {t_score:.2f} elapsed_s {time.time()-t0:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse, time
+from pathlib import Path
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .bandwidth_filter import load_calibration
+from .engine import TileClassifier, add_engine_args
+from .telemetry import add_telemetry_args, open_log
+from .tiles import band_max
+from . import trace
+
+def axis_origins(n: int, size: int, stride: int) -> np.ndarray:
+    """Window origins along one axis: every `stride`, plus one flush with the far edge if the grid misses it."""
+    o = np.arange(0, n - size + 1, stride)
+    return o if o[-1] == n - size else np.append(o, n - size)
+
+def open_scene(path, shape=None, dtype="uint8") -> np.ndarray:
+    """[C, H, W] scene, memory-mapped: .npy directly, raw files need `shape`."""
+    path = Path(path)
+    if path.suffix == ".npy":
+        return np.load(path, mmap_mode="r")
+    if shape is None:
+        raise ValueError(f"{path}: raw scenes need --shape C,H,W")
+    return np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+
+class SceneTiler:
+    """Windows of a [C, H, W] scene as strided views; nothing is copied until a batch is built.
+
+    Windows run row-major over a grid of origins spaced `stride` apart
+    (stride < size overlaps). When the scene size is not on that grid, a
+    last row and column of windows aligned with the far edges covers the
+    remaining strip, overlapping their neighbours.
+    """
+
+    def __init__(self, scene: np.ndarray, size: int, stride: int = None):
+        if min(scene.shape[1:]) < size:
+            raise ValueError(f"scene is {scene.shape[1]}x{scene.shape[2]}, smaller than the {size}x{size} window")
+        self.scene, self.size, self.stride = scene, size, stride or size
+        # [C, H-size+1, W-size+1, size, size] -> window at every pixel origin, [y, x, C, size, size], still a view
+        self.windows = sliding_window_view(scene, (size, size), axis=(1, 2)).transpose(1, 2, 0, 3, 4)
+        self.rows = axis_origins(scene.shape[1], size, self.stride)
+        self.cols = axis_origins(scene.shape[2], size, self.stride)
+        self.grid = (len(self.rows), len(self.cols))
+        self.regular = len(range(0, scene.shape[2] - size + 1, self.stride))  # columns on the stride grid
+        self.scale = band_max(scene.dtype, scene.shape[0])
+
+    def __len__(self):
+        return self.grid[0] * self.grid[1]
+
+    def origins(self, i: int, j: int) -> np.ndarray:
+        """(row, col) pixel origins of flat windows i..j-1."""
+        k = np.arange(i, j)
+        return np.stack([self.rows[k // self.grid[1]], self.cols[k % self.grid[1]]], axis=1)
+
+    def batch(self, i: int, j: int) -> np.ndarray:
+        x = np.empty((j - i, self.scene.shape[0], self.size, self.size), dtype=np.float32)
+        k, cols = 0, self.grid[1]
+        while i < j:
+            r, c = divmod(i, cols)
+            n = min(j - i, cols - c)
+            row = self.windows[self.rows[r]]
+            m = max(0, min(n, self.regular - c))
+            x[k:k + m] = row[c * self.stride:(c + m - 1) * self.stride + 1:self.stride]  # single cast-copy out of the mapping
+            if m < n:
+                x[k + m] = row[self.cols[-1]]  # edge-aligned last column
+            i += n; k += n
+        x /= self.scale
+        return x
+
+    def batches(self, batch: int):
+        for i in range(0, len(self), batch):
+            j = min(len(self), i + batch)
+            yield i, j, self.batch(i, j)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", required=True)
+    p.add_argument("--scene", required=True, help="[C, H, W] .npy or raw raster")
+    p.add_argument("--shape", type=str, default=None, help="C,H,W for raw scenes")
+    p.add_argument("--dtype", type=str, default="uint8", help="dtype for raw scenes")
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--stride", type=int, default=None, help="window step (default --size, no overlap)")
+    p.add_argument("--threshold", type=float, default=0.9)
+    p.add_argument("--calibration", type=str, default=None, help="JSON from calibrate_threshold.py")
+    p.add_argument("--temperature", type=float, default=1.0)
+    p.add_argument("--geotransform", type=str, default=None,
+                   help="x0,dx,rx,y0,ry,dy affine (GDAL order) to add map x/y per window")
+    p.add_argument("--log", type=str, default="logs/scene.jsonl", help="per-window log with row/col (.jsonl or .tlog)")
+    p.add_argument("--mask_out", type=str, default=None, help="write the [rows, cols] keep mask as .npy")
+    add_telemetry_args(p)
+    add_engine_args(p)
+    a = p.parse_args()
+    load_calibration(a)
+
+    shape = [int(v) for v in a.shape.split(",")] if a.shape else None
+    scene = open_scene(a.scene, shape, a.dtype)
+    a.bands = scene.shape[0]
+    try:
+        tiler = SceneTiler(scene, a.size, a.stride)
+    except ValueError as e:
+        p.error(f"{a.scene}: {e}")
+    clf = TileClassifier.from_args(a)
+    gt = [float(v) for v in a.geotransform.split(",")] if a.geotransform else None
+
+    keep = np.zeros(len(tiler), dtype=bool)
+    header = {"kind": "scene", "scene": str(a.scene), "size": a.size, "model_sha256": clf.model_sha256,
+              "threshold": float(a.threshold), "temperature": float(a.temperature)}
+    t0 = time.time()
+    with open_log(a.log, header, a) as log:
+        for i, j, x in tiler.batches(a.batch_size):
+            res = clf.predict(x)
+            keep[i:j] = res["prob_event"] >= a.threshold
+            row, col = tiler.origins(i, j).T
+            cols = {"row": row, "col": col, "prob_event": res["prob_event"], "pred_class": res["pred_class"],
+                    "ok": keep[i:j].copy(), "latency_ms": res["latency_ms"]}
+            if gt:
+                cols["x"] = gt[0] + col * gt[1] + row * gt[2]
+                cols["y"] = gt[3] + col * gt[4] + row * gt[5]
+            log.write(cols)
+        trace.finish(a, clf.sess, log)
+
+    if a.mask_out:
+        np.save(a.mask_out, keep.reshape(tiler.grid))
+    kept_px = int(keep.sum()) * a.size * a.size
+    print(f"windows {len(tiler)} grid {tiler.grid[0]}x{tiler.grid[1]} kept {int(keep.sum())} "
+          f"kept_pixels {kept_px} elapsed_s {time.time()-t0:.2f}")
+
+if __name__ == "__main__":
+    main()
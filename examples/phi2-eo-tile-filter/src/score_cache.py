@@ -0,0 +1,83 @@
+import hashlib, json
+from pathlib import Path
+import numpy as np
+
+# Fixed-capacity table of raw (pre-temperature) logits, memory-mapped from
+# <root>/scores.npy. stamp == 0 marks a free slot; otherwise it is a logical
+# clock used for least-recently-used eviction.
+ENTRY = np.dtype([
+    ("key", "V16"),
+    ("logits", np.float32, (2,)),
+    ("stamp", np.uint64),
+])
+
+class ScoreCache:
+    def __init__(self, root, model_sha256: str, size: int, bands: int = 3, capacity: int = 100_000):
+        self.root = Path(root); self.root.mkdir(parents=True, exist_ok=True)
+        self.prefix = f"{model_sha256}:{size}:{bands}:".encode()
+        meta = {"model_sha256": model_sha256, "size": size, "bands": bands, "capacity": int(capacity)}
+        table, meta_path = self.root / "scores.npy", self.root / "meta.json"
+        old = json.loads(meta_path.read_text()) if meta_path.exists() else None
+        if old == meta and table.exists():
+            self.table = np.lib.format.open_memmap(table, mode="r+")
+        else:
+            # new model file (or layout): drop every entry
+            self.table = np.lib.format.open_memmap(table, mode="w+", dtype=ENTRY, shape=(int(capacity),))
+            self.table["stamp"] = 0
+            meta_path.write_text(json.dumps(meta))
+        used = np.flatnonzero(self.table["stamp"])
+        self.index = {self.table["key"][i].tobytes(): int(i) for i in used}
+        self.clock = int(self.table["stamp"].max()) if len(self.table) else 0
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def key(self, content: bytes) -> bytes:
+        h = hashlib.blake2b(self.prefix, digest_size=16)
+        h.update(content)
+        return h.digest()
+
+    def get_many(self, keys):
+        """Return ([n, 2] logits with NaN rows for misses, bool hit mask)."""
+        z = np.full((len(keys), 2), np.nan, dtype=np.float32)
+        hit = np.zeros(len(keys), dtype=bool)
+        slots = []
+        for j, k in enumerate(keys):
+            i = self.index.get(k)
+            if i is not None:
+                hit[j] = True; slots.append(i)
+        if slots:
+            slots = np.array(slots)
+            z[hit] = self.table["logits"][slots]
+            self.clock += 1
+            self.table["stamp"][slots] = self.clock
+        self.hits += int(hit.sum()); self.misses += int(len(keys) - hit.sum())
+        return z, hit
+
+    def put_many(self, keys, logits):
+        # one slot per key, also for identical tiles within the batch
+        new = list({k: z for k, z in zip(keys, logits) if k not in self.index}.items())
+        if not new:
+            return
+        new = new[-len(self.table):]
+        stamp = self.table["stamp"]
+        free = np.flatnonzero(stamp == 0)[:len(new)]
+        short = len(new) - len(free)
+        if short > 0:
+            used = np.flatnonzero(stamp)
+            victims = used[np.argpartition(stamp[used], short - 1)[:short]]
+            for i in victims:
+                k = self.table["key"][i].tobytes()
+                if self.index.get(k) == i:  # a stale duplicate slot does not own its key
+                    del self.index[k]
+            free = np.concatenate([free, victims])
+        self.clock += 1
+        for i, (k, z) in zip(free, new):
+            self.table["key"][i] = np.void(k)
+            self.table["logits"][i] = z
+            self.index[k] = int(i)
+        stamp[free] = self.clock
+
+    def flush(self):
+        self.table.flush()
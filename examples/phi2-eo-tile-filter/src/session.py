@@ -0,0 +1,156 @@
+import hashlib, json, mmap, os, time
+from pathlib import Path
+import onnxruntime as ort
+
+# Named SessionOptions presets. Keys:
+#   intra/inter   op thread counts (0 = ORT default, -1 = all cores)
+#   mode          "sequential" or "parallel" (inter-op) execution
+#   opt           graph optimization: disable, basic, extended, all
+#   mem_pattern   pre-plan activation buffers from the first run's shapes
+#   cpu_arena     keep freed CPU memory in ORT's arena for reuse
+#   spinning      intra-op threads busy-wait between ops instead of sleeping
+#   cpus          pin intra-op pool threads to these cores; ORT runs the
+#                 first share of work on the calling thread, so the list
+#                 covers the remaining intra-1 threads
+PROFILES = {
+    "default": {},
+    # one tile at a time on the calling thread: no pool wake-up or handoff
+    "latency": {"intra": 1, "inter": 1, "mode": "sequential", "opt": "all", "mem_pattern": True, "cpu_arena": True},
+    # large batches across every core
+    "throughput": {"intra": -1, "inter": 1, "mode": "sequential", "opt": "all", "mem_pattern": True, "cpu_arena": True,
+                   "spinning": True},
+    # smallest resident set: no arena, no pre-planned buffers, one thread; graph
+    # optimization stays on since unfused intermediates cost more than it saves
+    "lowmem": {"intra": 1, "inter": 1, "mode": "sequential", "opt": "all", "mem_pattern": False, "cpu_arena": False,
+               "spinning": False},
+}
+OPT_LEVELS = {"disable": "ORT_DISABLE_ALL", "basic": "ORT_ENABLE_BASIC", "extended": "ORT_ENABLE_EXTENDED", "all": "ORT_ENABLE_ALL"}
+PROVIDERS = ["CPUExecutionProvider"]
+HASH_BLOCK = 16 << 20
+SPAWN_ENV = "FILTER_SPAWN_T"  # wall-clock spawn time set by assurance/watchdog.py
+
+def file_sha256(p: Path) -> str:
+    # hash straight out of the page cache in large blocks, no read() copies
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as mv:
+                for i in range(0, size, HASH_BLOCK):
+                    h.update(mv[i:i + HASH_BLOCK])
+    return h.hexdigest()
+
+def verify_model(path, digest) -> str:
+    """SHA-256 of `path`, checked against `digest` (hex, or a sha256sum-style file); raises on mismatch."""
+    expected = str(digest).strip().lower()
+    if Path(expected).is_file():
+        expected = Path(expected).read_text().split()[0].lower()
+    actual = file_sha256(path)
+    if actual != expected:
+        raise ValueError(f"{path}: sha256 {actual} does not match stored digest {expected}")
+    return actual
+
+def _process_age_s() -> float:
+    # /proc start time has clock-tick resolution; psutil's create_time is
+    # anchored to a whole-second boot time and can be off by up to 1 s
+    try:
+        with open("/proc/self/stat") as f:
+            start = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - start / os.sysconf("SC_CLK_TCK")
+    except OSError:
+        import psutil
+        return time.time() - psutil.Process().create_time()
+
+def startup_ms(t_ready: float) -> float:
+    """Milliseconds from process spawn (watchdog-provided, else the OS start time) to `t_ready` (time.time())."""
+    t0 = os.environ.get(SPAWN_ENV)
+    if t0 is None:
+        t0 = time.time() - _process_age_s()
+    return (t_ready - float(t0)) * 1000
+
+def add_session_args(p):
+    p.add_argument("--session_profile", choices=list(PROFILES), default="default", help="SessionOptions preset")
+    p.add_argument("--session_config", type=str, default=None,
+                   help="JSON with profile keys (and optionally \"profile\") overriding --session_profile")
+    p.add_argument("--optimized_dir", type=str, default=None,
+                   help="cache the optimized graph here; later starts load it and skip graph optimization")
+    p.add_argument("--fast_start", action="store_true",
+                   help="restart-friendly start: --optimized_dir defaults to <model dir>/.ort_cache")
+    p.add_argument("--model_digest", type=str, default=None,
+                   help="expected model SHA-256 (hex or sha256sum file); refuse to start on mismatch")
+
+def resolve_optimized_dir(a):
+    if getattr(a, "optimized_dir", None):
+        return a.optimized_dir
+    return str(Path(a.onnx).parent / ".ort_cache") if getattr(a, "fast_start", False) else None
+
+def resolve_profile(profile="default", config=None) -> dict:
+    """Profile settings with a JSON config file (path) or dict layered on top."""
+    if isinstance(config, (str, Path)):
+        with open(config) as f:
+            config = json.load(f)
+    config = dict(config or {})
+    name = config.pop("profile", profile)
+    if name not in PROFILES:
+        raise ValueError(f"unknown session profile {name!r}; choose from {', '.join(PROFILES)}")
+    return {**PROFILES[name], **config}
+
+def session_options(settings: dict) -> ort.SessionOptions:
+    so = ort.SessionOptions()
+    intra = settings.get("intra", 0)
+    so.intra_op_num_threads = (os.cpu_count() or 1) if intra == -1 else intra
+    so.inter_op_num_threads = settings.get("inter", 0)
+    if "mode" in settings:
+        so.execution_mode = ort.ExecutionMode.ORT_PARALLEL if settings["mode"] == "parallel" else ort.ExecutionMode.ORT_SEQUENTIAL
+    so.graph_optimization_level = getattr(ort.GraphOptimizationLevel, OPT_LEVELS[settings.get("opt", "all")])
+    if "mem_pattern" in settings:
+        so.enable_mem_pattern = settings["mem_pattern"]
+    if "cpu_arena" in settings:
+        so.enable_cpu_mem_arena = settings["cpu_arena"]
+    if "spinning" in settings:
+        so.add_session_config_entry("session.intra_op.allow_spinning", "1" if settings["spinning"] else "0")
+    cpus = settings.get("cpus")
+    if cpus and so.intra_op_num_threads > 1:
+        pool = [str(c) for c in cpus][:so.intra_op_num_threads - 1]
+        so.add_session_config_entry("session.intra_op_thread_affinities", ";".join(pool))
+    return so
+
+def optimized_path(onnx: Path, directory, settings: dict, sha256: str = None) -> Path:
+    # optimized graphs may hold hardware- and version-specific fused ops
+    tag = f"{settings.get('opt', 'all')}-ort{ort.__version__}"
+    return Path(directory) / f"{onnx.stem}-{(sha256 or file_sha256(onnx))[:16]}-{tag}.onnx"
+
+def make_session(onnx, profile="default", config=None, optimized_dir=None, sha256=None,
+                 ort_profile=None) -> ort.InferenceSession:
+    """InferenceSession for `onnx` under a named profile.
+
+    With `optimized_dir`, the first start serializes the optimized graph
+    there; later starts load that file with graph optimization disabled.
+    `ort_profile` turns on ORT's per-node profiler (sess.end_profiling()
+    returns the JSON file, named with this prefix).
+    """
+    onnx = Path(onnx)
+    settings = resolve_profile(profile, config)
+    so = session_options(settings)
+    if ort_profile:
+        so.enable_profiling = True
+        so.profile_file_prefix = str(ort_profile)
+    if not optimized_dir:
+        return ort.InferenceSession(str(onnx), so, providers=PROVIDERS)
+    cached = optimized_path(onnx, optimized_dir, settings, sha256)
+    if cached.exists():
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return ort.InferenceSession(str(cached), so, providers=PROVIDERS)
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+    so.optimized_model_filepath = str(tmp)
+    sess = ort.InferenceSession(str(onnx), so, providers=PROVIDERS)
+    os.replace(tmp, cached)
+    return sess
+
+def from_args(a, onnx=None, sha256=None) -> ort.InferenceSession:
+    if getattr(a, "model_digest", None):
+        sha256 = verify_model(onnx or a.onnx, a.model_digest)
+    return make_session(onnx or a.onnx, getattr(a, "session_profile", "default"), getattr(a, "session_config", None),
+                        resolve_optimized_dir(a), sha256)
@@ -0,0 +1,222 @@
+import argparse, os, time
+from multiprocessing import shared_memory
+import numpy as np
+from .tiles import TileSet, load_tile_raw, normalize
+
+# Fixed-slot ring of preprocessed [C, H, W] tiles in one shared-memory
+# segment, for one producer and one consumer process:
+#   header  HEADER, one row
+#   meta    META, one row per slot (source path, label, source bytes)
+#   data    [slots, C, H, W] uint8 or float32
+# `head` counts tiles written and `tail` tiles released. The producer fills
+# slot head % slots and only then bumps head; the consumer reads slots
+# tail..head as views and bumps tail once it is done with them, which is
+# when the producer may reuse them. Both sides poll; there is no lock.
+# `pid` is the producer's process id (0 if it did not set one); a consumer
+# waiting on an empty ring checks that it is still alive.
+
+MAGIC, VERSION = 0x45_4F_52_47, 1  # "EORG"
+HEADER = np.dtype([
+    ("magic", "<u4"), ("version", "<u4"), ("slots", "<u4"), ("bands", "<u4"),
+    ("size", "<u4"), ("dtype", "<u4"), ("closed", "<u4"), ("pid", "<u4"),
+    ("head", "<u8"), ("tail", "<u8"),
+])
+META = np.dtype([("path", "S256"), ("label", "i1"), ("nbytes", "<u8")])
+DTYPES = [np.dtype(np.uint8), np.dtype(np.float32)]
+POLL_S = 0.0005
+MAX_POLL_S = 0.05
+LIVENESS_S = 0.1  # how often a waiting consumer checks the producer pid
+
+def _attach(name):
+    # attaching must not register the segment with this process's resource
+    # tracker, or it is unlinked when the consumer exits
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13: skip the registration instead
+        from multiprocessing import resource_tracker
+        register, resource_tracker.register = resource_tracker.register, lambda *_: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+class TileRing:
+    def __init__(self, shm, owner=False):
+        self.shm, self.owner = shm, owner
+        self.header = np.ndarray((), HEADER, shm.buf)
+        h = self.header
+        if h["magic"] != MAGIC or h["version"] != VERSION:
+            raise ValueError(f"{shm.name}: not a tile ring")
+        self.slots = int(h["slots"])
+        self.meta = np.ndarray((self.slots,), META, shm.buf, HEADER.itemsize)
+        self.dtype = DTYPES[int(h["dtype"])]
+        shape = (self.slots, int(h["bands"]), int(h["size"]), int(h["size"]))
+        self.data = np.ndarray(shape, self.dtype, shm.buf, HEADER.itemsize + self.meta.nbytes)
+
+    @classmethod
+    def create(cls, name, slots: int, bands: int, size: int, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        nbytes = HEADER.itemsize + slots * META.itemsize + slots * bands * size * size * dtype.itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        h = np.ndarray((), HEADER, shm.buf)
+        h[()] = (MAGIC, VERSION, slots, bands, size, DTYPES.index(dtype), 0, os.getpid(), 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return cls(_attach(name))
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+
+    @property
+    def bands(self):
+        return self.data.shape[1]
+
+    @property
+    def size(self):
+        return self.data.shape[2]
+
+    def __len__(self):
+        return int(self.header["head"] - self.header["tail"])
+
+    def put(self, tile: np.ndarray, path="", label: int = -1, nbytes: int = 0, stall_s: float = 30.0) -> int:
+        """Copy one tile into the next free slot, waiting while the ring is full; returns its sequence number.
+
+        Raises TimeoutError when the ring stays full and the consumer
+        releases nothing for `stall_s` seconds (it died or is wedged).
+        """
+        head = int(self.header["head"])
+        tail, wait = int(self.header["tail"]), POLL_S
+        deadline = time.monotonic() + stall_s
+        while head - tail >= self.slots:
+            time.sleep(wait)
+            wait = min(wait * 2, MAX_POLL_S)  # back off while the consumer is slow
+            if (now := int(self.header["tail"])) != tail:
+                tail, deadline = now, time.monotonic() + stall_s
+            elif time.monotonic() > deadline:
+                raise TimeoutError(f"ring {self.shm.name} full; consumer released nothing for {stall_s:.0f} s")
+        k = head % self.slots
+        self.data[k] = tile
+        self.meta[k] = (str(path).encode(), label, nbytes)
+        self.header["head"] = head + 1  # publish after the slot is complete
+        return head
+
+    def close_writer(self):
+        self.header["closed"] = 1
+
+    def writer_alive(self) -> bool:
+        pid = int(self.header["pid"])
+        try:
+            if pid:
+                os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:  # alive, owned by another user
+            pass
+        return True
+
+    def peek(self, n: int, max_wait_s: float = 0.005, stall_s: float = None):
+        """Up to `n` ready tiles as ([k, C, H, W] view, meta rows), without copying.
+
+        Waits for the first tile, then up to `max_wait_s` for the batch to
+        fill. A batch never wraps past the last slot. Returns None once the
+        writer has closed and everything was released. Call release(k) when
+        done with the view. Raises RuntimeError if the producer exited
+        without closing the ring, and TimeoutError if no tile arrives for
+        `stall_s` seconds (None: wait as long as the producer lives).
+        """
+        tail = int(self.header["tail"])
+        now = time.monotonic()
+        check, deadline = now + LIVENESS_S, None if stall_s is None else now + stall_s
+        while int(self.header["head"]) == tail:
+            if self.header["closed"] and int(self.header["head"]) == tail:
+                return None
+            now = time.monotonic()
+            if now > check:
+                if not self.writer_alive():
+                    raise RuntimeError(f"ring {self.shm.name}: producer {int(self.header['pid'])} exited without closing it")
+                check = now + LIVENESS_S
+            if deadline is not None and now > deadline:
+                raise TimeoutError(f"ring {self.shm.name} empty; no tile for {stall_s:.0f} s")
+            time.sleep(POLL_S)
+        k = tail % self.slots
+        want = min(n, self.slots - k)
+        deadline = time.monotonic() + max_wait_s
+        while int(self.header["head"]) - tail < want and not self.header["closed"] and time.monotonic() < deadline:
+            time.sleep(POLL_S)
+        m = min(want, int(self.header["head"]) - tail)
+        return self.data[k:k + m], self.meta[k:k + m]
+
+    def release(self, n: int):
+        self.header["tail"] = int(self.header["tail"]) + n
+
+    def drained(self) -> bool:
+        return int(self.header["tail"]) == int(self.header["head"])
+
+    def close(self):
+        # views into shm.buf must be gone before the mapping can close
+        del self.header, self.meta, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def replay(ring: TileRing, data, loops: int = 1, rate: float = 0.0, stall_s: float = 30.0) -> int:
+    """Stand-in payload producer: decode a tiles/ directory (or archive) into the ring."""
+    tiles = TileSet.open(data, labeled=False)
+    labels = tiles.labels if tiles.labels is not None else np.full(len(tiles), -1)
+    if tiles.archive is not None and tiles.archive.sizes is not None:
+        sizes = [tiles.archive.sizes[r] for r in tiles.rows]  # recorded at pack time
+    else:
+        sizes = [p.stat().st_size if p.exists() else 0 for p in tiles.paths]
+    n = 0
+    for _ in range(loops):
+        for i, p in enumerate(tiles.paths):
+            t0 = time.perf_counter()
+            if tiles.archive is not None:
+                raw = tiles.archive.tiles[tiles.rows[i]]
+            else:
+                raw = load_tile_raw(p, ring.size, ring.bands)
+            if raw.dtype != ring.dtype:
+                if ring.dtype != np.float32:
+                    raise ValueError(f"{p}: {raw.dtype} tiles need a float32 ring")
+                raw = normalize(raw)
+            ring.put(raw, p, int(labels[i]), sizes[i], stall_s)
+            n += 1
+            if rate:
+                time.sleep(max(0.0, 1 / rate - (time.perf_counter() - t0)))
+    return n
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--data", required=True, help="tiles/ directory or packed archive to replay")
+    p.add_argument("--name", type=str, default="eo-tiles", help="shared-memory segment name")
+    p.add_argument("--slots", type=int, default=256)
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--bands", type=int, default=3)
+    p.add_argument("--dtype", choices=["uint8", "float32"], default="uint8",
+                   help="uint8 keeps 4x more tiles per MB; float32 lets the scorer use slots as-is")
+    p.add_argument("--loops", type=int, default=1)
+    p.add_argument("--rate", type=float, default=0.0, help="tiles/s to pace at (0 = as fast as the ring drains)")
+    p.add_argument("--stall_timeout", type=float, default=30.0, help="give up when the ring stays full this long")
+    p.add_argument("--drain_timeout", type=float, default=60.0, help="seconds to wait for the consumer before unlinking")
+    a = p.parse_args()
+
+    ring = TileRing.create(a.name, a.slots, a.bands, a.size, a.dtype)
+    try:
+        t0 = time.time()
+        n = replay(ring, a.data, a.loops, a.rate, a.stall_timeout)
+        ring.close_writer()
+        deadline = time.monotonic() + a.drain_timeout
+        while not ring.drained() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        print(f"ring {a.name} tiles {n} slots {a.slots} {a.dtype} elapsed_s {time.time()-t0:.2f}")
+    finally:
+        ring.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import argparse, os, queue, signal, sys, threading, time
+from pathlib import Path
+from .bandwidth_filter import gate, load_calibration
+from .downlink import MODES, DownlinkWriter
+from .engine import TileClassifier, add_engine_args
+from .records import downlink_header
+from .telemetry import add_telemetry_args, open_log
+from .tiles import is_tile, load_batch
+from . import trace
+from .worker import WorkerClient
+
+# Continuous mode: tiles arrive in a watched directory or as paths on a
+# FIFO/stdin, pass through a bounded queue and are scored in micro-batches
+# that close at --batch_size tiles or --max_latency_ms after the first one.
+# Decisions and log records are emitted per batch; nothing accumulates.
+
+END = None  # queue sentinel
+
+class Producer(threading.Thread):
+    def __init__(self, q, stop):
+        super().__init__(daemon=True)
+        self.q, self.stop = q, stop
+
+    def put(self, item):
+        # blocks while the queue is full (backpressure), still honours stop
+        while not self.stop.is_set():
+            try:
+                self.q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+class DirWatcher(Producer):
+    """Queues tiles in `root` by (mtime, name), each once.
+
+    Only files past the (mtime, name) high-water mark of the last queued
+    tile are picked up, so memory stays constant and tiles left in place
+    (--on_done keep) are never queued again. Files arriving with an older
+    mtime than that (e.g. moved in with their original times) are skipped.
+    """
+
+    def __init__(self, root, q, stop, poll_s=0.2, settle_s=0.2):
+        super().__init__(q, stop)
+        self.root = Path(root)
+        self.poll_s, self.settle_s = poll_s, settle_s
+        self.mark = (-1, "")
+
+    def run(self):
+        while not self.stop.is_set():
+            new = []
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if not is_tile(e.name):
+                        continue
+                    try:
+                        key = (e.stat().st_mtime_ns, e.name)
+                    except FileNotFoundError:
+                        continue
+                    if key > self.mark:
+                        new.append((key, e.path))
+            settled = time.time_ns() - int(self.settle_s * 1e9)
+            for key, path in sorted(new):
+                if key[0] > settled:
+                    break  # possibly still being written; so is everything newer
+                if not self.put(Path(path)):
+                    return
+                self.mark = key
+            self.stop.wait(self.poll_s)
+
+class LineReader(Producer):
+    """Newline-separated tile paths from a FIFO (reopened after each writer) or stdin ("-")."""
+
+    def __init__(self, source, q, stop):
+        super().__init__(q, stop)
+        self.source = source
+
+    def run(self):
+        while not self.stop.is_set():
+            f = sys.stdin if self.source == "-" else open(self.source)
+            for line in f:
+                if line.strip() and not self.put(Path(line.strip())):
+                    return
+            if self.source == "-":
+                self.put(END)
+                return
+            f.close()
+
+def micro_batches(q, batch, max_latency_s, stop, idle_exit_s=0.0):
+    last = time.monotonic()
+    while True:
+        try:
+            first = q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set() or (idle_exit_s and time.monotonic() - last > idle_exit_s):
+                return
+            continue
+        if first is END:
+            return
+        chunk, deadline = [first], time.monotonic() + max_latency_s
+        while len(chunk) < batch:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                break
+            try:
+                item = q.get(timeout=wait)
+            except queue.Empty:
+                break
+            if item is END:
+                yield chunk
+                return
+            chunk.append(item)
+        last = time.monotonic()
+        yield chunk
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", default=None)
+    p.add_argument("--worker", type=str, default=None,
+                   help="score on a resident src.worker at this socket instead of loading --onnx here")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--watch", type=str, help="directory that receives tiles")
+    src.add_argument("--fifo", type=str, help="FIFO (or - for stdin) carrying one tile path per line")
+    p.add_argument("--threshold", type=float, default=0.9)
+    p.add_argument("--calibration", type=str, default=None, help="JSON from calibrate_threshold.py")
+    p.add_argument("--temperature", type=float, default=1.0)
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--downlink_out", type=str, default="downlink")
+    p.add_argument("--downlink_mode", choices=MODES, default="copy")
+    p.add_argument("--log", type=str, default=None, help="log path (.jsonl or .tlog), appended to")
+    p.add_argument("--dedup_downlink", action="store_true", help="with --dedup, do not downlink near-duplicates again")
+    p.add_argument("--max_latency_ms", type=float, default=50.0, help="deadline for filling a micro-batch")
+    p.add_argument("--queue", type=int, default=256, help="max tiles waiting to be scored")
+    p.add_argument("--poll_s", type=float, default=0.2)
+    p.add_argument("--on_done", choices=["keep", "delete", "move"], default="keep", help="what to do with scored inputs")
+    p.add_argument("--done_dir", type=str, default=None, help="target for --on_done move")
+    p.add_argument("--idle_exit", type=float, default=0.0, help="exit after this many idle seconds (0 = run forever)")
+    add_telemetry_args(p)
+    add_engine_args(p)
+    a = p.parse_args()
+    load_calibration(a)
+    if not (a.onnx or a.worker):
+        p.error("one of --onnx or --worker is required")
+
+    if a.worker:
+        # batches that are in flight while the watchdog swaps workers are resent
+        clf = WorkerClient(a.worker)
+        model_sha = clf.ping()["model_sha256"]
+    else:
+        clf = TileClassifier.from_args(a)
+        model_sha = clf.model_sha256
+    q, stop = queue.Queue(maxsize=a.queue), threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    producer = DirWatcher(a.watch, q, stop, a.poll_s) if a.watch else LineReader(a.fifo, q, stop)
+    producer.start()
+
+    done_dir = Path(a.done_dir) if a.on_done == "move" else None
+    if done_dir:
+        done_dir.mkdir(parents=True, exist_ok=True)
+    log = open_log(a.log, downlink_header(model_sha, a.threshold, a.temperature), a, append=True) if a.log else None
+
+    tiles = kept = 0
+    t0 = time.time()
+    writer = DownlinkWriter(a.downlink_out, a.downlink_mode)
+    try:
+        for chunk in micro_batches(q, a.batch_size, a.max_latency_ms / 1000, stop, a.idle_exit):
+            chunk = [c for c in chunk if c.exists()]
+            if not chunk:
+                continue
+            sts = [c.stat() for c in chunk]
+            res = clf.predict(load_batch(chunk, a.size, a.bands))
+            k, _, _ = gate([(chunk, res, sts)], a.threshold, writer, log, a.dedup_downlink)
+            tiles += len(chunk); kept += k
+            for c in chunk:
+                if a.on_done == "delete":
+                    c.unlink(missing_ok=True)
+                elif done_dir:
+                    c.replace(done_dir / c.name)
+    finally:
+        stop.set()
+        writer.close(prune=False)  # the full tile set is never known here
+        trace.finish(a, getattr(clf, "sess", None), log)
+        if log:
+            log.close()
+    print(f"stream tiles {tiles} kept {kept} elapsed_s {time.time()-t0:.1f}")
+
+if __name__ == "__main__":
+    main()
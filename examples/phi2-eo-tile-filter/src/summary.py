@@ -0,0 +1,254 @@
+import math
+from collections import Counter
+import numpy as np
+from .calibration import ScoreHistogram, auc_roc
+from .records import EXIT_STAGES
+
+# Constant-memory run statistics built from telemetry batches (columns, see
+# src.telemetry). Every part merges by addition, so summaries of rotated
+# segments, files or nodes computed anywhere combine into the summary of
+# the whole run, and serialize to JSON for shipping between nodes.
+
+# Up to this many labelled tiles the summary also keeps their scores, so the
+# AUC is exact; past it only the histogram is kept and the AUC is binned.
+EXACT_SCORES = 100_000
+
+class QuantileSketch:
+    """Log-bucketed histogram: any quantile of positive values within `alpha` relative error.
+
+    Bucket k holds values in (gamma^(k-1), gamma^k] with gamma = (1+alpha)/(1-alpha),
+    so the bucket count grows with log(max/min), not with the number of values.
+    """
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.buckets = Counter()
+        self.zeros = self.count = 0
+        self.sum, self.min, self.max = 0.0, math.inf, -math.inf
+
+    def add(self, x):
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if not len(x):
+            return self
+        pos = x[x > 0]
+        self.zeros += len(x) - len(pos)
+        k, n = np.unique(np.ceil(np.log(pos) / math.log(self.gamma)).astype(np.int64), return_counts=True)
+        self.buckets.update(dict(zip(k.tolist(), n.tolist())))
+        self.count += len(x); self.sum += float(x.sum())
+        self.min, self.max = min(self.min, float(x.min())), max(self.max, float(x.max()))
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        if other.alpha != self.alpha:
+            raise ValueError("sketches with different alpha cannot be merged")
+        self.buckets.update(other.buckets)
+        self.zeros += other.zeros; self.count += other.count; self.sum += other.sum
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                # bucket midpoint in relative terms; clamp to the exact extremes
+                v = 2 * self.gamma ** k / (self.gamma + 1)
+                return min(max(v, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"alpha": self.alpha, "buckets": {str(k): v for k, v in self.buckets.items()}, "zeros": self.zeros,
+                "count": self.count, "sum": self.sum, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["alpha"])
+        s.buckets = Counter({int(k): v for k, v in d["buckets"].items()})
+        s.zeros, s.count, s.sum, s.min, s.max = d["zeros"], d["count"], d["sum"], d["min"], d["max"]
+        return s
+
+def kept_column(cols: dict, threshold=None):
+    """Downlink decision per row from whichever field the log carries (bandwidth_filter: ok)."""
+    for k in ("ok", "kept"):
+        if k in cols:
+            return np.asarray(cols[k], dtype=bool)
+    if "decision" in cols:
+        return np.isin(np.char.lower(np.asarray(cols["decision"], dtype=str)), ["keep", "kept", "true", "1"])
+    if "prob" in cols and threshold is not None:
+        return np.asarray(cols["prob"], dtype=np.float64) >= threshold
+    return np.zeros(len(next(iter(cols.values()))), dtype=bool)  # no signal: not kept
+
+class RunSummary:
+    """Latency sketch, confusion matrix at the run threshold, AUC histogram, downlink counts and per-window throughput."""
+
+    def __init__(self, window_s: float = 60.0):
+        self.window_s = float(window_s)
+        self.latency = QuantileSketch()
+        self.confusion = np.zeros((2, 2), dtype=np.int64)  # [true class, kept]
+        self.scores = ScoreHistogram(bins=2000)
+        self.exact = ([], [])  # (prob_event, true class) arrays while len(scores) <= EXACT_SCORES, else None
+        self.windows = Counter()  # window start index -> tiles
+        self.spans = {}  # window start index -> [first, last] timestamp seen in it
+        self.exits = Counter()  # exit stage -> tiles
+        self.tiles = self.kept = self.bytes_total = self.bytes_kept = 0
+        self.bytes_deduped = 0  # kept by score, not sent as near-duplicates
+        self.models, self.thresholds = set(), set()
+
+    def add(self, header: dict, cols: dict, threshold=None):
+        """Fold in one batch; `threshold` overrides the one recorded in the header."""
+        n = len(next(iter(cols.values())))
+        thr = threshold if threshold is not None else header.get("threshold")
+        if thr is None and "threshold" in cols:  # logs from before run headers
+            thr = np.asarray(cols["threshold"], dtype=np.float64)
+        if "threshold" in header:
+            self.thresholds.add(float(header["threshold"]))
+        if "model_sha256" in header or "model_sha256" in cols:
+            self.models.update(set(cols["model_sha256"]) if "model_sha256" in cols else {header["model_sha256"]})
+        self.tiles += n
+        if "latency_ms" in cols:
+            self.latency.add(cols["latency_ms"])
+        if "timestamp" in cols:
+            t = np.asarray(cols["timestamp"], dtype=np.float64)
+            wi = (t // self.window_s).astype(np.int64)
+            w, c = np.unique(wi, return_counts=True)
+            self.windows.update(dict(zip(w.tolist(), c.tolist())))
+            for k in w.tolist():
+                tk = t[wi == k]
+                self.add_span(k, float(tk.min()), float(tk.max()))
+        if "exit_stage" in cols:
+            k, c = np.unique(np.asarray(cols["exit_stage"], dtype=np.int64), return_counts=True)
+            self.exits.update({EXIT_STAGES[i]: n for i, n in zip(k.tolist(), c.tolist())})
+        if "true_class" in cols and "prob_event" in cols and thr is not None:
+            y = np.asarray(cols["true_class"]) > 0
+            p = np.asarray(cols["prob_event"], dtype=np.float64)
+            np.add.at(self.confusion, (y.astype(np.int64), (p >= thr).astype(np.int64)), 1)
+            self.keep_exact([p], [y], len(self.scores) + n)
+            p = np.clip(p, 1e-12, 1 - 1e-12)
+            self.scores.add(np.log(p / (1 - p)), y)  # AUC only needs the ranking
+        else:
+            keep = kept_column(cols, thr)
+            self.kept += int(keep.sum())
+            if "size" in cols:
+                size = np.asarray(cols["size"], dtype=np.int64)
+                self.bytes_total += int(size.sum()); self.bytes_kept += int(size[keep].sum())
+                if "exit_stage" in cols and "prob_event" in cols and thr is not None:
+                    dup = ((np.asarray(cols["exit_stage"]) == EXIT_STAGES.index("dedup")) & ~keep
+                           & (np.asarray(cols["prob_event"], dtype=np.float64) >= thr))
+                    self.bytes_deduped += int(size[dup].sum())
+        return self
+
+    def keep_exact(self, ps, ys, total: int):
+        if self.exact is None or total > EXACT_SCORES:
+            self.exact = None
+        else:
+            self.exact[0].extend(ps); self.exact[1].extend(ys)
+
+    def auc(self):
+        """(AUC, exact?): from the kept scores while there are few enough, else from the histogram."""
+        if not len(self.scores):
+            return None, None
+        if self.exact is None:
+            return self.scores.auc(), False
+        y = np.concatenate(self.exact[1])
+        return (auc_roc(y, np.concatenate(self.exact[0])) if 0 < y.sum() < len(y) else float("nan")), True
+
+    def add_span(self, w: int, lo: float, hi: float):
+        a, b = self.spans.get(w, (lo, hi))
+        self.spans[w] = [min(a, lo), max(b, hi)]
+
+    def rates(self) -> list:
+        """[[window start, tiles, tiles/s]]. Full windows divide by window_s; the first and last
+        divide by the part of the window the run covered (None when that is a single instant)."""
+        ws = sorted(self.windows)
+        out = []
+        for i, w in enumerate(ws):
+            lo, hi = w * self.window_s, (w + 1) * self.window_s
+            if w in self.spans:  # summaries from before spans were kept count every window as full
+                if i == 0:
+                    lo = self.spans[w][0]
+                if i == len(ws) - 1:
+                    hi = self.spans[w][1]
+            c = self.windows[w]
+            out.append([w * self.window_s, c, c / (hi - lo) if hi > lo else None])
+        return out
+
+    def merge(self, other: "RunSummary"):
+        if other.window_s != self.window_s:
+            raise ValueError("summaries with different windows cannot be merged")
+        self.latency.merge(other.latency)
+        self.confusion += other.confusion
+        if other.exact is None:
+            self.exact = None
+        else:
+            self.keep_exact(*other.exact, len(self.scores) + len(other.scores))
+        self.scores.merge(other.scores)
+        self.windows.update(other.windows)
+        for w, (lo, hi) in other.spans.items():
+            self.add_span(w, lo, hi)
+        self.exits.update(other.exits)
+        self.tiles += other.tiles; self.kept += other.kept
+        self.bytes_total += other.bytes_total; self.bytes_kept += other.bytes_kept
+        self.bytes_deduped += other.bytes_deduped
+        self.models |= other.models; self.thresholds |= other.thresholds
+        return self
+
+    def metrics(self) -> dict:
+        (tn, fp), (fn, tp) = self.confusion.tolist()
+        labeled = tn + fp + fn + tp > 0  # decision logs carry no true class
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        rows = self.rates()
+        auc, exact = self.auc()
+        tps = [r for _, _, r in rows if r is not None]
+        return {
+            "tiles": self.tiles,
+            "precision": precision if labeled else None,
+            "recall": recall if labeled else None,
+            "f1": f1 if labeled else None,
+            "confusion": {"tn": tn, "fp": fp, "fn": fn, "tp": tp},
+            "auc_roc": auc,
+            "auc_roc_exact": exact,  # False: binned over 0.02 logit, ties within a bin
+            "avg_latency_ms": self.latency.sum / self.latency.count if self.latency.count else 0.0,
+            "p50_latency_ms": self.latency.quantile(0.5),
+            "p90_latency_ms": self.latency.quantile(0.9),
+            "p99_latency_ms": self.latency.quantile(0.99),
+            "max_latency_ms": self.latency.max if self.latency.count else 0.0,
+            "window_s": self.window_s,
+            "tiles_per_s_mean": float(np.mean(tps)) if tps else 0.0,
+            "tiles_per_s_min": float(np.min(tps)) if tps else 0.0,
+            "throughput": rows,
+            "exit_stages": dict(self.exits),
+            "models": sorted(self.models),
+            "thresholds": sorted(self.thresholds),
+        }
+
+    def to_dict(self) -> dict:
+        return {"window_s": self.window_s, "latency": self.latency.to_dict(), "confusion": self.confusion.tolist(),
+                "scores": self.scores.counts.tolist(),
+                "exact": None if self.exact is None else [np.concatenate(v).tolist() if v else [] for v in self.exact], "windows": {str(k): v for k, v in self.windows.items()},
+                "spans": {str(k): v for k, v in self.spans.items()},
+                "exits": dict(self.exits), "tiles": self.tiles, "kept": self.kept, "bytes_total": self.bytes_total,
+                "bytes_kept": self.bytes_kept, "bytes_deduped": self.bytes_deduped, "models": sorted(self.models), "thresholds": sorted(self.thresholds)}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["window_s"])
+        s.latency = QuantileSketch.from_dict(d["latency"])
+        s.confusion = np.array(d["confusion"], dtype=np.int64)
+        s.scores.counts += np.array(d["scores"], dtype=np.int64)
+        ex = d.get("exact")  # partials from before exact scores count as binned
+        s.exact = None if ex is None else ([np.array(ex[0], dtype=np.float64)], [np.array(ex[1], dtype=bool)])
+        s.windows = Counter({int(k): v for k, v in d["windows"].items()})
+        s.spans = {int(k): list(v) for k, v in d.get("spans", {}).items()}
+        s.exits = Counter(d.get("exits", {}))
+        s.tiles, s.kept, s.bytes_total, s.bytes_kept = d["tiles"], d["kept"], d["bytes_total"], d["bytes_kept"]
+        s.bytes_deduped = d.get("bytes_deduped", 0)
+        s.models, s.thresholds = set(d["models"]), set(d["thresholds"])
+        return s
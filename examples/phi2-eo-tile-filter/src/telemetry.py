@@ -0,0 +1,278 @@
+import argparse, json, queue, re, struct, sys, threading, time
+from pathlib import Path
+import numpy as np
+
+# Telemetry logs written off the scoring loop. Callers hand over one batch
+# at a time as columns (name -> equal-length array or list of strings) and
+# return at once; a thread encodes and writes them. Values fixed for a run
+# (model hash, threshold, ...) go into a header record instead of every row.
+#   jsonl     {"header": {...}} line, then one JSON object per row
+#   columnar  MAGIC, then frames <u32 json bytes><u32 payload bytes><json><payload>
+#             where json is {"header": {...}} or {"meta": {...}} (no payload) or
+#             {"n": rows, "cols": [[name, dtype, nbytes], ...]} with the column
+#             bytes back to back ("str" columns are utf-8, "\n"-joined)
+# Meta records (e.g. src.trace stage histograms) are not rows; readers skip
+# them and iter_meta() returns them. With rotation the log is a series of segments <stem>.<00000><suffix>, each
+# starting with the header, so any segment reads (or is deleted) on its own.
+
+MAGIC = b"EOTLOG1\n"
+FRAME = struct.Struct("<II")
+FORMATS = ("jsonl", "columnar")
+
+def segment(path: Path, seq: int) -> Path:
+    return path.with_name(f"{path.stem}.{seq:05d}{path.suffix}")
+
+def log_files(path) -> list:
+    """The log at `path` and/or its rotated segments, oldest first."""
+    p = Path(path)
+    pat = re.compile(re.escape(p.stem) + r"\.(\d{5})" + re.escape(p.suffix) + "$")
+    segs = sorted(q for q in p.parent.glob(f"{p.stem}.*{p.suffix}") if pat.match(q.name))
+    return ([p] if p.exists() else []) + segs
+
+def _column(v):
+    if isinstance(v, np.ndarray):
+        return v
+    v = list(v)
+    return v if v and isinstance(v[0], str) else np.asarray(v)
+
+class TelemetryWriter:
+    """Buffered log writer with a background thread, rotation and a disk budget.
+
+    Columns passed to write() must not be modified afterwards. Rotation
+    happens after a segment passes `max_bytes` or `max_age_s`; with
+    `budget_bytes` the oldest segments are deleted to keep the whole log
+    within it. Writes block only when `queue_batches` batches are pending.
+    """
+
+    def __init__(self, path, header: dict, fmt=None, max_bytes: int = 0, max_age_s: float = 0.0,
+                 budget_bytes: int = 0, flush_s: float = 1.0, append: bool = False, queue_batches: int = 256):
+        self.path = Path(path)
+        self.fmt = fmt or ("columnar" if self.path.suffix == ".tlog" else "jsonl")
+        if self.fmt not in FORMATS:
+            raise ValueError(f"unknown log format {self.fmt!r}")
+        self.header = {**header, "started": time.time()}
+        self.max_bytes = max_bytes or (budget_bytes // 8 if budget_bytes else 0)
+        self.max_age_s, self.budget_bytes, self.flush_s = max_age_s, budget_bytes, flush_s
+        self.rotate = bool(self.max_bytes or max_age_s)
+        self.rows = self.deleted = 0
+        self.error = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        segs = log_files(self.path) if self.rotate else []
+        self.seq = int(segs[-1].name[len(self.path.stem) + 1:][:5]) + 1 if segs and segs[-1] != self.path else 0
+        self._open("ab" if append else "wb")
+        self.q = queue.Queue(maxsize=queue_batches)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open(self, mode="wb"):
+        p = segment(self.path, self.seq) if self.rotate else self.path
+        self.f = open(p, mode, buffering=1 << 20)
+        self.opened = time.monotonic()
+        if self.fmt == "columnar" and self.f.tell() == 0:
+            self.f.write(MAGIC)
+        self._header()
+
+    def _header(self):
+        self._record({"header": self.header})
+
+    def _record(self, rec: dict):
+        if self.fmt == "jsonl":
+            self.f.write((json.dumps(rec) + "\n").encode())
+        else:
+            h = json.dumps(rec).encode()
+            self.f.write(FRAME.pack(len(h), 0) + h)
+
+    def _encode(self, cols: dict):
+        cols = {k: _column(v) for k, v in cols.items()}
+        n = len(next(iter(cols.values())))
+        if self.fmt == "jsonl":
+            keys = list(cols)
+            vals = [v.tolist() if isinstance(v, np.ndarray) else v for v in cols.values()]
+            self.f.write("".join(json.dumps(dict(zip(keys, row))) + "\n" for row in zip(*vals)).encode())
+        else:
+            meta, parts = [], []
+            for k, v in cols.items():
+                if isinstance(v, np.ndarray):
+                    b, dt = np.ascontiguousarray(v).tobytes(), v.dtype.str
+                else:
+                    b, dt = "\n".join(v).encode(), "str"
+                meta.append([k, dt, len(b)]); parts.append(b)
+            h = json.dumps({"n": n, "cols": meta}).encode()
+            self.f.write(FRAME.pack(len(h), sum(len(b) for b in parts)) + h)
+            for b in parts:
+                self.f.write(b)
+        self.rows += n
+
+    def _roll(self):
+        self.f.close()
+        self.seq += 1
+        self._open()
+        if self.budget_bytes:
+            old = [p for p in log_files(self.path) if p != segment(self.path, self.seq)]
+            total = sum(p.stat().st_size for p in old)
+            while old and total + self.max_bytes > self.budget_bytes:
+                p = old.pop(0)
+                total -= p.stat().st_size
+                p.unlink()
+                self.deleted += 1
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                cols = self.q.get(timeout=self.flush_s)
+            except queue.Empty:
+                cols = {}
+            if cols is None:
+                break
+            if self.error is not None:
+                continue  # keep draining so writers never block on a dead log
+            try:
+                if "meta" in cols:
+                    self._record(cols)
+                elif cols:
+                    self._encode(cols)
+                now = time.monotonic()
+                if now - last_flush >= self.flush_s:
+                    self.f.flush()
+                    last_flush = now
+                if self.rotate and (self.f.tell() >= (self.max_bytes or float("inf"))
+                                    or (self.max_age_s and now - self.opened >= self.max_age_s)):
+                    self._roll()
+            except Exception as e:
+                self.error = e
+        self.f.close()
+
+    def write(self, cols: dict):
+        """Queue one batch of rows given as columns."""
+        if self.error is not None:
+            raise self.error
+        self.q.put(cols)
+
+    def write_meta(self, rec: dict):
+        """Queue a record that is about the run rather than a row."""
+        self.write({"meta": rec})
+
+    def write_record(self, rec: dict):
+        self.write({k: [v] for k, v in rec.items()})
+
+    def close(self):
+        if self.thread.is_alive():
+            self.q.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def add_telemetry_args(p):
+    p.add_argument("--log_format", choices=FORMATS, default=None, help="default columnar for .tlog paths, else jsonl")
+    p.add_argument("--log_max_mb", type=float, default=0.0, help="rotate the log into segments of this size")
+    p.add_argument("--log_max_age_s", type=float, default=0.0, help="rotate the log after this many seconds")
+    p.add_argument("--log_budget_mb", type=float, default=0.0, help="delete the oldest segments to stay within this (implies rotation)")
+
+def open_log(path, header: dict, a, append: bool = False) -> TelemetryWriter:
+    return TelemetryWriter(path, header, a.log_format, int(a.log_max_mb * 2**20), a.log_max_age_s,
+                           int(a.log_budget_mb * 2**20), append=append)
+
+def _read_jsonl(f, block=4096):
+    header, rows = {}, []
+    for line in f:
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        if "meta" in rec:
+            continue
+        if "header" in rec:
+            if rows:
+                yield header, rows; rows = []
+            header = rec["header"]
+        else:
+            rows.append(rec)
+            if len(rows) >= block:
+                yield header, rows; rows = []
+    if rows:
+        yield header, rows
+
+def _read_columnar(f):
+    header = {}
+    while len(prefix := f.read(FRAME.size)) == FRAME.size:
+        hn, pn = FRAME.unpack(prefix)
+        meta = json.loads(f.read(hn))
+        payload = f.read(pn)
+        if len(payload) < pn:
+            break  # torn last frame
+        if "header" in meta:
+            header = meta["header"]
+            continue
+        if "meta" in meta:
+            continue
+        cols, off = {}, 0
+        for name, dt, nb in meta["cols"]:
+            b = payload[off:off + nb]; off += nb
+            cols[name] = b.decode().split("\n") if dt == "str" else np.frombuffer(b, dtype=dt)
+        yield header, cols
+
+def iter_blocks(path):
+    """(header, columns) per written batch across a log and its segments; JSONL rows come as lists of dicts."""
+    for p in log_files(path) if not isinstance(path, (list, tuple)) else path:
+        with open(p, "rb") as f:
+            if f.read(len(MAGIC)) == MAGIC:
+                yield from _read_columnar(f)
+            else:
+                f.seek(0)
+                yield from _read_jsonl(f)
+
+def iter_meta(path):
+    """Meta records across a log and its segments, in order."""
+    for p in log_files(path) if not isinstance(path, (list, tuple)) else path:
+        with open(p, "rb") as f:
+            if f.read(len(MAGIC)) == MAGIC:
+                while len(prefix := f.read(FRAME.size)) == FRAME.size:
+                    hn, pn = FRAME.unpack(prefix)
+                    rec = json.loads(f.read(hn))
+                    f.seek(pn, 1)
+                    if "meta" in rec:
+                        yield rec["meta"]
+            else:
+                f.seek(0)
+                for line in f:
+                    if line.startswith(b'{"meta"'):
+                        yield json.loads(line)["meta"]
+
+def iter_columns(path):
+    """(header, columns) per batch whatever the format; JSONL rows are gathered into columns."""
+    for header, block in iter_blocks(path):
+        if isinstance(block, list):
+            keys = dict.fromkeys(k for r in block for k in r)
+            block = {k: [r.get(k) for r in block] for k in keys}
+        yield header, block
+
+def iter_records(path):
+    """One dict per row with its header's fields merged in, whatever the format."""
+    for header, block in iter_blocks(path):
+        if isinstance(block, list):
+            for row in block:
+                yield {**header, **row}
+            continue
+        keys = list(block)
+        vals = [v.tolist() if isinstance(v, np.ndarray) else v for v in block.values()]
+        for row in zip(*vals):
+            yield {**header, **dict(zip(keys, row))}
+
+def main():
+    p = argparse.ArgumentParser(description="print a telemetry log (any format, all segments) as JSONL")
+    p.add_argument("log")
+    p.add_argument("--head", type=int, default=0)
+    a = p.parse_args()
+    for i, rec in enumerate(iter_records(a.log)):
+        if a.head and i >= a.head:
+            break
+        sys.stdout.write(json.dumps(rec) + "\n")
+
+if __name__ == "__main__":
+    main()
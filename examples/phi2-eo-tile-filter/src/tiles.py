@@ -0,0 +1,184 @@
+from collections import deque
+from pathlib import Path
+import numpy as np
+from .archive import TileArchive, is_archive
+from .downlink import size_stat
+from .trace import span
+
+CLASSES = ["background", "event"]
+# PNG carries up to 3 bands; .npy ([C, H, W]) and multi-page TIFF (one page
+# per band) carry any number, in their stored dtype.
+# PIL and the executors are imported where used: archive and .npy inputs
+# never touch them, which keeps restarts cheap.
+TILE_EXTS = (".png", ".npy", ".tif", ".tiff")
+
+def is_tile(p) -> bool:
+    return Path(p).suffix.lower() in TILE_EXTS
+
+def find_tiles(root):
+    return [p for p in Path(root).glob("**/*") if is_tile(p)]
+
+def labeled_files(root):
+    files = []
+    for cls, name in enumerate(CLASSES):
+        files += [(f, cls) for f in sorted((Path(root) / name).glob("*")) if is_tile(f)]
+    return files
+
+def read_bands(path) -> np.ndarray:
+    """Native-dtype [C, H, W] from a .npy or multi-page TIFF tile."""
+    path = Path(path)
+    if path.suffix.lower() == ".npy":
+        return np.load(path)
+    from PIL import Image, ImageSequence
+    with Image.open(path) as img:
+        return np.stack([np.asarray(page) for page in ImageSequence.Iterator(img)])
+
+def _resize_bands(arr: np.ndarray, size: int) -> np.ndarray:
+    if arr.shape[1:] == (size, size):
+        return arr
+    from PIL import Image
+    out = np.empty((arr.shape[0], size, size), dtype=arr.dtype)
+    hi = np.iinfo(arr.dtype).max if arr.dtype.kind in "ui" else None
+    for b, band in enumerate(arr):
+        r = np.asarray(Image.fromarray(band.astype(np.float32)).resize((size, size)))
+        out[b] = np.clip(np.rint(r), 0, hi) if hi is not None else r
+    return out
+
+def load_tile_raw(path, size: int, bands: int = 3) -> np.ndarray:
+    """[C, size, size] in the tile's stored dtype (uint8 for PNG)."""
+    if Path(path).suffix.lower() not in (".npy", ".tif", ".tiff"):
+        if bands not in (1, 3):
+            raise ValueError(f"{path}: PNG tiles hold 1 or 3 bands, use .npy or .tif for {bands}")
+        from PIL import Image
+        with span("decode"):
+            img = Image.open(path).convert("RGB" if bands == 3 else "L")
+        with span("resize"):
+            arr = np.asarray(img.resize((size, size)))
+            return arr[None] if arr.ndim == 2 else np.transpose(arr, (2, 0, 1))
+    with span("decode"):
+        arr = read_bands(path)
+    if arr.shape[0] != bands:
+        raise ValueError(f"{path}: {arr.shape[0]} bands, expected {bands}")
+    with span("resize"):
+        return _resize_bands(arr, size)
+
+def band_max(dtype, bands: int) -> np.ndarray:
+    hi = np.iinfo(dtype).max if np.dtype(dtype).kind in "ui" else 1.0
+    return np.full((bands, 1, 1), hi, dtype=np.float32)
+
+def normalize(raw: np.ndarray, scale: np.ndarray = None) -> np.ndarray:
+    """Per-band scaling to float32 in one broadcast; `scale` is [C, 1, 1] (dtype max by default)."""
+    if scale is None:
+        scale = band_max(raw.dtype, raw.shape[-3])
+    return raw.astype(np.float32) / scale
+
+def load_tile(path, size: int, bands: int = 3) -> np.ndarray:
+    raw = load_tile_raw(path, size, bands)
+    with span("normalize"):
+        return normalize(raw)
+
+def load_batch(paths, size: int, bands: int = 3) -> np.ndarray:
+    x = np.empty((len(paths), bands, size, size), dtype=np.float32)
+    for j, p in enumerate(paths):
+        x[j] = load_tile(p, size, bands)
+    return x
+
+class TileSet:
+    """Tiles to score: tile file paths, or rows of a packed archive.
+
+    For archives `paths` are the source files recorded at pack time; they are
+    only touched for downlink copies and stats, never decoded.
+    """
+
+    def __init__(self, paths, labels=None, archive: TileArchive = None, rows=None):
+        self.paths = list(paths)
+        self.labels = None if labels is None else np.asarray(labels)
+        self.archive = archive
+        self.rows = np.arange(len(self.paths)) if archive is not None and rows is None else rows
+
+    @classmethod
+    def open(cls, data, labeled: bool = True):
+        if is_archive(data):
+            arch = TileArchive(data)
+            return cls(arch.paths, arch.labels, arch)
+        if labeled:
+            files = labeled_files(data)
+            return cls([f for f, _ in files], np.array([c for _, c in files], dtype=np.int8))
+        return cls(find_tiles(data))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def subset(self, idx) -> "TileSet":
+        labels = None if self.labels is None else self.labels[idx]
+        rows = None if self.rows is None else self.rows[idx]
+        return TileSet([self.paths[i] for i in idx], labels, self.archive, rows)
+
+    def content(self, i: int) -> bytes:
+        if self.archive is not None:
+            return self.archive.tiles[self.rows[i]].tobytes()
+        return Path(self.paths[i]).read_bytes()
+
+    def stats(self) -> dict:
+        if self.archive is not None and self.archive.virtual:
+            # no source files behind these names: sizes come from the index
+            return {p: size_stat(self.archive.sizes[r]) for p, r in zip(self.paths, self.rows)}
+        return {p: p.stat() for p in self.paths}
+
+class TileLoader:
+    """Yield (paths, [N, C, H, W] float32) batches in input order.
+
+    With workers > 0 a thread (or process) pool decodes up to `depth` batches
+    ahead of the consumer, so tile decode overlaps with sess.run. The deque of
+    pending futures is the bounded queue: nothing new is submitted until the
+    consumer takes the oldest batch. Archive-backed sets are sliced inline
+    from the memory map; there is nothing to decode.
+    """
+
+    def __init__(self, tiles, size=64, batch=1, workers=0, depth=4, processes=False, bands=3):
+        self.tiles = tiles if isinstance(tiles, TileSet) else TileSet(tiles)
+        arch = self.tiles.archive
+        if arch is not None and (arch.size, arch.bands) != (size, bands):
+            raise ValueError(f"archive {arch.root} holds {arch.bands}x{arch.size}px tiles, not {bands}x{size}px")
+        self.paths = self.tiles.paths
+        self.size, self.bands, self.batch = size, bands, max(1, batch)
+        self.workers, self.depth, self.processes = workers, max(1, depth), processes
+
+    def __len__(self):
+        return (len(self.paths) + self.batch - 1) // self.batch
+
+    def chunks(self):
+        for i in range(0, len(self.paths), self.batch):
+            yield self.paths[i:i + self.batch]
+
+    def __iter__(self):
+        if self.tiles.archive is not None:
+            for i in range(0, len(self.paths), self.batch):
+                with span("archive"):
+                    x = self.tiles.archive.batch(self.tiles.rows[i:i + self.batch])
+                yield self.paths[i:i + self.batch], x
+            return
+        if self.workers <= 0:
+            for chunk in self.chunks():
+                yield chunk, load_batch(chunk, self.size, self.bands)
+            return
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        pool_cls = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        with pool_cls(max_workers=self.workers) as pool:
+            pending = deque()
+            for chunk in self.chunks():
+                if len(pending) >= self.depth:
+                    with span("load_wait"):  # inference stalled on decode
+                        x = pending[0][1].result()
+                    yield pending.popleft()[0], x
+                pending.append((chunk, pool.submit(load_batch, chunk, self.size, self.bands)))
+            while pending:
+                chunk, fut = pending.popleft()
+                with span("load_wait"):
+                    x = fut.result()
+                yield chunk, x
+
+def add_loader_args(p):
+    p.add_argument("--workers", type=int, default=0, help="decode workers running ahead of inference (0 = inline)")
+    p.add_argument("--prefetch", type=int, default=4, help="max batches decoded ahead")
+    p.add_argument("--decode_procs", action="store_true", help="decode in processes instead of threads")
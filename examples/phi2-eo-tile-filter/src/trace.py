@@ -0,0 +1,143 @@
+import json, os, threading, time
+from collections import Counter
+import numpy as np
+from .summary import QuantileSketch
+
+# Span and counter instrumentation for the scoring loop, on the monotonic
+# nanosecond clock. One process-wide `tracer`, off by default: span() is
+# then one attribute check returning a shared no-op context manager, so
+# the hooks stay in the hot path at ~0.1 us each. When enabled, span
+# durations are buffered per stage and folded into a latency sketch every
+# FOLD spans; with sample_every=N only every Nth batch (tick()) records
+# spans, and at most `max_events` spans are kept for the Chrome trace.
+
+FOLD = 4096
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _Null()
+
+class _Span:
+    __slots__ = ("tracer", "name", "t0")
+
+    def __init__(self, tracer, name):
+        self.tracer, self.name = tracer, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.t0, time.perf_counter_ns() - self.t0)
+        return False
+
+class Tracer:
+    def __init__(self):
+        self.enabled = self.active = False
+        self.sample_every, self.max_events = 1, 200_000
+        self.reset()
+
+    def reset(self):
+        self.stages, self.pending = {}, {}
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.events = []
+        self.batches = 0
+        self.t0 = time.perf_counter_ns()
+
+    def enable(self, sample_every: int = 1, max_events: int = 200_000):
+        self.enabled = self.active = True
+        self.sample_every, self.max_events = max(1, sample_every), max_events
+        self.reset()
+
+    def disable(self):
+        self.enabled = self.active = False
+
+    def tick(self):
+        """Start of a batch; decides whether its spans are recorded."""
+        if self.enabled:
+            self.batches += 1
+            self.active = self.batches % self.sample_every == 1 or self.sample_every == 1
+
+    def span(self, name: str):
+        return _Span(self, name) if self.active else _NULL
+
+    def record(self, name: str, t0_ns: int, dur_ns: int):
+        buf = self.pending.get(name)
+        if buf is None:
+            buf = self.pending.setdefault(name, [])
+        buf.append(dur_ns)  # list.append is atomic; decode threads record too
+        if len(buf) >= FOLD:
+            self._fold(name)
+        if len(self.events) < self.max_events:
+            self.events.append((name, t0_ns, dur_ns, threading.get_ident()))
+
+    def _fold(self, name):
+        with self.lock:
+            buf, self.pending[name] = self.pending[name], []
+            if buf:
+                self.stages.setdefault(name, QuantileSketch()).add(np.array(buf) / 1e6)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def stage_stats(self) -> dict:
+        """{stage: {count, total_ms, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}} over the recorded spans."""
+        for name in list(self.pending):
+            self._fold(name)
+        out = {}
+        for name, sk in sorted(self.stages.items()):
+            out[name] = {"count": sk.count, "total_ms": sk.sum, "mean_ms": sk.sum / sk.count,
+                         "p50_ms": sk.quantile(0.5), "p90_ms": sk.quantile(0.9), "p99_ms": sk.quantile(0.99),
+                         "max_ms": sk.max}
+        return out
+
+    def chrome_trace(self, path, ort_profile=None):
+        """Write spans (and ORT's own profile events, if given) as Chrome trace JSON for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        tids = {}
+        ev = [{"name": n, "ph": "X", "ts": (t - self.t0) / 1000, "dur": d / 1000, "pid": pid,
+               "tid": tids.setdefault(tid, len(tids))} for n, t, d, tid in self.events]
+        ev += [{"name": k, "ph": "C", "ts": 0, "pid": pid, "args": {k: v}} for k, v in self.counters.items()]
+        if ort_profile:
+            # ORT timestamps are us from session creation; they get their own process row
+            with open(ort_profile) as f:
+                ev += [dict(e, pid=pid + 1) for e in json.load(f)]
+            ev.append({"name": "process_name", "ph": "M", "pid": pid + 1, "args": {"name": "onnxruntime"}})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": ev, "displayTimeUnit": "ms"}, f)
+
+tracer = Tracer()
+span = tracer.span
+
+def add_trace_args(p):
+    p.add_argument("--trace", type=str, default=None, help="record per-stage spans; write a Chrome trace JSON here")
+    p.add_argument("--trace_sample", type=int, default=1, help="record spans for every Nth batch only")
+    p.add_argument("--ort_profile", type=str, default=None, help="also enable ORT's profiler, files prefixed with this")
+
+def start(a):
+    if getattr(a, "trace", None):
+        tracer.enable(a.trace_sample)
+
+def finish(a, sess=None, log=None):
+    """Print the stage table; write stage stats into `log` and the Chrome trace; end ORT profiling."""
+    ort_file = sess.end_profiling() if sess is not None and getattr(a, "ort_profile", None) else None
+    if not tracer.enabled:
+        if ort_file:
+            print("ort profile", ort_file)
+        return
+    stats = tracer.stage_stats()
+    if log is not None:
+        log.write_meta({"kind": "stages", "sample_every": tracer.sample_every, "stages": stats,
+                        "counters": dict(tracer.counters)})
+    tracer.chrome_trace(a.trace, ort_file)
+    for name, s in stats.items():
+        print(f"stage {name:<12} n {s['count']:>6} total_ms {s['total_ms']:9.1f} p50_ms {s['p50_ms']:.3f} "
+              f"p99_ms {s['p99_ms']:.3f}")
+    print("trace", a.trace, *(["ort profile", ort_file] if ort_file else []))
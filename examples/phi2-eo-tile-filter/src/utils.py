@@ -1,16 +1,21 @@
 from pathlib import Path
-from PIL import Image
-import numpy as np
 import torch
 from torch.utils.data import Dataset, DataLoader
+from .archive import TileArchive, is_archive
+from .tiles import labeled_files, load_tile
 
 class TileFolder(Dataset):
     def __init__(self, root: str, bands: int = 3, size: int = 64):
         self.root = Path(root)
         self.paths = []
-        for cls, name in enumerate(["background", "event"]):
-            for p in sorted((self.root / name).glob("*.png")):
-                self.paths.append((p, cls))
+        # packed split from src.pack_tiles: read rows from the memory map, no decode
+        self.archive = TileArchive(root) if is_archive(root) else None
+        if self.archive is not None:
+            if (self.archive.size, self.archive.bands) != (size, bands):
+                raise ValueError(f"archive {root} holds {self.archive.bands}x{self.archive.size}px tiles, not {bands}x{size}px")
+            self.paths = list(zip(self.archive.paths, self.archive.labels.tolist()))
+        else:
+            self.paths = labeled_files(self.root)
         self.bands = bands
         self.size = size
 
@@ -18,8 +23,10 @@ class TileFolder(Dataset):
 
     def __getitem__(self, idx):
         p, cls = self.paths[idx]
-        img = Image.open(p).convert("RGB").resize((self.size, self.size))
-        x = torch.from_numpy(np.array(img)).permute(2, 0, 1).float() / 255.0
+        if self.archive is not None:
+            x = torch.from_numpy(self.archive.batch([idx])[0])
+            return x, torch.tensor(cls, dtype=torch.long)
+        x = torch.from_numpy(load_tile(p, self.size, self.bands))
         y = torch.tensor(cls, dtype=torch.long)
         return x, y
 
@@ -0,0 +1,208 @@
+import argparse, json, os, signal, socket, socketserver, struct, sys, threading, time
+from pathlib import Path
+import numpy as np
+from .engine import RESULT_DTYPE, TileClassifier, add_engine_args
+from .tiles import TileSet
+
+# Resident scorer: one process keeps the ORT session loaded and serves
+# batches over a Unix socket. A message is
+#   <u32 header bytes><u32 payload bytes><JSON header><payload>
+# Requests:
+#   {"op": "ping"}                                  -> health counters
+#   {"op": "score", "shape": [N, C, H, W]} + f32    -> RESULT_DTYPE rows
+#   {"op": "score", "paths": [...]}                 -> worker decodes the tiles
+# Replies carry {"ok": true, ...} or {"ok": false, "error": "..."}.
+
+PREFIX = struct.Struct("<II")
+
+def _recv_exact(sock, n: int) -> bytearray:
+    buf = bytearray(n)
+    view, got = memoryview(buf), 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if k == 0:
+            raise ConnectionError("socket closed")
+        got += k
+    return buf
+
+def send_msg(sock, header: dict, payload=b""):
+    h = json.dumps(header).encode()
+    sock.sendall(PREFIX.pack(len(h), len(payload)) + h)
+    if len(payload):
+        sock.sendall(payload)
+
+def recv_msg(sock):
+    hn, pn = PREFIX.unpack(_recv_exact(sock, PREFIX.size))
+    header = json.loads(_recv_exact(sock, hn))
+    return header, (_recv_exact(sock, pn) if pn else b"")
+
+class Worker:
+    """Scoring state behind the socket. Batches run one at a time; ping never waits on them."""
+
+    def __init__(self, clf: TileClassifier):
+        self.clf = clf
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.batches = self.tiles = 0
+        self.busy_since = None
+        self.last_batch = None
+
+    def health(self) -> dict:
+        now = time.time()
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "uptime_s": now - self.started,
+            "batches": self.batches,
+            "tiles": self.tiles,
+            "busy_s": now - self.busy_since if self.busy_since else 0.0,
+            "last_batch_s": now - self.last_batch if self.last_batch else None,
+            "model_sha256": self.clf.model_sha256,
+            "size": self.clf.size,
+            "bands": self.clf.bands,
+        }
+
+    def score(self, header, payload) -> np.ndarray:
+        with self.lock:
+            self.busy_since = time.time()
+            try:
+                if "paths" in header:
+                    res = self.clf.score(TileSet([Path(p) for p in header["paths"]]))
+                else:
+                    x = np.frombuffer(payload, dtype=np.float32).reshape(header["shape"])
+                    res = self.clf.predict(x)
+            finally:
+                self.busy_since = None
+            self.batches += 1; self.tiles += len(res)
+            self.last_batch = time.time()
+        return res
+
+    def handle(self, header, payload):
+        op = header.get("op")
+        if op == "ping":
+            return self.health(), b""
+        if op == "score":
+            res = self.score(header, payload)
+            return {"ok": True, "n": len(res)}, res.tobytes()
+        return {"ok": False, "error": f"unknown op {op!r}"}, b""
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_msg(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply, out = self.server.worker.handle(header, payload)
+            except Exception as e:  # a bad request must not take the worker down
+                reply, out = {"ok": False, "error": f"{type(e).__name__}: {e}"}, b""
+            send_msg(self.request, reply, out)
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(worker: Worker, path) -> _Server:
+    """Bind `path` (replacing a stale socket file) and return the server; call serve_forever() on it."""
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    srv = _Server(str(path), _Handler)
+    srv.worker = worker
+    srv.inode = path.stat().st_ino
+    return srv
+
+class WorkerClient:
+    """Client that holds on to its request across worker restarts.
+
+    A failed call reconnects and resends with backoff for up to `retry_s`
+    seconds, so work submitted while the watchdog swaps workers waits
+    instead of being dropped.
+    """
+
+    def __init__(self, path, timeout=10.0, retry_s=30.0):
+        self.path, self.timeout, self.retry_s = str(path), timeout, retry_s
+        self.sock = None
+        self.retries = 0
+
+    def _connect(self):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        s.connect(self.path)
+        self.sock = s
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def call(self, header, payload=b""):
+        deadline, wait = time.monotonic() + self.retry_s, 0.005
+        while True:
+            try:
+                if self.sock is None:
+                    self._connect()
+                send_msg(self.sock, header, payload)
+                reply, out = recv_msg(self.sock)
+                break
+            except OSError:  # includes ConnectionError, FileNotFoundError and timeouts
+                self.close()
+                if time.monotonic() + wait > deadline:
+                    raise
+                self.retries += 1
+                time.sleep(wait)
+                wait = min(wait * 2, 0.5)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "worker error"))
+        return reply, out
+
+    def ping(self) -> dict:
+        return self.call({"op": "ping"})[0]
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        _, out = self.call({"op": "score", "shape": list(x.shape)}, memoryview(x).cast("B"))
+        return np.frombuffer(out, dtype=RESULT_DTYPE)
+
+    def score_paths(self, paths) -> np.ndarray:
+        _, out = self.call({"op": "score", "paths": [str(p) for p in paths]})
+        return np.frombuffer(out, dtype=RESULT_DTYPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--onnx", required=True)
+    p.add_argument("--socket", type=str, default="/tmp/eo-filter.sock")
+    p.add_argument("--size", type=int, default=64)
+    p.add_argument("--temperature", type=float, default=1.0)
+    p.add_argument("--standby", action="store_true",
+                   help="load and warm the model, then wait for a line on stdin before taking the socket")
+    add_engine_args(p)
+    a = p.parse_args()
+
+    clf = TileClassifier.from_args(a)
+    clf.predict(np.zeros((a.batch_size, a.bands, a.size, a.size), dtype=np.float32))  # warm-up
+    if a.standby:
+        print(f"worker {os.getpid()} standby", flush=True)
+        if not sys.stdin.readline():
+            return  # supervisor went away
+    srv = serve(Worker(clf), a.socket)
+    stop = lambda *_: threading.Thread(target=srv.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"worker {os.getpid()} serving {a.socket}", flush=True)
+    try:
+        srv.serve_forever()
+    finally:
+        srv.server_close()
+        # a promoted standby may already own the path
+        if os.path.exists(a.socket) and os.stat(a.socket).st_ino == srv.inode:
+            os.unlink(a.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import numpy as np
+from src.archive import ArchiveWriter, TileArchive
+from src.pack_tiles import pack_split
+from src.tiles import TileLoader, TileSet
+from test_tiles import make_tiles
+
+def test_packed_batches_match_png(tmp_path):
+    make_tiles(tmp_path / "val", n=7, size=16)
+    assert pack_split(tmp_path / "val", tmp_path / "packed", size=16) == 7
+    png, packed = TileSet.open(tmp_path / "val"), TileSet.open(tmp_path / "packed")
+    assert packed.archive is not None and packed.labels.tolist() == png.labels.tolist()
+    for (pa, a), (pb, b) in zip(TileLoader(png, 16, batch=3), TileLoader(packed, 16, batch=3)):
+        assert pa == pb
+        np.testing.assert_array_equal(a, b)
+
+def test_contiguous_rows_are_views(tmp_path):
+    make_tiles(tmp_path / "val", n=4, size=16)
+    pack_split(tmp_path / "val", tmp_path / "packed", size=16)
+    arch = TileArchive(tmp_path / "packed")
+    assert np.shares_memory(arch.rows([1, 2, 3]), arch.tiles)
+    assert not np.shares_memory(arch.rows([0, 2]), arch.tiles)
+
+def test_float_archive_batches_as_stored(tmp_path):
+    x = np.random.default_rng(0).random((3, 2, 8, 8), dtype=np.float32)
+    w = ArchiveWriter(tmp_path / "f", 3, 2, 8, np.float32)
+    for i, t in enumerate(x):
+        w.put(i, t)
+    w.close()
+    np.testing.assert_array_equal(TileArchive(tmp_path / "f").batch([0, 2]), x[[0, 2]])
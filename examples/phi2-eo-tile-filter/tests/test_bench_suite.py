@@ -0,0 +1,13 @@
+from src.bench_suite import compare
+
+def row(**kw):
+    r = {"onnx": "m.onnx", "batch": 1, "intra": 1, "inter": 1, "opt": "all", "size": 64, "bands": 3,
+         "p50_ms": 1.0, "p90_ms": 1.2, "p99_ms": 1.5, "cold_start_ms": 40.0, "peak_rss_mb": 70.0, "tiles_per_s": 1000.0}
+    r.update(kw)
+    return r
+
+def test_compare_flags_slower_and_ignores_noise():
+    base = {"results": [row(), row(batch=8, tiles_per_s=4000.0)]}
+    assert compare([row(p50_ms=1.05), row(batch=8, tiles_per_s=3900.0)], base, 0.10) == []
+    flags = compare([row(p99_ms=2.0), row(batch=8, tiles_per_s=3000.0), row(batch=32)], base, 0.10)
+    assert [(r["batch"], m) for r, m, _, _ in flags] == [(1, "p99_ms"), (8, "tiles_per_s")]
@@ -0,0 +1,25 @@
+import numpy as np
+from src.calibrate_threshold import calibrate
+from src.calibration import ScoreHistogram, fit_temperature, sigmoid
+
+def test_exact_calibrate_picks_highest_threshold_meeting_recall():
+    ys = [1, 1, 0, 1, 0, 0]
+    xs = [0.9, 0.8, 0.7, 0.6, 0.6, 0.1]
+    c = calibrate(ys, xs, target_recall=0.6)
+    assert c["threshold"] == 0.8 and c["achieved_recall"] == 2 / 3 and c["precision_at_threshold"] == 1.0
+    assert calibrate(ys, xs, 1.0)["threshold"] == 0.6
+    assert np.isclose(c["auc_roc"], 7.5 / 9)  # one positive/negative pair tied at 0.6
+
+def test_sharded_histograms_merge_and_recover_temperature():
+    rng = np.random.default_rng(0)
+    d = rng.normal(0, 6, 100_000)
+    y = (rng.random(len(d)) < sigmoid(d / 2.5)).astype(int)
+    whole = ScoreHistogram().add(d, y)
+    merged = ScoreHistogram().add(d[:30_000], y[:30_000]).merge(ScoreHistogram().add(d[30_000:], y[30_000:]))
+    np.testing.assert_array_equal(whole.counts, merged.counts)
+    assert abs(fit_temperature(d, y) - 2.5) < 0.1
+    assert abs(merged.fit_temperature() - fit_temperature(d, y)) < 1e-2
+    exact = calibrate(y, sigmoid(d / 2.5), 0.95)
+    binned = merged.calibrate(0.95, 2.5)
+    assert binned["achieved_recall"] >= 0.95 and abs(binned["threshold"] - exact["threshold"]) < 1e-3
+    assert abs(binned["auc_roc"] - exact["auc_roc"]) < 1e-4
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+import numpy as np
+from data.synth import block_rng, class_labels, make_block
+from src.calibration import ScoreHistogram
+from src.cascade import Cascade, StatsStage, calibrate_cascade, stage_threshold
+from src.engine import EXIT_CASCADE, TileClassifier
+from test_engine import export_tiny
+
+def batch(n=64, split="val"):
+    y = class_labels(n, 0.25)
+    return make_block(block_rng(0, split, 0), y, 32, 3).astype(np.float32) / 255, y
+
+def test_stage_threshold_keeps_events_above_rejected_background():
+    s = np.array([0.1, 0.2, 0.3, 0.9, 1.0, 1.1])
+    y = np.array([0, 0, 0, 1, 1, 1])
+    thr, r = stage_threshold(s, y, max_loss=0.34)  # may drop one event, but none scores near background
+    assert 0.3 < thr <= 0.9 and r == 1.0
+
+def test_stats_cascade_skips_background_only(tmp_path):
+    x, y = batch()
+    stage = StatsStage(); stage.fit(stage.features(x), y)
+    thr, r = stage_threshold(stage.score(stage.features(x)), y, 0.01)
+    cascade = Cascade.from_dict({**stage.to_dict(), "threshold": thr})
+    clf = TileClassifier(export_tiny(tmp_path / "m.onnx"), size=32, cascade=cascade)
+    x2, y2 = batch(split="test")
+    res = clf.predict(x2)
+    skipped = res["exit_stage"] == EXIT_CASCADE
+    assert r == 1.0 and not (skipped & (y2 > 0)).any() and skipped.sum() > 0.8 * (y2 == 0).sum()
+    assert (res["prob_event"][skipped] == 0).all() and cascade.report()["skip_rate"] == skipped.mean()
+
+class BrightnessModel:
+    """Stand-in main model: event logit grows with tile brightness."""
+    def iter_inputs(self, tiles):
+        yield None, tiles.x[:40]; yield None, tiles.x[40:]
+
+    def raw_logits(self, x):
+        m = x.mean(axis=(1, 2, 3))
+        return np.stack([np.zeros_like(m), 20 * (m - 0.5)], axis=1)
+
+def test_calibrate_cascade_reports_every_tile():
+    x, y = batch()
+    hist = ScoreHistogram(400)
+    cfg, target, full = calibrate_cascade(StatsStage(), BrightnessModel(), SimpleNamespace(x=x, labels=y), 0.9, 0.05, hist)
+    assert len(full) == len(y) and full.counts[1].sum() == (y > 0).sum()
+    assert len(hist) == round(len(y) * (1 - cfg["skip_rate"])) < len(y) and target >= 0.9
@@ -0,0 +1,35 @@
+import numpy as np
+from data.synth import block_rng, class_labels, make_block
+from src.dedup import DedupIndex, phash, popcount
+from src.engine import EXIT_DEDUP, RESULT_DTYPE, TileClassifier
+from test_engine import export_tiny
+
+def looks(n=8, k=3, size=32):
+    """n tiles, each seen k times with +-3 DN of noise, as a normalized batch in that order."""
+    base = make_block(block_rng(0, "d", 0), class_labels(n, 0.5), size, 3)
+    noise = np.random.default_rng(1).integers(-3, 4, size=(n * k,) + base.shape[1:])
+    return np.clip(np.repeat(base, k, axis=0) + noise, 0, 255).astype(np.float32) / 255
+
+def test_hash_matches_looks_and_separates_tiles():
+    h = phash(looks()).reshape(8, 3)
+    assert popcount(h[:, :1] ^ h).max() <= 2
+    d = popcount(h[:, 0][:, None] ^ h[:, 0][None, :])
+    assert d[~np.eye(8, dtype=bool)].min() > 2
+
+def test_index_is_bounded_lru():
+    idx = DedupIndex(RESULT_DTYPE, capacity=4, max_dist=0)
+    rows = np.zeros(3, dtype=RESULT_DTYPE)
+    idx.put(np.array([1, 2, 3], dtype=np.uint64), rows)
+    idx.lookup(np.array([1], dtype=np.uint64))  # 1 is now the most recent
+    idx.put(np.array([4, 5], dtype=np.uint64), rows[:2])  # evicts 2
+    slot, _ = idx.lookup(np.array([1, 2, 5], dtype=np.uint64))
+    assert len(idx) == 4 and (slot >= 0).tolist() == [True, False, True]
+
+def test_duplicates_reuse_decisions_within_and_across_batches(tmp_path):
+    x = looks()
+    clf = TileClassifier(export_tiny(tmp_path / "m.onnx"), size=32, dedup=DedupIndex(RESULT_DTYPE))
+    ref = TileClassifier(tmp_path / "m.onnx", size=32).predict(x)
+    res = np.concatenate([clf.predict(x[:10]), clf.predict(x[10:])])
+    dup = res["exit_stage"] == EXIT_DEDUP
+    assert dup.sum() == 16 and not dup[::3].any() and clf.dedup.hits == 16
+    np.testing.assert_allclose(res["prob_event"], np.repeat(ref["prob_event"][::3], 3), atol=1e-6)
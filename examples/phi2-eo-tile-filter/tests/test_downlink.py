@@ -0,0 +1,40 @@
+import json
+from src.downlink import DownlinkWriter
+
+def make_src(tmp_path, n=3):
+    src = tmp_path / "src"; src.mkdir()
+    for i in range(n):
+        (src / f"{i}.png").write_bytes(bytes([i]) * 100)
+    return sorted(src.iterdir())
+
+def test_incremental_update_and_prune(tmp_path):
+    files = make_src(tmp_path)
+    out = tmp_path / "out"
+    with DownlinkWriter(out) as w:
+        for f in files:
+            w.send(f, f.stat())
+    assert w.written == 3
+    with DownlinkWriter(out) as w:
+        w.send(files[0], files[0].stat())
+    assert (w.written, w.skipped) == (0, 1)
+    assert sorted(p.name for p in out.iterdir()) == ["0.png"]
+
+def test_hardlink_and_manifest(tmp_path):
+    files = make_src(tmp_path)
+    with DownlinkWriter(tmp_path / "hl", "hardlink") as w:
+        w.send(files[1], files[1].stat())
+    assert (tmp_path / "hl" / "1.png").stat().st_ino == files[1].stat().st_ino
+    with DownlinkWriter(tmp_path / "hl", "manifest") as w:
+        assert w.send(files[2], files[2].stat()) == 100
+    lines = (tmp_path / "hl" / "manifest.jsonl").read_text().splitlines()
+    assert [json.loads(l)["file"] for l in lines] == [str(files[2])]
+    assert not (tmp_path / "hl" / "1.png").exists()
+
+def test_hardlink_same_basename_twice_in_one_run(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"; a.mkdir(); b.mkdir()
+    (a / "00026.png").write_bytes(b"a" * 10); (b / "00026.png").write_bytes(b"b" * 20)
+    with DownlinkWriter(tmp_path / "hl", "hardlink") as w:
+        for f in (a / "00026.png", b / "00026.png", b / "00026.png"):
+            w.send(f, f.stat())
+    assert (w.written, w.skipped) == (2, 1)
+    assert (tmp_path / "hl" / "00026.png").stat().st_ino == (b / "00026.png").stat().st_ino
@@ -0,0 +1,29 @@
+import numpy as np
+import torch
+from src.engine import RESULT_DTYPE, TileClassifier, softmax
+from src.models.tiny_cnn import TinyCNN
+from src.tiles import labeled_files
+from test_tiles import make_tiles
+
+def export_tiny(path, bands=3, size=32, base=4):
+    torch.manual_seed(0)
+    torch.onnx.export(
+        TinyCNN(in_ch=bands, base=base).eval(), (torch.randn(1, bands, size, size),), str(path),
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "N"}, "logits": {0: "N"}}, opset_version=18, dynamo=False,
+    )
+    return path
+
+def test_batched_scores_match_batch1(tmp_path):
+    make_tiles(tmp_path / "tiles", n=9, size=32)
+    model = export_tiny(tmp_path / "m.onnx")
+    paths = [f for f, _ in labeled_files(tmp_path / "tiles")]
+    r1 = TileClassifier(model, size=32).score(paths)
+    r4 = TileClassifier(model, size=32, batch=4, workers=2).score(paths)
+    assert r1.dtype == RESULT_DTYPE and len(r1) == len(paths)
+    np.testing.assert_allclose(r1["prob_event"], r4["prob_event"], atol=1e-5)
+    np.testing.assert_array_equal(r1["pred_class"], r4["pred_class"])
+
+def test_temperature_flattens_probs():
+    z = np.array([[0.0, 4.0]], dtype=np.float32)
+    assert softmax(z / 2.0)[0, 1] < softmax(z)[0, 1]
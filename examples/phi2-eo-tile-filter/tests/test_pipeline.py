@@ -1,5 +1,6 @@
 from pathlib import Path
-import subprocess
+import json, subprocess
+from src.telemetry import iter_records
 
 def run(cmd): subprocess.check_call(cmd, shell=True)
 
@@ -11,3 +12,8 @@ def test_end_to_end(tmp_path):
     run("python -m src.export_onnx --weights runs/tinycnn.pt --out models/tinycnn_fp32.onnx --bands 3 --size 32")
     run(f"python -m src.quantize_ptq --onnx models/tinycnn_fp32.onnx --calib {tiles}/val --out models/tinycnn_int8.onnx --size 32")
     run(f"python -m src.infer_onnx --onnx models/tinycnn_int8.onnx --data {tiles}/val --bands 3 --size 32")
+    run(f"python -m src.run --onnx models/tinycnn_int8.onnx --data {tiles}/val --size 32 --batch-size 8 "
+        f"--calibration {tmp_path}/calibration.json --downlink_out {tmp_path}/downlink "
+        f"--log_dir {tmp_path}/logs --out_dir {tmp_path}/reports")
+    metrics = json.loads((tmp_path / "reports" / "metrics.json").read_text())
+    assert metrics["tiles_total"] == sum(1 for _ in iter_records(tmp_path / "logs" / "val.jsonl"))
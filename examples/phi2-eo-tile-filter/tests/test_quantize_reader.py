@@ -0,0 +1,33 @@
+import numpy as np
+from src.quant_sweep import pareto
+from src.quantize_ptq import TileReader, stratified
+from test_tiles import make_tiles
+
+def batches(reader):
+    out = []
+    while (b := reader.get_next()) is not None:
+        out.append(b["input"])
+    return np.concatenate(out)
+
+def test_stratified_budget_keeps_class_shares():
+    labels = np.r_[np.zeros(90), np.ones(10)]
+    idx = stratified(labels, 20, seed=3)
+    assert len(idx) == 20 and labels[idx].sum() == 2 and np.all(np.diff(idx) > 0)
+    assert len(stratified(labels, 0)) == 100
+
+def test_cached_reader_matches_decode_and_rewinds(tmp_path):
+    make_tiles(tmp_path / "tiles", n=12, size=16)
+    plain = batches(TileReader(tmp_path / "tiles", size=16, batch=5, budget=6))
+    cached = TileReader(tmp_path / "tiles", size=16, batch=5, budget=6, workers=2, cache_dir=tmp_path / "cc")
+    np.testing.assert_array_equal(batches(cached), plain)
+    cached.rewind()
+    np.testing.assert_array_equal(batches(cached), plain)
+    again = TileReader(tmp_path / "tiles", size=16, batch=5, budget=6, cache_dir=tmp_path / "cc")
+    assert isinstance(again.data, np.memmap) and len(list((tmp_path / "cc").glob("*.npy"))) == 1
+    np.testing.assert_array_equal(batches(again), plain)
+
+def test_pareto_keeps_fastest_at_each_recall():
+    rows = [{"name": n, "p50_ms": t, "recall_at_threshold": r} for n, t, r in
+            [("a", 1.0, 0.90), ("b", 2.0, 0.95), ("c", 2.0, 0.93), ("d", 3.0, 0.95)]]
+    rows.append({"name": "e", "error": "no kernel"})
+    assert [r["name"] for r in pareto(rows) if r["pareto"]] == ["a", "b"]
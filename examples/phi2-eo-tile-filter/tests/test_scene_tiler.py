@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from src.scene_tiler import SceneTiler
+
+def test_windows_are_views_and_match_slices():
+    scene = np.random.default_rng(3).integers(0, 255, (3, 40, 56), dtype=np.uint8)
+    t = SceneTiler(scene, size=16, stride=8)
+    assert t.grid == (4, 6) and np.shares_memory(t.windows, scene)
+    x = t.batch(4, 9)  # crosses from grid row 0 into row 1
+    for k, (r, c) in enumerate(t.origins(4, 9)):
+        np.testing.assert_array_equal(x[k], scene[:, r:r+16, c:c+16] / np.float32(255))
+    assert [j - i for i, j, _ in t.batches(10)] == [10, 10, 4]
+
+def test_edge_strips_are_covered_when_size_does_not_divide_scene():
+    scene = np.random.default_rng(4).integers(0, 255, (2, 37, 50), dtype=np.uint8)
+    t = SceneTiler(scene, size=16)
+    assert t.grid == (3, 4)
+    o = t.origins(0, len(t))
+    assert o[:, 0].max() == 37 - 16 and o[:, 1].max() == 50 - 16
+    x = np.concatenate([b for _, _, b in t.batches(5)])
+    seen = np.zeros(scene.shape[1:], bool)
+    for k, (r, c) in enumerate(o):
+        np.testing.assert_array_equal(x[k], scene[:, r:r+16, c:c+16] / np.float32(255))
+        seen[r:r+16, c:c+16] = True
+    assert seen.all()
+
+def test_scene_smaller_than_window_is_rejected():
+    with pytest.raises(ValueError, match="20x40, smaller than the 32x32"):
+        SceneTiler(np.zeros((3, 20, 40), dtype=np.uint8), size=32)
@@ -0,0 +1,33 @@
+import numpy as np
+from src.score_cache import ScoreCache
+
+def keys(n):
+    return [bytes([i]) * 16 for i in range(n)]
+
+def test_roundtrip_and_lru_eviction(tmp_path):
+    c = ScoreCache(tmp_path, "m1", 32, capacity=3)
+    k = keys(4)
+    c.put_many(k[:3], np.arange(6, dtype=np.float32).reshape(3, 2))
+    c.get_many([k[0]])  # touch k0 so k1 becomes the oldest
+    c.put_many([k[3]], np.array([[9, 9]], dtype=np.float32))
+    z, hit = c.get_many(k)
+    assert hit.tolist() == [True, False, True, True]
+    np.testing.assert_array_equal(z[0], [0, 1])
+    c.flush()
+    reopened = ScoreCache(tmp_path, "m1", 32, capacity=3)
+    assert len(reopened) == 3
+
+def test_model_change_invalidates(tmp_path):
+    c = ScoreCache(tmp_path, "m1", 32, capacity=4)
+    c.put_many(keys(2), np.zeros((2, 2), dtype=np.float32)); c.flush()
+    assert len(ScoreCache(tmp_path, "m2", 32, capacity=4)) == 0
+
+def test_duplicate_keys_in_one_batch_with_full_cache(tmp_path):
+    c = ScoreCache(tmp_path, "m1", 32, capacity=3)
+    k = keys(6)
+    c.put_many([k[0], k[0], k[1]], np.arange(6, dtype=np.float32).reshape(3, 2))
+    assert len(c) == 2 and (c.table["stamp"] > 0).sum() == 2
+    c.put_many([k[2], k[3], k[3], k[4], k[5]], np.zeros((5, 2), dtype=np.float32))  # evicts while full
+    z, hit = c.get_many(k)
+    assert hit.tolist() == [False, False, False, True, True, True]
+    np.testing.assert_array_equal(z[:3], np.nan)
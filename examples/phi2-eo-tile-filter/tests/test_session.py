@@ -0,0 +1,33 @@
+import json
+import numpy as np
+from src.session import make_session, resolve_profile
+from test_engine import export_tiny
+
+def test_config_file_layers_over_profile(tmp_path):
+    cfg = tmp_path / "s.json"
+    cfg.write_text(json.dumps({"profile": "lowmem", "intra": 2}))
+    s = resolve_profile("latency", str(cfg))
+    assert s["intra"] == 2 and s["cpu_arena"] is False
+
+def test_optimized_graph_is_cached_and_reused(tmp_path):
+    model = export_tiny(tmp_path / "m.onnx")
+    x = np.random.default_rng(0).random((2, 3, 32, 32), dtype=np.float32)
+    ref = make_session(model).run(None, {"input": x})[0]
+    first = make_session(model, "latency", optimized_dir=tmp_path / "opt")
+    cached = list((tmp_path / "opt").glob("*.onnx"))
+    assert len(cached) == 1
+    second = make_session(model, "latency", optimized_dir=tmp_path / "opt")
+    for s in (first, second):
+        np.testing.assert_allclose(s.run(None, {"input": x})[0], ref, atol=1e-5)
+
+def test_model_hash_and_digest_check(tmp_path):
+    import hashlib, pytest
+    from src.session import file_sha256, verify_model
+    f = tmp_path / "m.bin"
+    f.write_bytes(np.random.default_rng(1).bytes((16 << 20) + 123))  # crosses a hash block
+    ref = hashlib.sha256(f.read_bytes()).hexdigest()
+    assert file_sha256(f) == ref
+    (tmp_path / "m.sha256").write_text(f"{ref}  m.bin\n")
+    assert verify_model(f, tmp_path / "m.sha256") == ref
+    with pytest.raises(ValueError):
+        verify_model(f, "0" * 64)
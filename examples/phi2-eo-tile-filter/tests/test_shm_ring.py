@@ -0,0 +1,45 @@
+import os, subprocess, sys, threading
+import numpy as np
+import pytest
+from src.shm_ring import TileRing
+
+def test_ring_hands_out_views_in_order_across_wraparound():
+    ring = TileRing.create(f"eo-test-{os.getpid()}", slots=4, bands=3, size=8)
+    reader = TileRing.attach(ring.shm.name)
+    tiles = np.random.default_rng(0).integers(0, 255, (10, 3, 8, 8), dtype=np.uint8)
+
+    def produce():
+        for i, t in enumerate(tiles):
+            ring.put(t, f"t{i}.png", i % 2, 100 + i)
+        ring.close_writer()
+
+    th = threading.Thread(target=produce); th.start()
+    got, sizes = [], []
+    while (b := reader.peek(3, max_wait_s=0.05)) is not None:
+        x, meta = b
+        assert np.shares_memory(x, reader.data) and len(x) <= 3
+        got.append(x.copy()); sizes.append(len(x))
+        assert [m.decode() for m in meta["path"]] == [f"t{i}.png" for i in range(sum(sizes) - len(x), sum(sizes))]
+        reader.release(len(x))
+    th.join()
+    np.testing.assert_array_equal(np.concatenate(got), tiles)
+    assert max(sizes) <= 3 and reader.drained()
+    reader.close(); ring.close()
+
+def test_put_gives_up_when_consumer_stalls():
+    ring = TileRing.create(f"eo-test-stall-{os.getpid()}", slots=2, bands=1, size=4)
+    t = np.zeros((1, 4, 4), dtype=np.uint8)
+    ring.put(t); ring.put(t)
+    with pytest.raises(TimeoutError):
+        ring.put(t, stall_s=0.1)
+    ring.close()
+
+def test_peek_stops_when_producer_is_gone_or_silent():
+    ring = TileRing.create(f"eo-test-dead-{os.getpid()}", slots=2, bands=1, size=4)
+    with pytest.raises(TimeoutError):
+        ring.peek(1, stall_s=0.2)  # producer alive (this process) but sends nothing
+    gone = subprocess.Popen([sys.executable, "-c", "pass"]); gone.wait()
+    ring.header["pid"] = gone.pid
+    with pytest.raises(RuntimeError, match="exited without closing"):
+        ring.peek(1)
+    ring.close()
@@ -0,0 +1,28 @@
+import os, queue, threading, time
+from src.stream import END, DirWatcher, micro_batches
+
+def test_micro_batches_close_on_size_deadline_and_end():
+    q, stop = queue.Queue(), threading.Event()
+    for i in range(5):
+        q.put(i)
+    batches = micro_batches(q, batch=3, max_latency_s=0.05, stop=stop)
+    assert next(batches) == [0, 1, 2]
+    t0 = time.monotonic()
+    assert next(batches) == [3, 4]  # closed by the deadline, not by size
+    assert time.monotonic() - t0 >= 0.04
+    q.put(5); q.put(END)
+    assert list(batches) == [[5]]
+
+def test_dir_watcher_queues_each_kept_tile_once(tmp_path):
+    for i in range(300):
+        (tmp_path / f"{i:04d}.png").write_bytes(b"")
+        os.utime(tmp_path / f"{i:04d}.png", ns=(10**18, 10**18 + i % 7))  # many equal mtimes
+    q, stop = queue.Queue(), threading.Event()
+    w = DirWatcher(tmp_path, q, stop, poll_s=0.01, settle_s=0.0)
+    w.start()
+    time.sleep(0.2)
+    (tmp_path / "late.png").write_bytes(b"")
+    time.sleep(0.2)
+    stop.set(); w.join()
+    names = [p.name for p in q.queue]
+    assert len(names) == 301 and len(set(names)) == 301 and names[-1] == "late.png"
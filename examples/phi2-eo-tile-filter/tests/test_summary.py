@@ -0,0 +1,46 @@
+import json
+import numpy as np
+from src import summary
+from src.summary import QuantileSketch, RunSummary
+
+def test_sketch_quantiles_within_alpha_and_merge():
+    x = np.random.default_rng(0).lognormal(-1, 0.5, 50_000)
+    whole = QuantileSketch().add(x)
+    parts = QuantileSketch().add(x[:20_000]).merge(QuantileSketch().add(x[20_000:]))
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(x, q, method="lower")
+        assert abs(whole.quantile(q) - exact) <= 0.011 * exact
+        assert parts.quantile(q) == whole.quantile(q)
+
+def test_run_summary_confusion_and_roundtrip():
+    cols = {"timestamp": np.array([0.5, 1.5, 1.7, 3.0]), "true_class": np.array([1, 1, 0, 0]),
+            "prob_event": np.array([0.9, 0.4, 0.6, 0.1], dtype=np.float32), "latency_ms": np.ones(4)}
+    s = RunSummary(window_s=1).add({"threshold": 0.5, "model_sha256": "m"}, cols)
+    m = s.metrics()
+    assert m["confusion"] == {"tn": 1, "fp": 1, "fn": 1, "tp": 1} and m["precision"] == m["recall"] == 0.5
+    # first window covers 0.5..1 s; the last is a single instant
+    assert m["throughput"] == [[0.0, 1, 2.0], [1.0, 2, 2.0], [3.0, 1, None]] and m["thresholds"] == [0.5]
+    again = RunSummary.from_dict(json.loads(json.dumps(s.to_dict())))
+    assert again.merge(s).metrics()["confusion"]["tp"] == 2
+
+def test_partial_windows_use_observed_span():
+    # 2000 tiles/s from 59 s to 61 s, across a boundary of 60 s windows, in batches of 100
+    t = 59 + (np.arange(4000) // 100 + 1) * 0.05
+    s = RunSummary(window_s=60).add({}, {"timestamp": t, "size": np.ones(4000), "ok": np.zeros(4000, bool)})
+    half = RunSummary(window_s=60).add({}, {"timestamp": t[:2000]})
+    m = half.merge(RunSummary.from_dict(json.loads(json.dumps(
+        RunSummary(window_s=60).add({}, {"timestamp": t[2000:]}).to_dict())))).metrics()
+    for r in (s.metrics(), m):
+        assert 1900 < r["tiles_per_s_min"] <= r["tiles_per_s_mean"] < 2100
+    assert s.metrics()["precision"] is s.metrics()["recall"] is s.metrics()["f1"] is None  # no labels
+
+def test_auc_exact_for_small_runs_binned_past_the_limit(monkeypatch):
+    # low-margin scores: every event within 0.01 logit of the background, all ranked above it
+    cols = {"true_class": np.repeat([0, 1], 50), "prob_event": np.r_[np.full(50, 0.5), np.full(50, 0.5025)]}
+    s = RunSummary().add({"threshold": 0.5}, cols)
+    assert (s.metrics()["auc_roc"], s.metrics()["auc_roc_exact"]) == (1.0, True)
+    again = RunSummary.from_dict(json.loads(json.dumps(s.to_dict()))).merge(s)
+    assert (again.metrics()["auc_roc"], again.metrics()["auc_roc_exact"]) == (1.0, True)
+    monkeypatch.setattr(summary, "EXACT_SCORES", 150)
+    m = again.merge(s).metrics()
+    assert m["auc_roc_exact"] is False and m["auc_roc"] < 1.0
@@ -0,0 +1,30 @@
+import numpy as np
+from data.synth import class_labels, write_split
+from src.tiles import TileLoader, TileSet
+
+def test_class_labels_spread_events():
+    assert class_labels(6).tolist() == [1, 0, 1, 0, 1, 0]
+    rare = class_labels(1000, 0.01)
+    assert rare.sum() == 10 and np.all(np.diff(np.flatnonzero(rare)) == 100)
+
+def test_bulk_output_independent_of_workers(tmp_path):
+    write_split(tmp_path / "a", "val", 40, 4, 16, "pack", event_frac=0.25)
+    write_split(tmp_path / "b", "val", 40, 4, 16, "pack", event_frac=0.25, workers=2)
+    write_split(tmp_path / "c", "val", 40, 4, 16, "npy", event_frac=0.25)
+    a, b, c = (TileSet.open(tmp_path / d / "val") for d in "abc")
+    np.testing.assert_array_equal(a.archive.tiles, b.archive.tiles)
+    assert a.labels.sum() == 10 and sorted(a.labels) == sorted(c.labels)
+    (_, xa), = TileLoader(a, 16, batch=40, bands=4)
+    (_, xc), = TileLoader(c, 16, batch=40, bands=4)
+    order = np.argsort([p.name for p in c.paths])
+    np.testing.assert_array_equal(xa, xc[order])
+
+def test_packed_synth_stats_without_sources(tmp_path, monkeypatch):
+    write_split(tmp_path, "val", 6, 3, 16, "pack")
+    tiles = TileSet.open(tmp_path / "val")
+    # a file that happens to sit at a tile's name relative to the working directory is not the tile
+    monkeypatch.chdir(tmp_path)
+    tiles.paths[0].parent.mkdir(parents=True, exist_ok=True)
+    tiles.paths[0].write_bytes(b"x")
+    assert tiles.archive.virtual
+    assert [s.st_size for s in tiles.stats().values()] == [3 * 16 * 16] * 6
@@ -0,0 +1,29 @@
+import numpy as np
+from src.telemetry import TelemetryWriter, iter_blocks, iter_records, log_files
+
+def batch(i, n=50):
+    return {"file": [f"t{i}_{k}.png" for k in range(n)], "prob_event": np.linspace(0, 1, n, dtype=np.float32),
+            "ok": np.arange(n) % 2 == 0}
+
+def test_formats_read_back_the_same(tmp_path):
+    for name in ("a.jsonl", "a.tlog"):
+        with TelemetryWriter(tmp_path / name, {"model_sha256": "ab" * 32}) as log:
+            for i in range(3):
+                log.write(batch(i))
+        recs = list(iter_records(tmp_path / name))
+        assert len(recs) == 150 and recs[51]["file"] == "t1_1.png" and recs[51]["ok"] is False
+        assert recs[0]["model_sha256"] == "ab" * 32 and abs(recs[49]["prob_event"] - 1) < 1e-6
+    (_, cols), *_ = iter_blocks(tmp_path / "a.tlog")
+    assert cols["prob_event"].dtype == np.float32
+    assert (tmp_path / "a.tlog").stat().st_size < (tmp_path / "a.jsonl").stat().st_size / 3
+
+def test_rotation_stays_within_budget(tmp_path):
+    log = TelemetryWriter(tmp_path / "d.tlog", {"run": 1}, max_bytes=4096, budget_bytes=16384)
+    for i in range(100):
+        log.write(batch(i))
+    log.close()
+    segs = log_files(tmp_path / "d.tlog")
+    assert log.deleted > 0 and len(segs) > 1
+    assert sum(p.stat().st_size for p in segs) <= 16384 + 4096
+    recs = list(iter_records(tmp_path / "d.tlog"))
+    assert recs[-1]["file"] == "t99_49.png" and all(r["run"] == 1 for r in recs)
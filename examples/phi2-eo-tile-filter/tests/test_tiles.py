@@ -0,0 +1,30 @@
+import numpy as np
+from PIL import Image
+from src.tiles import TileLoader, labeled_files
+
+def make_tiles(root, n=10, size=16):
+    rng = np.random.default_rng(1)
+    for i in range(n):
+        d = root / ("event" if i % 2 else "background")
+        d.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8)).save(d / f"{i:05d}.png")
+
+def test_loader_order_matches_serial(tmp_path):
+    make_tiles(tmp_path)
+    paths = [f for f, _ in labeled_files(tmp_path)]
+    serial = list(TileLoader(paths, size=16, batch=3))
+    threaded = list(TileLoader(paths, size=16, batch=3, workers=4, depth=2))
+    assert [c for c, _ in serial] == [c for c, _ in threaded]
+    for (_, a), (_, b) in zip(serial, threaded):
+        assert a.shape[1:] == (3, 16, 16)
+        np.testing.assert_array_equal(a, b)
+
+def test_multiband_npy_and_tif_agree(tmp_path):
+    from data.synth import save_tile
+    arr = np.random.default_rng(2).integers(0, 255, (16, 16, 8), dtype=np.uint8)
+    save_tile(arr, tmp_path / "a", "npy"); save_tile(arr, tmp_path / "b", "tif")
+    x = TileLoader([tmp_path / "a.npy", tmp_path / "b.tif"], size=16, batch=2, bands=8)
+    (_, batch), = list(x)
+    assert batch.shape == (2, 8, 16, 16)
+    np.testing.assert_array_equal(batch[0], batch[1])
+    np.testing.assert_array_equal(batch[0], np.transpose(arr, (2, 0, 1)) / np.float32(255))
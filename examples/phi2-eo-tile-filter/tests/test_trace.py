@@ -0,0 +1,31 @@
+import json
+from src.telemetry import TelemetryWriter, iter_meta, iter_records
+from src.trace import _NULL, Tracer
+
+def test_disabled_spans_are_free_and_sampling_skips_batches():
+    t = Tracer()
+    assert t.span("infer") is _NULL
+    t.enable(sample_every=4)
+    for _ in range(8):
+        t.tick()
+        with t.span("infer"):
+            pass
+    s = t.stage_stats()["infer"]
+    assert s["count"] == 2 and s["max_ms"] >= s["p50_ms"] >= 0
+
+def test_chrome_trace_and_stage_meta_in_log(tmp_path):
+    t = Tracer(); t.enable()
+    for _ in range(3):
+        t.tick()
+        with t.span("decode"), t.span("resize"):
+            pass
+    t.count("tiles", 3)
+    t.chrome_trace(tmp_path / "t.json")
+    ev = json.load(open(tmp_path / "t.json"))["traceEvents"]
+    assert sum(e["ph"] == "X" for e in ev) == 6 and any(e["ph"] == "C" and e["name"] == "tiles" for e in ev)
+    for name in ("a.jsonl", "a.tlog"):
+        with TelemetryWriter(tmp_path / name, {"run": 1}) as log:
+            log.write({"ok": [True, False]})
+            log.write_meta({"kind": "stages", "stages": t.stage_stats()})
+        (meta,) = iter_meta(tmp_path / name)
+        assert meta["stages"]["resize"]["count"] == 3 and len(list(iter_records(tmp_path / name))) == 2
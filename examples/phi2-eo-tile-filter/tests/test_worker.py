@@ -0,0 +1,26 @@
+import threading, time
+import numpy as np
+from src.engine import TileClassifier
+from src.worker import Worker, WorkerClient, serve
+from test_engine import export_tiny
+
+def test_client_waits_for_worker_and_matches_local(tmp_path):
+    clf = TileClassifier(export_tiny(tmp_path / "m.onnx"), size=32)
+    x = np.random.default_rng(0).random((4, 3, 32, 32), dtype=np.float32)
+    sock = tmp_path / "w.sock"
+    out = {}
+    # submitted before any worker is listening: the request is held and resent
+    t = threading.Thread(target=lambda: out.setdefault("res", WorkerClient(sock, retry_s=10).predict(x)))
+    t.start()
+    time.sleep(0.2)
+    srv = serve(Worker(clf), sock)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        t.join(10)
+        np.testing.assert_allclose(out["res"]["prob_event"], clf.predict(x)["prob_event"], atol=1e-6)
+        with WorkerClient(sock) as c:
+            h = c.ping()
+            assert h["batches"] == 1 and h["tiles"] == 4 and h["busy_s"] == 0.0
+            assert h["model_sha256"] == clf.model_sha256
+    finally:
+        srv.shutdown(); srv.server_close()